@@ -65,6 +65,43 @@ static keyvalue_table_ptr deferred_operand_table = NULL;
 /* Own sequence number */
 static word_t seq_num = 0;
 
+/* Agent IDs of workers.  Normally 0 .. nworkers-1,
+   but workers that join later get IDs following those of clients */
+static unsigned *worker_ids = NULL;
+/* Position of own agent in worker_ids (-1 for client) */
+static int own_index = -1;
+/* Has set of workers changed since last GC? */
+static bool workers_changed = false;
+
+/*
+  Consistent hashing.  Each worker has VNODE_CNT points on a ring.
+  Hashed values are owned by the worker having the next point on the ring.
+  Adding a worker only changes ownership of values that
+  then fall just before one of its points.
+*/
+#define VNODE_CNT 64
+
+typedef struct {
+    word_t point;
+    unsigned agent;
+} ring_ele;
+
+static ring_ele *ring = NULL;
+static size_t ring_size = 0;
+
+/* Load balancing */
+/* Should choose_some_worker take worker queue depths into account? */
+static bool balance_load = false;
+/* Most recently advertised queue depth for each worker.
+   Indexed by position in worker_ids */
+static size_t *worker_load = NULL;
+/* Queue depth last advertised by this worker */
+static size_t last_load = 0;
+/* Minimum change in queue depth before advertising new value */
+#define LOAD_REPORT_DELTA 32
+/* How much shorter other queue must be before moving operation there */
+#define LOAD_SLACK 16
+
 /* Function to call when flush message received */
 static flush_function flush_helper = NULL;
 
@@ -82,6 +119,26 @@ static global_op_finish_function gop_finish_helper = NULL;
 gc_handler start_gc_handler = NULL;
 gc_handler finish_gc_handler = NULL;
 
+/* Helper functions for moving state between workers */
+static gc_handler migrate_out_handler = NULL;
+static migrate_function migrate_in_handler = NULL;
+
+/* Background work to perform between operations after GC */
+static work_function work_helper = NULL;
+static bool work_pending = false;
+
+/* Telemetry */
+/* Function supplying application-specific counters */
+static telem_function telem_helper = NULL;
+/* Operations fired and operands received since startup */
+static size_t telem_fired = 0;
+static size_t telem_operands = 0;
+/* Number of GCs, total time spent in them, and longest pause */
+static size_t telem_gc_cnt = 0;
+static double telem_gc_secs = 0.0;
+static double telem_gc_max = 0.0;
+static double telem_gc_start = 0.0;
+
 /* Forward reference */
 bool quit_agent(int argc, char *argv[]);
 bool do_agent_kill(int argc, char *argv[]);
@@ -126,6 +183,114 @@ void set_gc_handlers(gc_handler start_handler, gc_handler finish_handler) {
     finish_gc_handler = finish_handler;
 }
 
+/* Report counters for telemetry sample */
+static void agent_telem() {
+    telem_field("fired", telem_fired);
+    telem_field("operands", telem_operands);
+    telem_field("ops_sent", agent_stat_counter[STATA_OPERATION_TOTAL]);
+    telem_field("ops_local", agent_stat_counter[STATA_OPERATION_LOCAL]);
+    telem_field("queue", operator_table->nelements);
+    telem_field("deferred", deferred_operand_table->nelements);
+    telem_field("msgs_out", chunks_sent);
+    telem_field("bytes_out", chunk_bytes_sent);
+    telem_field("msgs_in", chunks_received);
+    telem_field("bytes_in", chunk_bytes_received);
+    telem_field("gc_cnt", telem_gc_cnt);
+    telem_field_double("gc_secs", telem_gc_secs);
+    telem_field_double("gc_max", telem_gc_max);
+    telem_field("mem", current_bytes);
+    if (telem_helper)
+	telem_helper();
+}
+
+/* Start generating telemetry samples */
+bool start_agent_telemetry(char *file_name, double interval,
+			   telem_function helper) {
+    telem_helper = helper;
+    if (!telem_start(file_name, isclient ? "client" : "worker", interval,
+		     agent_telem))
+	return false;
+    telem_set_agent(own_agent);
+    return true;
+}
+
+/* Handlers to move state when set of workers changes */
+void set_migrate_handlers(gc_handler out_handler, migrate_function in_handler) {
+    migrate_out_handler = out_handler;
+    migrate_in_handler = in_handler;
+}
+
+void set_agent_work_helper(work_function wf) {
+    work_helper = wf;
+}
+
+/* Scramble bits of hash value to get position on ring */
+static word_t ring_mix(word_t x) {
+    x ^= x >> 33;
+    x *= 0xff51afd7ed558ccdULL;
+    x ^= x >> 33;
+    x *= 0xc4ceb9fe1a85ec53ULL;
+    x ^= x >> 33;
+    return x;
+}
+
+static int ring_compare(const void *a, const void *b) {
+    word_t pa = ((ring_ele *) a)->point;
+    word_t pb = ((ring_ele *) b)->point;
+    return pa < pb ? -1 : pa > pb ? 1 : 0;
+}
+
+/* Install new set of workers and rebuild hash ring */
+static void set_workers(unsigned nw, unsigned *ids) {
+    if (worker_ids)
+	free_array(worker_ids, nworkers, sizeof(unsigned));
+    if (worker_load)
+	free_array(worker_load, nworkers, sizeof(size_t));
+    if (ring)
+	free_array(ring, ring_size, sizeof(ring_ele));
+    nworkers = nw;
+    worker_ids = calloc_or_fail(nworkers, sizeof(unsigned), "set_workers");
+    worker_load = calloc_or_fail(nworkers, sizeof(size_t), "set_workers");
+    ring_size = (size_t) nworkers * VNODE_CNT;
+    ring = calloc_or_fail(ring_size, sizeof(ring_ele), "set_workers");
+    own_index = -1;
+    unsigned w, v;
+    for (w = 0; w < nworkers; w++) {
+	worker_ids[w] = ids ? ids[w] : w;
+	if (!isclient && worker_ids[w] == own_agent)
+	    own_index = w;
+	for (v = 0; v < VNODE_CNT; v++) {
+	    ring_ele *ele = &ring[w * VNODE_CNT + v];
+	    ele->agent = worker_ids[w];
+	    ele->point = ring_mix(((word_t) worker_ids[w] << 32) | v);
+	}
+    }
+    qsort(ring, ring_size, sizeof(ring_ele), ring_compare);
+#if RPT >= 3
+    report(3, "Hash ring has %u workers, %lu points", nworkers, ring_size);
+#endif
+}
+
+/* Handle message from controller listing current workers */
+static void receive_workers(chunk_ptr msg) {
+    unsigned nw = msg->length - 1;
+    unsigned *ids = calloc_or_fail(nw, sizeof(unsigned), "receive_workers");
+    unsigned w;
+    for (w = 0; w < nw; w++)
+	ids[w] = (unsigned) chunk_get_word(msg, w+1);
+    set_workers(nw, ids);
+    free_array(ids, nw, sizeof(unsigned));
+    workers_changed = true;
+#if RPT >= 2
+    report(2, "Set of workers changed.  Now have %u workers", nw);
+#endif
+}
+
+/* Send message directly to controller */
+bool send_to_controller(chunk_ptr msg) {
+    return chunk_write(controller_fd, msg);
+}
+
 typedef enum {
     GC_IDLE,
     GC_REQUESTED,
@@ -225,6 +390,7 @@ void init_agent(bool iscli, char *controller_name, unsigned controller_port,
       (Will be updated when get first message from controller) */
     nrouters = 1;
     chunk_ptr amsg = NULL;
+    bool get_workers = false;
     unsigned ridx = 0;;
     while (ridx < nrouters) {
 	msg = chunk_read_unbuffered(controller_fd, &eof);
@@ -241,6 +407,8 @@ void init_agent(bool iscli, char *controller_name, unsigned controller_port,
 		amsg = msg_new_register_agent(own_agent);
 		nworkers = msg_get_header_workercount(h);
 		nrouters = msg_get_header_wordcount(h);
+		/* Opcode field set when worker list follows */
+		get_workers = msg_get_header_opcode(h) != 0;
 		router_fd_array = calloc_or_fail(nrouters, sizeof(int),
 						 "init_agent");
 #if RPT >= 3
@@ -304,6 +472,16 @@ void init_agent(bool iscli, char *controller_name, unsigned controller_port,
 #if RPT >= 2
     report(2, "All %d routers connected", nrouters);
 #endif
+    set_workers(nworkers, NULL);
+    if (get_workers) {
+	/* Workers are not numbered consecutively */
+	msg = chunk_read_unbuffered(controller_fd, &eof);
+	if (eof || msg_get_header_code(chunk_get_word(msg, 0)) != MSG_WORKERS)
+	    err(true, "Expected list of workers from controller");
+	receive_workers(msg);
+	chunk_free(msg);
+	workers_changed = false;
+    }
     if (isclient) {
 	add_quit_helper(quit_agent);
 	add_cmd("kill", do_agent_kill,
@@ -327,6 +505,8 @@ void init_agent(bool iscli, char *controller_name, unsigned controller_port,
 }
 
 bool quit_agent(int argc, char *argv[]) {
+    /* Final telemetry sample */
+    telem_stop();
     op_ptr op = op_list;
     word_t w;
     while (op) {
@@ -336,6 +516,12 @@ bool quit_agent(int argc, char *argv[]) {
     }
     if (router_fd_array)
 	free_array(router_fd_array, nrouters, sizeof(int));
+    if (worker_load)
+	free_array(worker_load, nworkers, sizeof(size_t));
+    if (worker_ids)
+	free_array(worker_ids, nworkers, sizeof(unsigned));
+    if (ring)
+	free_array(ring, ring_size, sizeof(ring_ele));
     /* Free any pending operations */
     chunk_ptr msg;
     keyvalue_iterstart(operator_table);
@@ -377,6 +563,10 @@ void agent_show_stat() {
 "Operands.  Total generated %" PRIu64 ".  Routed locally %" PRIu64,
 	   agent_stat_counter[STATA_OPERAND_TOTAL],
 	   agent_stat_counter[STATA_OPERAND_LOCAL]);
+    report(0,
+"Load.  Peak queue depth %" PRIu64 ".  Operations moved %" PRIu64,
+	   agent_stat_counter[STATA_QUEUE_PEAK],
+	   agent_stat_counter[STATA_OPERATION_MOVED]);
 }
 
 bool do_agent_kill(int argc, char *argv[]) {
@@ -436,24 +626,56 @@ word_t new_operator_id() {
 
 /* Get agent ID for worker based on some hashed value */
 unsigned choose_hashed_worker(word_t hash) {
-    return hash % nworkers;
+    if (nworkers == 1)
+	return worker_ids[0];
+    word_t point = ring_mix(hash);
+    /* Find first ring element with point >= hashed value */
+    size_t lo = 0;
+    size_t hi = ring_size;
+    while (lo < hi) {
+	size_t mid = (lo + hi) / 2;
+	if (ring[mid].point < point)
+	    lo = mid + 1;
+	else
+	    hi = mid;
+    }
+    if (lo == ring_size)
+	/* Wrap around */
+	lo = 0;
+    return ring[lo].agent;
 }
 
 /* Get agent ID for random worker */
 unsigned choose_random_worker() {
-    return
-	choose_hashed_worker(random());
+    return worker_ids[random() % nworkers];
 }
 
 
-/* Get agent ID for random worker */
+/* Number of operations waiting for operands at this agent */
+static size_t queue_depth() {
+    return operator_table->nelements + deferred_operand_table->nelements;
+}
+
+void set_agent_balance(bool enable) {
+    balance_load = enable;
+}
+
+/*
+  Get agent ID for arbitrary worker.
+  With load balancing, use power-of-two choices,
+  where one choice is always the local worker.
+*/
 unsigned choose_some_worker() {
-    return
-#if 0
-	choose_random_worker();
-#else
-	choose_own_worker();
-#endif
+    if (!balance_load || own_index < 0 || nworkers <= 1)
+	return choose_own_worker();
+    unsigned other = random() % (nworkers-1);
+    if (other >= own_index)
+	other++;
+    if (worker_load[other] + LOAD_SLACK < queue_depth()) {
+	agent_stat_counter[STATA_OPERATION_MOVED]++;
+	return worker_ids[other];
+    }
+    return choose_own_worker();
 }
 
 /* Get agent ID for local worker */
@@ -680,6 +902,7 @@ static bool check_fire(chunk_ptr op) {
 	}
 	ls = ls->next;
     }
+    telem_fired++;
     if (opfun) {
 	if (!opfun(op))
 	    err(false, "Error encountered firing operator with id 0x%lx", id);
@@ -831,6 +1054,7 @@ static void receive_operation(chunk_ptr op) {
 /* For workers only */
 static void receive_operand(chunk_ptr oper) {
     word_t w;
+    telem_operands++;
     dword_t dh = chunk_get_dword(oper, 0);
     word_t id = msg_get_dheader_op_id(dh);
     unsigned offset = msg_get_dheader_offset(dh);
@@ -859,8 +1083,39 @@ static void receive_operand(chunk_ptr oper) {
     }
 }
 
+/* Forget advertised queue depths.  Flushed state has no pending operations */
+static void reset_load() {
+    unsigned w;
+    for (w = 0; w < nworkers; w++)
+	worker_load[w] = 0;
+    last_load = 0;
+}
+
+/* Track queue depth and notify controller when it changes significantly */
+static void advertise_load() {
+    size_t depth = queue_depth();
+    if (depth > agent_stat_counter[STATA_QUEUE_PEAK])
+	agent_stat_counter[STATA_QUEUE_PEAK] = depth;
+    if (!balance_load)
+	return;
+    size_t delta = depth > last_load ? depth - last_load : last_load - depth;
+    if (delta < LOAD_REPORT_DELTA)
+	return;
+    chunk_ptr msg = msg_new_load(own_agent, depth);
+    if (chunk_write(controller_fd, msg)) {
+	last_load = depth;
+#if RPT >= 5
+	report(5, "Advertised queue depth %lu", depth);
+#endif
+    } else {
+	err(false, "Failed to send load information to controller");
+    }
+    chunk_free(msg);
+}
 
 void run_worker() {
+    /* Don't wait for messages while background work remains */
+    struct timeval zero_timeout = {0, 0};
     while (true) {
 	/* Select among controller port, and connections to routers */
 	FD_ZERO(&cset);
@@ -870,7 +1125,8 @@ void run_worker() {
 	for (ridx = 0; ridx < nrouters; ridx++)
 	    add_cfd(router_fd_array[ridx]);
 
-	buf_select(maxcfd+1, &cset, NULL, NULL, NULL);
+	buf_select(maxcfd+1, &cset, NULL, NULL,
+		   work_pending ? &zero_timeout : telem_timeout());
 	int fd;
 	for (fd = 0; fd <= maxcfd; fd++) {
 	    if (!FD_ISSET(fd, &cset))
@@ -915,6 +1171,7 @@ void run_worker() {
 #if RPT >= 5
 		    report(5, "Received flush message from controller");
 #endif
+		    reset_load();
 		    if (flush_helper) {
 			chunk_ptr msg = flush_helper();
 			if (!msg)
@@ -969,6 +1226,28 @@ void run_worker() {
 		    chunk_free(msg);
 		    gc_finish(code);
 		    break;
+		case MSG_LOAD:
+		    for (ridx = 0; ridx < nworkers; ridx++) {
+			if (worker_ids[ridx] == agent)
+			    worker_load[ridx] = (size_t) chunk_get_word(msg, 1);
+		    }
+		    chunk_free(msg);
+		    break;
+		case MSG_WORKERS:
+		    receive_workers(msg);
+		    chunk_free(msg);
+		    break;
+		case MSG_MIGRATE:
+		    if (msg->length == 1) {
+			/* End of migration.  Echo back to controller */
+			if (!chunk_write(controller_fd, msg))
+			    err(false,
+"Failed to acknowledge end of migration to controller");
+		    } else if (migrate_in_handler) {
+			migrate_in_handler(msg);
+		    }
+		    chunk_free(msg);
+		    break;
 		default:
 		    chunk_free(msg);
 		    err(false,
@@ -990,6 +1269,10 @@ void run_worker() {
 		}
 	    }
 	}
+	if (work_pending)
+	    work_pending = work_helper();
+	advertise_load();
+	telem_check();
     }
     quit_agent(0, NULL);
 }
@@ -1001,13 +1284,9 @@ void undefer() {
 	gc_start(MSG_GC_START);
 }
 
-/* Fire an operation and wait for returned operand */
-chunk_ptr fire_and_wait_defer(chunk_ptr msg) {
+/* Wait for operand to be returned to client */
+static chunk_ptr wait_for_operand() {
     chunk_ptr rval = NULL;
-    if (!send_op(msg)) {
-	err(false, "Failed to send message");
-	return NULL;
-    }
     bool local_done = false;
     while (!(local_done || cmd_done())) {
 	/* Select among controller port, and connections to routers.
@@ -1019,7 +1298,7 @@ chunk_ptr fire_and_wait_defer(chunk_ptr msg) {
 	for (ridx = 0; ridx < nrouters; ridx++)
 	    add_rfd(router_fd_array[ridx]);
 
-	buf_select(maxrfd+1, &rset, NULL, NULL, NULL);
+	buf_select(maxrfd+1, &rset, NULL, NULL, telem_timeout());
 	int fd;
 	for (fd = 0; fd <= maxrfd; fd++) {
 	    if (!FD_ISSET(fd, &rset))
@@ -1093,7 +1372,6 @@ chunk_ptr fire_and_wait_defer(chunk_ptr msg) {
 		case MSG_OPERATION:
 		    chunk_free(msg);
 		    err(false, "Received unexpected operation.  Ignored.");
-		    local_done = true;
 		    break;
 		case MSG_OPERAND:
 #if RPT >= 5
@@ -1108,14 +1386,48 @@ chunk_ptr fire_and_wait_defer(chunk_ptr msg) {
 		    chunk_free(msg);
 		    err(false,
 "Received message with unknown code %u (ignored)", code);
-		    local_done = true;
 		}
 	    }
+	    /* Return one operand per call.  Other ready fds are handled on later calls */
+	    if (local_done)
+		break;
 	}
+	telem_check();
     }
     return rval;
 }
 
+/* Fire an operation and wait for returned operand */
+chunk_ptr fire_and_wait_defer(chunk_ptr msg) {
+    if (!send_op(msg)) {
+	err(false, "Failed to send message");
+	return NULL;
+    }
+    return wait_for_operand();
+}
+
+/* Fire set of operations and wait until all have returned operands */
+bool fire_all_and_wait_defer(chunk_ptr *msgs, size_t cnt) {
+    size_t i;
+    size_t sent = 0;
+    bool ok = true;
+    for (i = 0; i < cnt; i++) {
+	if (send_op(msgs[i]))
+	    sent++;
+	else {
+	    err(false, "Failed to send message");
+	    ok = false;
+	}
+    }
+    for (i = 0; i < sent; i++) {
+	chunk_ptr rmsg = wait_for_operand();
+	if (!rmsg)
+	    return false;
+	chunk_free(rmsg);
+    }
+    return ok;
+}
+
 chunk_ptr fire_and_wait(chunk_ptr msg) {
     chunk_ptr result = fire_and_wait_defer(msg);
     undefer();
@@ -1152,7 +1464,8 @@ void run_client(char *infile_name) {
 	FD_ZERO(&cset);
 	maxcfd = 0;
 	add_cfd(controller_fd);
-	cmd_select(maxcfd+1, &cset, NULL, NULL, NULL);
+	cmd_select(maxcfd+1, &cset, NULL, NULL, telem_timeout());
+	telem_check();
 	if (cmd_done())
 	    break;
 	int fd;
@@ -1217,6 +1530,10 @@ void run_client(char *infile_name) {
 		    chunk_free(msg);
 		    gc_finish(code);
 		    break;
+		case MSG_WORKERS:
+		    receive_workers(msg);
+		    chunk_free(msg);
+		    break;
 		default:
 		    chunk_free(msg);
 		    err(false,
@@ -1236,6 +1553,7 @@ void run_client(char *infile_name) {
 
 static void gc_start(unsigned code) {
     gc_state = GC_ACTIVE;
+    init_time(&telem_gc_start);
 #if RPT >= 3
     report(3, "Starting GC");
 #endif
@@ -1268,12 +1586,27 @@ static void gc_finish(unsigned code) {
     } else {
 	if (finish_gc_handler)
 	    finish_gc_handler();
+	/* Send entries to new owners before acknowledging */
+	if (workers_changed && migrate_out_handler)
+	    migrate_out_handler();
 	chunk_ptr msg = msg_new_gc_finish();
 	chunk_write(controller_fd, msg);
 	chunk_free(msg);
+	/* Remaining cleanup proceeds between operations */
+	work_pending = work_helper != NULL;
     }
+    workers_changed = false;
     gc_state = GC_IDLE;
     gc_generation++;
+    double pause = delta_time(&telem_gc_start);
+    telem_gc_cnt++;
+    telem_gc_secs += pause;
+    if (pause > telem_gc_max)
+	telem_gc_max = pause;
+#if RPT >= 1
+    if (isclient)
+	report(1, "GC pause: %.3f seconds", pause);
+#endif
     /* Allow command processing to continue */
     unblock_console();
 }
@@ -3,7 +3,7 @@
 /* Counters tracked by agent */
 enum {STATA_BYTE_PEAK, STATA_MESSAGES_SENT, STATA_MESSAGE_BYTES, STATA_OPERATION_TOTAL,
       STATA_OPERATION_LOCAL, STATA_OPERAND_TOTAL,
-      STATA_OPERAND_LOCAL, NSTATA};
+      STATA_OPERAND_LOCAL, STATA_QUEUE_PEAK, STATA_OPERATION_MOVED, NSTATA};
 
 /* Array of counters for accumulating statistics */
 size_t agent_stat_counter[NSTATA];
@@ -31,13 +31,23 @@ void agent_show_stat();
 /* Create a new operator id */
 word_t new_operator_id();
 
-/* Get agent ID for worker based on some hashed value */
+/* Get agent ID for worker based on some hashed value.
+   Uses consistent hashing, so that adding a worker
+   only changes the owners of a fraction of the values */
 unsigned choose_hashed_worker(word_t hash);
 
 
 /* Get agent ID for arbitary worker (Policy determines how chosen) */
 unsigned choose_some_worker();
 
+/*
+  Enable or disable load-based placement by choose_some_worker.
+  When enabled, workers advertise their queue depths via the controller,
+  and operations go either to the local worker or to a randomly
+  chosen one, whichever has the shorter queue.
+*/
+void set_agent_balance(bool enable);
+
 /* Get agent ID for random worker */
 unsigned choose_random_worker();
 
@@ -98,6 +108,11 @@ chunk_ptr fire_and_wait(chunk_ptr msg);
    Does not start any deferred GC */
 chunk_ptr fire_and_wait_defer(chunk_ptr msg);
 
+/* Fire set of operations, each returning one operand,
+   and wait until all have completed.  Returned operands are discarded.
+   Does not start any deferred GC */
+bool fire_all_and_wait_defer(chunk_ptr *msgs, size_t cnt);
+
 /* Enable a deferred garbage collection */
 void undefer();
 
@@ -106,6 +121,36 @@ typedef void (*gc_handler)();
 
 void set_gc_handlers(gc_handler start_handler, gc_handler finish_handler);
 
+/*
+  Functions to move state when set of workers changes.
+  Worker calls out_handler while finishing GC, after installing the new set.
+  It calls in_handler for each migration message received.
+*/
+typedef void (*migrate_function)(chunk_ptr msg);
+
+void set_migrate_handlers(gc_handler out_handler, migrate_function in_handler);
+
+/*
+  Function to perform a bounded amount of background work after GC,
+  such as sweeping.  Returns true if more work remains.
+  Worker calls it between operations until it returns false,
+  without waiting for messages in the meantime.
+*/
+typedef bool (*work_function)();
+
+void set_agent_work_helper(work_function wf);
+
+/*
+  Start writing periodic telemetry samples to file (see report.h for format).
+  Optional helper adds application-specific counters to each sample.
+  Must be called after init_agent.
+*/
+bool start_agent_telemetry(char *file_name, double interval,
+			   telem_function helper);
+
+/* Send message directly to controller (rather than through router) */
+bool send_to_controller(chunk_ptr msg);
+
 /* Function for requesting a GC by a worker */
 void request_gc();
 
@@ -33,37 +33,71 @@
 /* Can GC be requested based on growth characteristics? */
 bool auto_gc_enabled = true;
 
-/* Unique table uses a linked list for each possible hash value. */
+/* Maximum number of roots for which marking is in progress at once */
+#define GC_MARK_SLICE 64
+
+/* Number of old unique table slots examined per incremental sweep step */
+#define GC_SWEEP_SLICE 4096
+
+/* Should workers sweep incrementally, between operations? */
+static bool incremental_gc = false;
 
 /*
+  Unique table is a flat array of node records, using open addressing
+  with linear probing.  Probing starts at the slot given by the hash
+  of (vref, hiref, loref).  Entries are only removed by GC, which
+  moves the surviving entries into a new table, and so all entries
+  with a given hash lie between the starting slot and the next empty slot.
+
+  During an incremental sweep, the old table remains readable until
+  all of its marked entries have been moved.  Lookups that miss in the
+  new table then check the old one.
+
   Distinguish among elements having same hash with unique ID,
   having value >= 1.
   These are encoded as part of the ref for the function
 */
 
-typedef struct LELE {
-    ref_t ref;
-    chunk_ptr data; /* Chunk containing vref, hiref, loref */
-    struct LELE *next;
-} ulist_ele, *ulist_ptr;
-
-/* Create new element for ulist */
-static ulist_ptr ulist_new(chunk_ptr data, ref_t ref) {
-    ulist_ptr result =  (ulist_ptr) malloc_or_fail(sizeof(ulist_ele),
-						   "ulist_new");
-    result->data = data;
-    result->ref = ref;
-    result->next = NULL;
-    return result;
+/* Initial number of slots in unique table.  Must be power of 2 */
+#define UTABLE_INIT_SIZE 1024
+
+/* Maximum fraction of slots occupied before growing table */
+#define UTABLE_MAX_LOAD 0.7
+
+/* Allocate unique table with at least enough slots to hold cnt entries */
+static void utable_alloc(ref_mgr mgr, size_t cnt) {
+    size_t size = UTABLE_INIT_SIZE;
+    while ((double) cnt > UTABLE_MAX_LOAD * size)
+	size *= 2;
+    mgr->unique_table = calloc_or_fail(size, sizeof(unode_ele), "utable_alloc");
+    mgr->unique_size = size;
 }
-/* Free all elements in a ulist */
-static void ulist_free(ulist_ptr ele) {
-    while (ele) {
-	ulist_ptr nele = ele->next;
-	chunk_free(ele->data);
-	free_block((void *) ele, sizeof(ulist_ele));
-	ele = nele;
-    }
+
+/* Put node into table.  Must not already be there */
+static void utable_place(ref_mgr mgr, unode_ptr node) {
+    size_t mask = mgr->unique_size - 1;
+    size_t idx = REF_GET_HASH(node->ref) & mask;
+    while (mgr->unique_table[idx].ref != 0)
+	idx = (idx + 1) & mask;
+    mgr->unique_table[idx] = *node;
+}
+
+/* Double the number of slots in unique table */
+static void utable_grow(ref_mgr mgr) {
+    unode_ptr old_table = mgr->unique_table;
+    size_t old_size = mgr->unique_size;
+    size_t i;
+    mgr->unique_table = calloc_or_fail(2 * old_size, sizeof(unode_ele),
+				       "utable_grow");
+    mgr->unique_size = 2 * old_size;
+    for (i = 0; i < old_size; i++) {
+	if (old_table[i].ref != 0)
+	    utable_place(mgr, &old_table[i]);
+    }
+    free_array(old_table, old_size, sizeof(unode_ele));
+#if RPT >= 3
+    report(3, "Unique table expanded to %lu slots", mgr->unique_size);
+#endif
 }
 
 /* Encapsulate 3 refs in chunk */
@@ -82,6 +116,13 @@ size_t utable_hash(chunk_ptr ucp) {
     return val & REF_MASK_HASH;
 }
 
+/* Same as utable_hash, but without encoding refs in chunk */
+static size_t utable_hash3(ref_t vref, ref_t hiref, ref_t loref) {
+    word_t words[3] = {(word_t) vref, (word_t) hiref, (word_t) loref};
+    size_t val = wordarray_hash(words, 3);
+    return val & REF_MASK_HASH;
+}
+
 /* Functions to use key/value table to implement unique table */
 /* Use refs as keys, aliased to void* */
 /* Use hash values as keys in unique table */
@@ -100,12 +141,18 @@ bool ref_hash_equal(word_t vval1, word_t vval2) {
 ref_mgr new_ref_mgr() {
     ref_mgr mgr = malloc_or_fail(sizeof(ref_mgr_ele), "new_mgr");
     mgr->variable_cnt = 0;
-    mgr->unique_table = keyvalue_new(word_hash, word_equal);
+    utable_alloc(mgr, 0);
     mgr->ite_table = keyvalue_new(chunk_hash, chunk_equal);
     size_t i;
     for (i = 0; i < NSTAT; i++)
 	mgr->stat_counter[i] = 0;
     mgr->last_nelements = 0;
+    mgr->sweep_table = NULL;
+    mgr->sweep_size = 0;
+    mgr->sweep_pos = 0;
+    mgr->sweep_keep = NULL;
+    mgr->sweep_start_cnt = 0;
+    mgr->sweep_start_bytes = 0;
     return mgr;
 }
 
@@ -115,12 +162,6 @@ ref_t ref_new_variable(ref_mgr mgr) {
 }
 
 
-/* Function to clear out lists in unique table */
-static void clear_ulist(word_t key, word_t value) {
-    ulist_ptr ulist = (ulist_ptr) value;
-    ulist_free(ulist);
-}
-
 /* Function to remove keys from ITE cache */
 static void clear_ite_entry(word_t key, word_t value) {
     chunk_ptr cp = (chunk_ptr) key;
@@ -136,8 +177,11 @@ static void clear_ite_table(ref_mgr mgr) {
 }
 
 void free_ref_mgr(ref_mgr mgr) {
-    keyvalue_apply(mgr->unique_table, clear_ulist);
-    keyvalue_free(mgr->unique_table);
+    free_array(mgr->unique_table, mgr->unique_size, sizeof(unode_ele));
+    if (mgr->sweep_table) {
+	free_array(mgr->sweep_table, mgr->sweep_size, sizeof(unode_ele));
+	set_free(mgr->sweep_keep);
+    }
     clear_ite_table(mgr);
     keyvalue_free(mgr->ite_table);
     free_block(mgr, sizeof(ref_mgr_ele));
@@ -175,12 +219,14 @@ void ref_show(ref_t r, char *buf) {
 }
 
 
-/* Do preparatory steps in canonize.
+/* Do preparatory steps in canonize, without allocating storage.
    Return ref_t if completed, and either REF_RECURSE or its negation if not.
    Variants of REF_RECURSE indicate whether or not final value should be negated.
-   In latter case, set cpp to chunk_ptr that can serve as key to unique table
+   In latter case, *hirefp and *lorefp are set to form used in unique table
 */
-ref_t ref_canonize_local(ref_t vref, ref_t hiref, ref_t loref, chunk_ptr *ucpp) {
+static ref_t ref_canonize_fixup(ref_t vref, ref_t *hirefp, ref_t *lorefp) {
+    ref_t hiref = *hirefp;
+    ref_t loref = *lorefp;
     if (hiref == REF_INVALID || loref == REF_INVALID)
 	return REF_INVALID;
     word_t vlev = REF_GET_VAR(vref);
@@ -203,8 +249,20 @@ ref_t ref_canonize_local(ref_t vref, ref_t hiref, ref_t loref, chunk_ptr *ucpp)
 	hiref = REF_NEGATE(hiref);
 	loref = REF_NEGATE(loref);
     }
-    chunk_ptr ucp = ref3_encode(vref, hiref, loref);
-    *ucpp = ucp;
+    *hirefp = hiref;
+    *lorefp = loref;
+    return return_val;
+}
+
+/* Do preparatory steps in canonize.
+   Return ref_t if completed, and either REF_RECURSE or its negation if not.
+   Variants of REF_RECURSE indicate whether or not final value should be negated.
+   In latter case, set cpp to chunk_ptr that can serve as key to unique table
+*/
+ref_t ref_canonize_local(ref_t vref, ref_t hiref, ref_t loref, chunk_ptr *ucpp) {
+    ref_t return_val = ref_canonize_fixup(vref, &hiref, &loref);
+    if (REF_IS_RECURSE(return_val))
+	*ucpp = ref3_encode(vref, hiref, loref);
     return return_val;
 }
 
@@ -212,81 +270,98 @@ ref_t ref_canonize_local(ref_t vref, ref_t hiref, ref_t loref, chunk_ptr *ucpp)
    Assumes arguments already fixed up and stored in form
    suitable for unique table
 */
-static ref_t ref_canonize_lookup(ref_mgr mgr, chunk_ptr ucp) {
-    size_t h = utable_hash(ucp);
-    ref_t vref = chunk_get_word(ucp, 0);
-    ulist_ptr ls = NULL;
-    bool have_list = keyvalue_find(mgr->unique_table,
-				   (word_t) h, (word_t *) &ls);
-    bool found = false;
-    /* Keep track of location pointing to last element in list */
-    ulist_ptr *tailp = NULL;
-    /* Keep track of largest uniquifier encountered in list */
+static ref_t ref_canonize_lookup(ref_mgr mgr, ref_t vref,
+				 ref_t hiref, ref_t loref) {
+    size_t h = utable_hash3(vref, hiref, loref);
+    size_t mask = mgr->unique_size - 1;
+    size_t idx = h & mask;
+    /* Keep track of largest uniquifier encountered with same hash */
     size_t largest_used = 0;
     ref_t r;
-    /* Traverse list, looking for entry with matching var, hi, lo */
-    while (ls) {
-	if (chunk_equal((word_t) ucp, (word_t) ls->data)) {
-	    /* Found entry */
-	    r = ls->ref;
-	    found = true;
-	    break;
+    /* Probe until find matching entry or empty slot */
+    unode_ptr node = &mgr->unique_table[idx];
+    while (node->ref != 0) {
+	if (REF_GET_HASH(node->ref) == h) {
+	    if (node->vref == vref && node->hiref == hiref
+		&& node->loref == loref)
+		/* Found entry */
+		return node->ref;
+	    size_t uniquifier = REF_GET_UNIQ(node->ref);
+	    if (uniquifier > largest_used)
+		largest_used = uniquifier;
 	}
-	size_t uniquifier = REF_GET_UNIQ(ls->ref);
-	if (uniquifier > largest_used)
-	    largest_used = uniquifier;
-	tailp = &ls->next;
-	ls = ls->next;
-    }
-    if (found) {
-	/* Don't need this chunk */
-	chunk_free(ucp);
-    } else {
-	/* Came to end of list without finding matching entry.
-	   Create a new one. */
-	size_t uniquifier = largest_used + 1;
-	/* See if have exceeded bounds for uniquifier */
-	if (uniquifier > REF_MASK_UNIQ)
-	    err(true, "Exceeded uniquifier bounds.  Hash = 0x%llx", h);
-	if (uniquifier > mgr->stat_counter[STATB_UNIQ_MAX])
-	    mgr->stat_counter[STATB_UNIQ_MAX] = uniquifier;
-	r = PACK_REF(0, BDD_FUNCTION, REF_GET_VAR(vref), h, uniquifier);
-	ls = ulist_new(ucp, r);
+	idx = (idx + 1) & mask;
+	node = &mgr->unique_table[idx];
+    }
+    if (mgr->sweep_table) {
+	/* Entry may be in old table, waiting to be moved */
+	size_t omask = mgr->sweep_size - 1;
+	size_t oidx = h & omask;
+	unode_ptr onode = &mgr->sweep_table[oidx];
+	while (onode->ref != 0) {
+	    if (REF_GET_HASH(onode->ref) == h) {
+		/* Unmarked entries are garbage, but their
+		   uniquifiers must not be reused */
+		if (onode->vref == vref && onode->hiref == hiref
+		    && onode->loref == loref
+		    && set_member(mgr->sweep_keep, (word_t) onode->ref, true)) {
+		    /* Move it now, rather than waiting for sweep */
+		    *node = *onode;
+		    return node->ref;
+		}
+		size_t uniquifier = REF_GET_UNIQ(onode->ref);
+		if (uniquifier > largest_used)
+		    largest_used = uniquifier;
+	    }
+	    oidx = (oidx + 1) & omask;
+	    onode = &mgr->sweep_table[oidx];
+	}
+    }
+    /* Came to empty slot without finding matching entry.
+       Create a new one. */
+    size_t uniquifier = largest_used + 1;
+    /* See if have exceeded bounds for uniquifier */
+    if (uniquifier > REF_MASK_UNIQ)
+	err(true, "Exceeded uniquifier bounds.  Hash = 0x%llx", h);
+    if (uniquifier > mgr->stat_counter[STATB_UNIQ_MAX])
+	mgr->stat_counter[STATB_UNIQ_MAX] = uniquifier;
+    r = PACK_REF(0, BDD_FUNCTION, REF_GET_VAR(vref), h, uniquifier);
 #if RPT >= 4
-	ref_t vref = chunk_get_word(ucp, 0);
-	ref_t hiref = chunk_get_word(ucp, 1);
-	ref_t loref = chunk_get_word(ucp, 2);
-	char vbuf[24], hibuf[24], lobuf[24], rbuf[24];
-	ref_show(vref, vbuf);
-	ref_show(hiref, hibuf);
-	ref_show(loref, lobuf);
-	ref_show(r, rbuf);
-	report(4, "Creating unique table entry [%s,%s,%s] --> %s",
-	       vbuf, hibuf, lobuf, rbuf);
+    char vbuf[24], hibuf[24], lobuf[24], rbuf[24];
+    ref_show(vref, vbuf);
+    ref_show(hiref, hibuf);
+    ref_show(loref, lobuf);
+    ref_show(r, rbuf);
+    report(4, "Creating unique table entry [%s,%s,%s] --> %s",
+	   vbuf, hibuf, lobuf, rbuf);
 #endif
-	mgr->stat_counter[STATB_UNIQ_CURR]++;
-	if (mgr->stat_counter[STATB_UNIQ_CURR]
-	    > mgr->stat_counter[STATB_UNIQ_PEAK])
-	    mgr->stat_counter[STATB_UNIQ_PEAK]
-		= mgr->stat_counter[STATB_UNIQ_CURR];
-	mgr->stat_counter[STATB_UNIQ_TOTAL]++;
-	if (have_list) {
-	    *tailp = ls;
-	    mgr->stat_counter[STATB_UNIQ_COLLIDE]++;
-	} else {
-	    /* First entry for this hash */
-	    keyvalue_insert(mgr->unique_table, (word_t) h, (word_t) ls);
-	}
+    if (largest_used > 0)
+	mgr->stat_counter[STATB_UNIQ_COLLIDE]++;
+    mgr->stat_counter[STATB_UNIQ_CURR]++;
+    if (mgr->stat_counter[STATB_UNIQ_CURR]
+	> mgr->stat_counter[STATB_UNIQ_PEAK])
+	mgr->stat_counter[STATB_UNIQ_PEAK]
+	    = mgr->stat_counter[STATB_UNIQ_CURR];
+    mgr->stat_counter[STATB_UNIQ_TOTAL]++;
+    if ((double) mgr->stat_counter[STATB_UNIQ_CURR]
+	> UTABLE_MAX_LOAD * mgr->unique_size) {
+	unode_ele nnode = {r, vref, hiref, loref};
+	utable_grow(mgr);
+	utable_place(mgr, &nnode);
+    } else {
+	node->ref = r;
+	node->vref = vref;
+	node->hiref = hiref;
+	node->loref = loref;
     }
     return r;
 }
 
 ref_t ref_canonize(ref_mgr mgr, ref_t vref, ref_t hiref, ref_t loref) {
-    chunk_ptr ucp;
-    ref_t r = ref_canonize_local(vref, hiref, loref, &ucp);
+    ref_t r = ref_canonize_fixup(vref, &hiref, &loref);
     if (REF_IS_RECURSE(r)) {
 	size_t neg = REF_GET_NEG(r);
-	r = ref_canonize_lookup(mgr, ucp);
+	r = ref_canonize_lookup(mgr, vref, hiref, loref);
 	if (neg)
 	    r = REF_NEGATE(r);
     }
@@ -320,35 +395,48 @@ bool ref_deref_local(ref_t r, ref_t *vrefp, ref_t *hirefp, ref_t *lorefp) {
     }
 }
 
-chunk_ptr ref_deref_lookup(ref_mgr mgr, ref_t r) {
+/* Find entry for ref in table with given number of slots */
+static unode_ptr utable_find(unode_ptr table, size_t size, ref_t r) {
+    size_t mask = size - 1;
+    size_t idx = REF_GET_HASH(r) & mask;
+    while (table[idx].ref != 0) {
+	if (table[idx].ref == r)
+	    return &table[idx];
+	idx = (idx + 1) & mask;
+    }
+    return NULL;
+}
+
+/* Find unique table entry for function ref.  Return NULL if not found */
+static unode_ptr ref_deref_lookup(ref_mgr mgr, ref_t r) {
     if (REF_GET_TYPE(r) != BDD_FUNCTION) {
 	err(false, "Attempted to dereference non-function node");
 	return NULL;
     }
-    size_t h = REF_GET_HASH(r);
-    ulist_ptr ls = NULL;
-    ulist_ptr ele = ls;
-    keyvalue_find(mgr->unique_table, (word_t) h, (word_t *) &ls);
-    ele = ls;
-    while (ele) {
-	if (ele->ref == r)
-	    return ele->data;
-	ele = ele->next;
+    unode_ptr node = utable_find(mgr->unique_table, mgr->unique_size, r);
+    if (node)
+	return node;
+    /* Marked entries remain in old table until swept */
+    if (mgr->sweep_table) {
+	node = utable_find(mgr->sweep_table, mgr->sweep_size, r);
+	if (node)
+	    return node;
     }
 #if RPT >= 3
-    if (ls) {
-	char buf[24];
-	ref_show(r, buf);
-	report(3, "Looking for ref %s.  Found list in hash table, but no entry",
-	       buf);
-	ele = ls;
-	while (ele) {
-
+    size_t h = REF_GET_HASH(r);
+    size_t mask = mgr->unique_size - 1;
+    char buf[24];
+    ref_show(r, buf);
+    report(3, "Looking for ref %s.  No entry in unique table", buf);
+    size_t idx = h & mask;
+    while (mgr->unique_table[idx].ref != 0) {
+	ref_t er = mgr->unique_table[idx].ref;
+	if (REF_GET_HASH(er) == h) {
 	    char ebuf[24];
-	    ref_show(ele->ref, ebuf);
+	    ref_show(er, ebuf);
 	    report(3, "\tMismatch with %s", ebuf);
-	    ele = ele->next;
 	}
+	idx = (idx + 1) & mask;
     }
 #endif
     return NULL;
@@ -359,17 +447,17 @@ void ref_deref(ref_mgr mgr, ref_t r,
     if (ref_deref_local(r, vrefp, hirefp, lorefp))
 	return;
     ref_t ar = REF_ABSVAL(r);
-    chunk_ptr cp = ref_deref_lookup(mgr, ar);
-    if (cp == NULL) {
+    unode_ptr node = ref_deref_lookup(mgr, ar);
+    if (node == NULL) {
 	char buf[24];
 	ref_show(ar, buf);
 	err(false, "Could not find unique table entry for %s", buf);
 	*vrefp = *hirefp = *lorefp = REF_INVALID;
 	return;
     }
-    *vrefp = (ref_t) chunk_get_word(cp, 0);
-    ref_t hiref = (ref_t) chunk_get_word(cp, 1);
-    ref_t loref = (ref_t) chunk_get_word(cp, 2);
+    *vrefp = node->vref;
+    ref_t hiref = node->hiref;
+    ref_t loref = node->loref;
     if (REF_GET_NEG(r)) {
 	*hirefp = REF_NEGATE(hiref); *lorefp = REF_NEGATE(loref);
     } else {
@@ -1121,68 +1209,85 @@ keyvalue_table_ptr ref_shift(ref_mgr mgr, set_ptr roots,
     return result;
 }
 
-/* Do garbage collection, eliminating all but refs in rset */
-static void complete_collection(ref_mgr mgr, set_ptr rset) {
-    size_t start_cnt = 0;
-    size_t start_bytes = current_bytes;
-    size_t end_cnt = 0;
-    size_t end_bytes = 0;
-    keyvalue_table_ptr old_uniq = mgr->unique_table;
-    keyvalue_table_ptr new_uniq = word_keyvalue_new();
-    ulist_ptr ls;
-    word_t h;
-    while (keyvalue_removenext(old_uniq, &h, (word_t *) &ls)) {
-	ulist_ptr nls = NULL;
-	while (ls) {
-	    ulist_ptr ele = ls;
-	    ref_t r = ele->ref;
-	    ls = ele->next;
-	    start_cnt++;
-	    if (set_member(rset, (word_t) r, false)) {
+/* Begin sweep phase of garbage collection, keeping only refs in rset.
+   Takes ownership of rset.
+   Entries are moved to the new table by later calls to sweep_step */
+static void sweep_start(ref_mgr mgr, set_ptr rset) {
+    mgr->sweep_start_cnt = mgr->stat_counter[STATB_UNIQ_CURR];
+    mgr->sweep_start_bytes = current_bytes;
+    mgr->sweep_table = mgr->unique_table;
+    mgr->sweep_size = mgr->unique_size;
+    mgr->sweep_pos = 0;
+    mgr->sweep_keep = rset;
+    utable_alloc(mgr, rset->nelements);
+    /* Cache may refer to nodes that are being removed */
+    clear_ite_table(mgr);
+    mgr->stat_counter[STATB_UNIQ_CURR] = rset->nelements;
+    mgr->last_nelements = rset->nelements;
+}
+
+/* Examine up to limit slots of old table.
+   Return true if more of the sweep remains */
+static bool sweep_step(ref_mgr mgr, size_t limit) {
+    if (!mgr->sweep_table)
+	return false;
+    size_t i;
+    for (i = 0; i < limit && mgr->sweep_pos < mgr->sweep_size; i++) {
+	unode_ptr node = &mgr->sweep_table[mgr->sweep_pos++];
+	ref_t r = node->ref;
+	if (r == 0)
+	    continue;
+	/* Entries already moved by lookups are no longer in keep set */
+	if (set_member(mgr->sweep_keep, (word_t) r, true)) {
 #if RPT >= 4
-		char buf[24];
-		ref_show(r, buf);
-		report(4, "Keeping %s", buf);
+	    char buf[24];
+	    ref_show(r, buf);
+	    report(4, "Keeping %s", buf);
 #endif
-		/* Want to keep this entry.  Move over to new list */
-		ele->next = nls;
-		nls = ele;
-		end_cnt++;
-	    } else {
-		/* Don't need this one */
+	    utable_place(mgr, node);
+	} else {
 #if RPT >= 4
-		char buf[24];
-		ref_show(r, buf);
-		report(4, "Removing %s", buf);
+	    char buf[24];
+	    ref_show(r, buf);
+	    report(4, "Removing %s", buf);
 #endif
-		chunk_free(ele->data);
-		free_block((void *) ele, sizeof(ulist_ele));
-	    }
-	}
-	if (nls) {
-	    keyvalue_insert(new_uniq, h, (word_t) nls);
 	}
     }
-    keyvalue_free(old_uniq);
-    mgr->unique_table = new_uniq;
-    clear_ite_table(mgr);
-    mgr->stat_counter[STATB_UNIQ_CURR] = end_cnt;
-    mgr->last_nelements = end_cnt;
-    end_bytes = current_bytes;
+    if (mgr->sweep_pos < mgr->sweep_size)
+	return true;
+    /* Marked refs that had no entry (e.g., variables) were counted at start */
+    size_t extra = mgr->sweep_keep->nelements;
+    mgr->stat_counter[STATB_UNIQ_CURR] -= extra;
+    mgr->last_nelements -= extra;
+    free_array(mgr->sweep_table, mgr->sweep_size, sizeof(unode_ele));
+    set_free(mgr->sweep_keep);
+    mgr->sweep_table = NULL;
+    mgr->sweep_size = 0;
+    mgr->sweep_pos = 0;
+    mgr->sweep_keep = NULL;
 #if RPT >= 1
     report(1, "GC: %lu (%.3f) --> %lu (%.3f) function refs (GB).  %.3f GB resident",
-	   start_cnt, gigabytes(start_bytes), end_cnt, gigabytes(end_bytes),
+	   mgr->sweep_start_cnt, gigabytes(mgr->sweep_start_bytes),
+	   mgr->last_nelements, gigabytes(current_bytes),
 	   gigabytes(resident_bytes()));
 #endif
+    return false;
+}
+
+/* Complete any sweep in progress */
+static void sweep_finish(ref_mgr mgr) {
+    while (sweep_step(mgr, mgr->sweep_size))
+	;
 }
 
 
 /* Local garbage collection.
    Find all nodes reachable from roots and keep only those in unique table */
 void ref_collect(ref_mgr mgr, set_ptr roots) {
+    sweep_finish(mgr);
     set_ptr rset = ref_reach(mgr, roots);
-    complete_collection(mgr, rset);
-    set_free(rset);
+    sweep_start(mgr, rset);
+    sweep_finish(mgr);
 }
 
 
@@ -1207,6 +1312,10 @@ void ref_show_stat(ref_mgr mgr) {
 	   mgr->stat_counter[STATA_OPERAND_TOTAL],
 	   mgr->stat_counter[STATA_OPERAND_LOCAL]);
     report(0,
+"Load.  Peak queue depth %" PRIu64 ".  Operations moved %" PRIu64,
+	   mgr->stat_counter[STATA_QUEUE_PEAK],
+	   mgr->stat_counter[STATA_OPERATION_MOVED]);
+    report(0,
 "Unique table.  Total generated %" PRIu64 ".  Current %" PRIu64
 ".  Peak %" PRIu64 ".  Collisions %" PRIu64 ".  Max uniq %" PRIu64,
 	   mgr->stat_counter[STATB_UNIQ_TOTAL],
@@ -1490,23 +1599,18 @@ bool do_canonize_op(chunk_ptr op) {
     ref_t vref = (ref_t) chunk_get_word(op,  0+OPER_SIZE+OP_HEADER_CNT);
     ref_t hiref = (ref_t) chunk_get_word(op, 1+OPER_SIZE+OP_HEADER_CNT);
     ref_t loref = (ref_t) chunk_get_word(op, 2+OPER_SIZE+OP_HEADER_CNT);
-    chunk_ptr ucp;
     bool ok = true;
-    ref_t r = ref_canonize_local(vref, hiref, loref, &ucp);
+    ref_t r = ref_canonize_fixup(vref, &hiref, &loref);
     if (!REF_IS_RECURSE(r)) {
 	ok = send_ref_as_operand(dest, r);
 	return ok;
     }
     word_t negate = REF_GET_NEG(r);
-    word_t hash = utable_hash(ucp);
-    ref_t nvref = (ref_t) chunk_get_word(ucp, 0);
-    ref_t nhiref = (ref_t) chunk_get_word(ucp, 1);
-    ref_t nloref = (ref_t) chunk_get_word(ucp, 2);
-    chunk_ptr cop = build_canonize_lookup(dest, hash, nvref,
-					  nhiref, nloref, negate);
+    word_t hash = utable_hash3(vref, hiref, loref);
+    chunk_ptr cop = build_canonize_lookup(dest, hash, vref,
+					  hiref, loref, negate);
     ok = send_op(cop);
     chunk_free(cop);
-    chunk_free(ucp);
     return ok;
 }
 
@@ -1518,8 +1622,7 @@ bool do_canonize_lookup_op(chunk_ptr op) {
     ref_t hiref = (ref_t) chunk_get_word(op, 2+OPER_SIZE+OP_HEADER_CNT);
     ref_t loref = (ref_t) chunk_get_word(op, 3+OPER_SIZE+OP_HEADER_CNT);
     bool negate = (bool) chunk_get_word(op,  4+OPER_SIZE+OP_HEADER_CNT);
-    chunk_ptr ucp = ref3_encode(vref, hiref, loref);
-    ref_t r = ref_canonize_lookup(mgr, ucp);
+    ref_t r = ref_canonize_lookup(mgr, vref, hiref, loref);
     if (negate)
 	r = REF_NEGATE(r);
     bool ok = send_ref_as_operand(dest, r);
@@ -2189,7 +2292,19 @@ keyvalue_table_ptr dist_count(ref_mgr mgr, set_ptr roots) {
     return ctable;
 }
 
+/* Fire marking operations and wait for all of them to complete */
+static void dist_mark_slice(chunk_ptr *msgs, size_t cnt) {
+    size_t i;
+    fire_all_and_wait_defer(msgs, cnt);
+    for (i = 0; i < cnt; i++)
+	chunk_free(msgs[i]);
+}
+
+/* Mark from roots.  Marking proceeds from up to GC_MARK_SLICE roots at once,
+   rather than waiting for each root before starting the next */
 void dist_mark(ref_mgr mgr, set_ptr roots) {
+    chunk_ptr msgs[GC_MARK_SLICE];
+    size_t cnt = 0;
     set_iterstart(roots);
     word_t w;
     while (set_iternext(roots, &w)) {
@@ -2201,12 +2316,14 @@ void dist_mark(ref_mgr mgr, set_ptr roots) {
 	ref_show(r, buf);
 	report(5, "Starting mark at root %s", buf);
 #endif
-	chunk_ptr msg = build_uop_down(dest, 0, r);
-	chunk_ptr rmsg = fire_and_wait(msg);
-	chunk_free(msg);
-	if (rmsg)
-	    chunk_free(rmsg);
+	msgs[cnt++] = build_uop_down(dest, 0, r);
+	if (cnt == GC_MARK_SLICE) {
+	    dist_mark_slice(msgs, cnt);
+	    cnt = 0;
+	}
     }
+    if (cnt > 0)
+	dist_mark_slice(msgs, cnt);
 }
 
 set_ptr dist_support(ref_mgr mgr, set_ptr roots) {
@@ -2390,9 +2507,11 @@ void uop_finish(unsigned id) {
     keyvalue_table_ptr atable = NULL;
     switch(umgr->operation) {
     case UOP_MARK:
+	/* Sweep takes ownership of marked set */
 	aset = (set_ptr) umgr->auxinfo;
-	complete_collection(mgr, aset);
-	set_free(aset);
+	sweep_start(mgr, aset);
+	if (!incremental_gc)
+	    sweep_finish(mgr);
 	break;
     case UOP_DENSITY:
     case UOP_PCOUNT:
@@ -2431,6 +2550,8 @@ static char *stat_items[NSTAT] = {
     "Total local operations",
     "Total operands   sent ",
     "Total local operands  ",
+    "Peak operation queue  ",
+    "Operations rebalanced ",
     /* These come from BDD package */
     "Current unique entries",
     "Peak unique entries   ",
@@ -2470,10 +2591,134 @@ void do_summary_stat(chunk_ptr smsg) {
 #endif
 }
 
+/* Add BDD counters to worker telemetry sample */
+void worker_telem() {
+    ref_mgr mgr = dmgr->rmgr;
+    telem_field("uniq", mgr->stat_counter[STATB_UNIQ_CURR]);
+    telem_field("uniq_peak", mgr->stat_counter[STATB_UNIQ_PEAK]);
+    telem_field("itec", mgr->stat_counter[STATB_ITEC_CURR]);
+    telem_field("ite_total", mgr->stat_counter[STATB_ITE_CNT]);
+    telem_field("ite_deferred", dmgr->deferred_ite_table->nelements);
+    telem_field("sweep_left", mgr->sweep_table ? mgr->sweep_keep->nelements : 0);
+}
+
+void set_incremental_gc(bool enable) {
+    incremental_gc = enable;
+}
+
 void worker_gc_start() {
+    /* Previous sweep must complete before marking */
+    sweep_finish(dmgr->rmgr);
     uop_start(0, UOP_MARK, 0, NULL);
 }
 
+bool worker_gc_sweep() {
+    return sweep_step(dmgr->rmgr, GC_SWEEP_SLICE);
+}
+
 void worker_gc_finish() {
     uop_finish(0);
 }
+
+/* Maximum number of unique table entries per migration message */
+#define MIGRATE_MAX ((CHUNK_MAX_LENGTH-1)/4)
+
+/* Unique table entries being collected for one destination worker */
+typedef struct {
+    unsigned agent;
+    size_t count;
+    unode_ele nodes[MIGRATE_MAX];
+} migrate_buf_ele, *migrate_buf_ptr;
+
+static void migrate_send(migrate_buf_ptr buf) {
+    size_t i;
+    chunk_ptr msg = msg_new_migrate(buf->agent, 4 * buf->count);
+    for (i = 0; i < buf->count; i++) {
+	unode_ptr node = &buf->nodes[i];
+	chunk_insert_word(msg, (word_t) node->ref,   4*i+1);
+	chunk_insert_word(msg, (word_t) node->vref,  4*i+2);
+	chunk_insert_word(msg, (word_t) node->hiref, 4*i+3);
+	chunk_insert_word(msg, (word_t) node->loref, 4*i+4);
+    }
+    if (!send_to_controller(msg))
+	err(false, "Failed to send migration message for agent %u",
+	    buf->agent);
+    chunk_free(msg);
+    buf->count = 0;
+}
+
+/* After change in set of workers, send unique table entries
+   to their new owners, and keep only the ones this worker still owns */
+void worker_migrate_out() {
+    ref_mgr mgr = dmgr->rmgr;
+    sweep_finish(mgr);
+    unode_ptr old_table = mgr->unique_table;
+    size_t old_size = mgr->unique_size;
+    size_t moved_cnt = 0;
+    size_t i;
+    keyvalue_table_ptr buf_table = word_keyvalue_new();
+    utable_alloc(mgr, mgr->stat_counter[STATB_UNIQ_CURR]);
+    for (i = 0; i < old_size; i++) {
+	ref_t r = old_table[i].ref;
+	if (r == 0)
+	    continue;
+	unsigned owner = choose_hashed_worker(REF_GET_HASH(r));
+	if (owner == own_agent) {
+	    utable_place(mgr, &old_table[i]);
+	    continue;
+	}
+	migrate_buf_ptr buf;
+	if (!keyvalue_find(buf_table, (word_t) owner, (word_t *) &buf)) {
+	    buf = malloc_or_fail(sizeof(migrate_buf_ele), "worker_migrate_out");
+	    buf->agent = owner;
+	    buf->count = 0;
+	    keyvalue_insert(buf_table, (word_t) owner, (word_t) buf);
+	}
+	buf->nodes[buf->count++] = old_table[i];
+	if (buf->count == MIGRATE_MAX)
+	    migrate_send(buf);
+	moved_cnt++;
+    }
+    free_array(old_table, old_size, sizeof(unode_ele));
+    word_t wk, wv;
+    while (keyvalue_removenext(buf_table, &wk, &wv)) {
+	migrate_buf_ptr buf = (migrate_buf_ptr) wv;
+	if (buf->count > 0)
+	    migrate_send(buf);
+	free_block(buf, sizeof(migrate_buf_ele));
+    }
+    keyvalue_free(buf_table);
+    mgr->stat_counter[STATB_UNIQ_CURR] -= moved_cnt;
+    mgr->last_nelements = mgr->stat_counter[STATB_UNIQ_CURR];
+#if RPT >= 1
+    report(1, "Migration: Sent %lu unique table entries.  Kept %lu",
+	   moved_cnt, mgr->stat_counter[STATB_UNIQ_CURR]);
+#endif
+}
+
+/* Receive unique table entries now owned by this worker */
+void worker_migrate_in(chunk_ptr msg) {
+    ref_mgr mgr = dmgr->rmgr;
+    size_t n = (msg->length - 1) / 4;
+    size_t i;
+    for (i = 0; i < n; i++) {
+	unode_ele node;
+	node.ref =   (ref_t) chunk_get_word(msg, 4*i+1);
+	node.vref =  (ref_t) chunk_get_word(msg, 4*i+2);
+	node.hiref = (ref_t) chunk_get_word(msg, 4*i+3);
+	node.loref = (ref_t) chunk_get_word(msg, 4*i+4);
+	mgr->stat_counter[STATB_UNIQ_CURR]++;
+	if ((double) mgr->stat_counter[STATB_UNIQ_CURR]
+	    > UTABLE_MAX_LOAD * mgr->unique_size)
+	    utable_grow(mgr);
+	utable_place(mgr, &node);
+    }
+    if (mgr->stat_counter[STATB_UNIQ_CURR]
+	> mgr->stat_counter[STATB_UNIQ_PEAK])
+	mgr->stat_counter[STATB_UNIQ_PEAK]
+	    = mgr->stat_counter[STATB_UNIQ_CURR];
+    mgr->last_nelements = mgr->stat_counter[STATB_UNIQ_CURR];
+#if RPT >= 3
+    report(3, "Migration: Received %lu unique table entries", n);
+#endif
+}
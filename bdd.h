@@ -79,12 +79,30 @@ enum {STATB_UNIQ_CURR = NSTATA, STATB_UNIQ_PEAK, STATB_UNIQ_TOTAL,
       STATB_ITEC_CURR, STATB_ITEC_PEAK, STATB_ITEC_TOTAL,
       STATB_UOP_CNT, STATB_UOP_HIT_CNT, STATB_UOP_STORE_CNT, NSTAT};
 
+/* Entry in unique table.  Empty slots have ref == 0 (a BDD_NULL ref) */
+typedef struct {
+    ref_t ref;
+    ref_t vref;
+    ref_t hiref;
+    ref_t loref;
+} unode_ele, *unode_ptr;
+
 typedef struct {
     int variable_cnt;
-    keyvalue_table_ptr unique_table;
+    /* Open-addressing unique table, using linear probing */
+    unode_ptr unique_table;
+    size_t unique_size; /* Number of slots.  Always a power of 2 */
     keyvalue_table_ptr ite_table;
     size_t stat_counter[NSTAT];
     size_t last_nelements;
+    /* Sweep phase of GC.  Marked entries are moved from the old table
+       into unique_table, possibly a slice at a time */
+    unode_ptr sweep_table; /* Old table.  NULL when no sweep in progress */
+    size_t sweep_size;     /* Number of slots in old table */
+    size_t sweep_pos;      /* Next slot in old table to examine */
+    set_ptr sweep_keep;    /* Marked entries not yet moved */
+    size_t sweep_start_cnt;
+    size_t sweep_start_bytes;
 } ref_mgr_ele, *ref_mgr;
 
 /* Create a new manager */
@@ -300,6 +318,24 @@ void do_summary_stat(chunk_ptr smsg);
 void uop_start(unsigned id, unsigned opcode, unsigned nword, word_t *data);
 void uop_finish(unsigned id);
 
+/* Counters added to each worker telemetry sample */
+void worker_telem();
+
 /* GC operarations */
 void worker_gc_start();
 void worker_gc_finish();
+
+/*
+  Enable or disable incremental sweeping by workers.
+  When enabled, a worker acknowledges the end of GC as soon as marking
+  completes, and then moves the marked unique table entries into a new
+  table in bounded slices between operations.
+*/
+void set_incremental_gc(bool enable);
+
+/* Sweep next slice of unique table.  Returns true if more remains */
+bool worker_gc_sweep();
+
+/* Moving unique table entries when set of workers changes */
+void worker_migrate_out();
+void worker_migrate_in(chunk_ptr msg);
@@ -82,6 +82,8 @@ def benchrun(nstart = 8, nend = 14, fspec = "onh-fast-q", ctype = 'n', ztype = Z
                         if mb > 0:
                             megabytes = int(mb * memoryFraction)
                             flags += ['-M', str(megabytes)]
+                            if not old:
+                                flags += ['-m']
                         clist = prog + flags
                         print "Running '%s'" % " ".join(clist)
                         rcode = subprocess.call(clist, stdout = logfile, stderr = logfile)
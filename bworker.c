@@ -27,12 +27,18 @@
 
 
 static void init(char *controller_name, unsigned controller_port,
-		 bool try_self_route, bool try_local_router) {
+		 bool try_self_route, bool try_local_router, bool balance,
+		 bool incremental) {
     init_agent(false, controller_name, controller_port, try_self_route, try_local_router);
+    set_agent_balance(balance);
+    set_incremental_gc(incremental);
     init_dref_mgr();
     set_agent_flush_helper(flush_dref_mgr);
     set_agent_global_helpers(uop_start, uop_finish);
     set_gc_handlers(worker_gc_start, worker_gc_finish);
+    set_migrate_handlers(worker_migrate_out, worker_migrate_in);
+    if (incremental)
+	set_agent_work_helper(worker_gc_sweep);
     add_op_handler(OP_VAR, do_var_op);
     add_op_handler(OP_CANONIZE, do_canonize_op);
     add_op_handler(OP_CANONIZE_LOOKUP, do_canonize_lookup_op);
@@ -50,13 +56,17 @@ static void finish() {
 }
 
 static void usage(char *cmd) {
-    printf("Usage: %s [-h] [-v VLEVEL] [-H HOST] [-P PORT][-r]\n", cmd);
+    printf("Usage: %s [-h] [-v VLEVEL] [-H HOST] [-P PORT][-r][-b][-I] [-T FILE] [-i SECS]\n", cmd);
     printf("\t-h         Print this information\n");
     printf("\t-v VLEVEL  Set verbosity level\n");
     printf("\t-H HOST    Use HOST as controller host\n");
     printf("\t-P PORT    Use PORT as controller port\n");
     printf("\t-n         Force routing through network\n");
     printf("\t-r         Try to use local router\n");
+    printf("\t-b         Balance load when placing ITE recursions\n");
+    printf("\t-I         Sweep incrementally between operations after GC\n");
+    printf("\t-T FILE    Append telemetry samples to FILE\n");
+    printf("\t-i SECS    Interval between telemetry samples (default 1.0)\n");
     exit(0);
 }
 
@@ -69,8 +79,12 @@ int main(int argc, char *argv[]) {
     int level = 1;
     bool try_local_router = false;
     bool try_self_route = true;
+    bool balance = false;
+    bool incremental = false;
+    char *telem_file = NULL;
+    double telem_interval = 1.0;
 
-    while ((c = getopt(argc, argv, "hv:H:P:nr")) != -1) {
+    while ((c = getopt(argc, argv, "hv:H:P:nrbIT:i:")) != -1) {
 	switch (c) {
 	case 'h':
 	    usage(argv[0]);
@@ -91,6 +105,18 @@ int main(int argc, char *argv[]) {
 	case 'r':
 	    try_local_router = true;
 	    break;
+	case 'b':
+	    balance = true;
+	    break;
+	case 'I':
+	    incremental = true;
+	    break;
+	case 'T':
+	    telem_file = optarg;
+	    break;
+	case 'i':
+	    telem_interval = atof(optarg);
+	    break;
 	default:
 	    printf("Unknown option '%c'\n", c);
 	    usage(argv[0]);
@@ -98,7 +124,9 @@ int main(int argc, char *argv[]) {
 	}
     }
     set_verblevel(level);
-    init(buf, port, try_self_route, try_local_router);
+    init(buf, port, try_self_route, try_local_router, balance, incremental);
+    if (telem_file)
+	start_agent_telemetry(telem_file, telem_interval, worker_telem);
     if (signal(SIGTERM, sigterm_handler) == SIG_ERR)
 	err(false, "Couldn't install signal handler");
     run_worker();
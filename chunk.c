@@ -26,11 +26,24 @@ Data structure for representing data as a sequence of 64-bit words
 /* Track number of bytes & number of chunks sent */
 size_t chunks_sent = 0;
 size_t chunk_bytes_sent = 0;
+/* Track number of bytes & number of chunks received */
+size_t chunks_received = 0;
+size_t chunk_bytes_received = 0;
 
 /* Reset tracking information */
 void reset_chunk_stats() {
     chunks_sent = 0;
     chunk_bytes_sent = 0;
+    chunks_received = 0;
+    chunk_bytes_received = 0;
+}
+
+/* Account for chunk that has been read */
+static void count_received(chunk_ptr cp) {
+    size_t len = cp->length;
+    size_t more_bytes = len == 0  ? 0 : WORD_BYTES * (len - 1);
+    chunks_received++;
+    chunk_bytes_received += sizeof(chunk_t) + more_bytes;
 }
 
 /* Report information about chunk used as messages */
@@ -243,7 +256,7 @@ chunk_ptr chunk_read_legacy(int fd, bool *eofp) {
     if (eofp)
 	*eofp = false;
 
-
+    count_received(creadp);
     return chunk_clone(creadp);
 }
 
@@ -318,8 +331,8 @@ int buf_select(int nfds, fd_set *readfds, fd_set *writefds,
 #if RPT >= 5
         report(6, "buffered select on up through %d", maxfd);
 #endif
-        returnVal = select(maxfd+1, &in_set, writefds, exceptfds,
-			   (timeout == NULL ? &zeroval : timeout));
+        /* Buffered input is ready, so don't wait, even with timeout */
+        returnVal = select(maxfd+1, &in_set, writefds, exceptfds, &zeroval);
 
         if (returnVal >= 0)
             returnVal = 0;
@@ -561,6 +574,7 @@ chunk_ptr chunk_read(int fd, bool* eofp)
 #endif
     if (eofp)
 	*eofp = false;
+    count_received(creadp);
     return chunk_clone(creadp);
 }
 
@@ -34,6 +34,9 @@ typedef struct {
 /* Track number of bytes & number of chunks sent */
 extern size_t chunks_sent;
 extern size_t chunk_bytes_sent;
+/* Track number of bytes & number of chunks received */
+extern size_t chunks_received;
+extern size_t chunk_bytes_received;
 
 /* Reset tracking information */
 void reset_chunk_stats();
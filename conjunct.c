@@ -10,6 +10,7 @@
 #include <sys/select.h>
 #include <signal.h>
 #include <math.h>
+#include <pthread.h>
 
 #include "dtype.h"
 #include "table.h"
@@ -53,6 +54,21 @@ int expansion_factor_scaled = 200;
 /* Number of passes of conjunction before giving up */
 int pass_limit = 3;
 
+/* Strategies for choosing pairs of arguments to combine */
+#define PAIRING_SIMILARITY 0  // Weighted support similarity
+#define PAIRING_SMALLEST   1  // Smallest combined size first
+#define PAIRING_BALANCED   2  // Balanced binary tree in argument order
+#define PAIRING_ORDER      3  // Closest in variable order
+#define PAIRING_SCHEDULE   4  // Static schedule read from file
+#define PAIRING_COUNT      5
+int pairing_strategy = PAIRING_SIMILARITY;
+
+/* Static schedule: pairs of argument numbers, one per step.
+   Arguments are numbered from 1, and the product of step s is numbered n+s */
+static int *pair_schedule = NULL;
+static int pair_schedule_length = 0;
+static int pair_schedule_alloc = 0;
+
 /* Lower bound on support coverage metric required to attempt soft and
    (Scaled by 100).
    Distinguish between use in initial preprocessing step, vs. during conjunction operations 
@@ -87,6 +103,11 @@ double max_large_argument_penalty_scaled = 40;
 /* Should tracking information be generated during conjunction? */
 int track_conjunction = 0;
 
+/* Should soft-and and abort limits be adjusted online? */
+int autotune = 0;
+/* Success rate (percent) targeted by online adjustment */
+int tune_target_scaled = 50;
+
 /* Set to force more load/stores & more GCs */
 // #define STRESS
 
@@ -108,6 +129,17 @@ int quantify_threshold = 1000;
 /* Should old conjunct files be kept */
 bool keep_conjunct_files = false;
 
+/* Should file I/O for stored conjuncts be performed by a background thread? */
+int async_io = 1;
+
+/* For how many of the top candidate pairs should stored arguments be prefetched? */
+int prefetch_pairs = 2;
+
+/* How many candidate pairs should be tried concurrently (0 or 1 == one at a time)? */
+int parallel_tries = 0;
+/* Upper bound on parallel_tries */
+#define MAX_PARALLEL_TRIES 64
+
 /* Size of the smallest and largest BDDs in the conjunction */
 size_t max_argument_size = 0;
 size_t min_argument_size = 0;
@@ -132,6 +164,17 @@ size_t total_loaded_nodes = 0;
 size_t total_stores = 0;
 size_t total_stored_nodes = 0;
 
+size_t total_and_exists = 0;
+size_t total_and_exists_vars = 0;
+size_t total_async_stores = 0;
+size_t total_buffer_loads = 0;
+size_t total_prefetches = 0;
+size_t total_prefetch_hits = 0;
+/* Time main thread spent loading directly from files */
+double total_sync_load_seconds = 0.0;
+/* Time main thread spent waiting for background I/O */
+double total_io_wait_seconds = 0.0;
+
 /* Tracking activity to trigger GC */
 size_t total_stored_nodes_last_gc = 0;
 
@@ -151,8 +194,15 @@ typedef struct RELE {
     index_set *support; // Indices representing support set 
     bool in_file;
     char *file_name;
+    size_t file_bytes;  // Size of stored file (0 if unknown)
+    struct IOREQ *io;   // Outstanding background I/O (NULL if none)
     struct RELE *next;
     int id;
+    int version; // Incremented each time function changes
+    int slot;    // Position in pair table (-1 if none)
+    bool scheduled; // Support included in variable occurrence counts
+    int position; // Argument number.  Products numbered after arguments
+    int level;    // Height in tree of combining steps
 } rset_ele;
 
 /* Data collected during conjunction */
@@ -166,6 +216,9 @@ typedef struct {
 bool do_similar(int argc, char *argv[]);
 bool do_coverage(int argc, char *argv[]);
 bool do_conjunct(int argc, char *argv[]);
+bool do_trace(int argc, char *argv[]);
+bool do_schedule(int argc, char *argv[]);
+static void check_pairing(int oldval);
 
 void init_conjunct() {
     /* Add commands and options */
@@ -175,25 +228,371 @@ void init_conjunct() {
 	    "f1 f2 ...       | Compute pairwise support similarity for functions");
     add_cmd("cover", do_coverage,
 	    "f1 f2 ...       | Compute pairwise support coverage for functions");
+    add_cmd("trace", do_trace,
+	    " [file]         | Write trace of conjunctions to file (no file to stop)");
+    add_cmd("schedule", do_schedule,
+	    " [file]         | Read static pairing schedule from file (no file to clear)");
     add_param("check", &check_results, "Check results of conjunctoperations", NULL);
     add_param("abort", &abort_limit, "Maximum number of pairs to attempt in single conjunction step", NULL);
     add_param("pass", &pass_limit, "Maximum number of passes during single conjunction", NULL);
+    add_param("pairing", &pairing_strategy,
+	      "Pairing strategy (0:similarity 1:smallest 2:balanced 3:order 4:schedule)", check_pairing);
     add_param("expand", &expansion_factor_scaled, "Maximum expansion of successive BDD sizes (scaled by 100) for each pass", NULL);
     add_param("soft", &inprocess_soft_and_threshold_scaled, "Threshold for attempting soft-and simplification (0-100)", NULL);
     add_param("grow", &soft_and_allow_growth, "Allow growth from soft-and simplification", NULL);
     add_param("track", &track_conjunction, "Track combining order of conjunction", NULL);
+    add_param("autotune", &autotune, "Adjust soft-and and abort limits online", NULL);
+    add_param("tunetarget", &tune_target_scaled, "Success rate targeted by online tuning (0-100)", NULL);
     add_param("preprocess", &preprocess_conjuncts, "Attempt to simplify conjuncts with soft and", NULL);
     add_param("softlookup", &cache_soft_lookup_ratio, "Max cache lookups during soft-and (ratio to arg sizes)", NULL);
     add_param("hardlookup", &cache_soft_lookup_ratio, "Max cache lookups during and (ratio to arg sizes)", NULL);
     add_param("generate", &soft_and_expansion_ratio_scaled, "Limit on nodes generated during soft and", NULL);
     add_param("quantify", &quantify_threshold, "Min. BDD size at which attempt existential quantification (0 == infinity)", NULL);
+    add_param("async", &async_io, "Perform file I/O for stored conjuncts in background", NULL);
+    add_param("prefetch", &prefetch_pairs, "Number of top candidate pairs for which stored arguments are prefetched", NULL);
+    add_param("parallel", &parallel_tries, "Number of candidate pairs to try concurrently in separate CUDD managers", NULL);
     preprocess = 0;
     reprocess = 0;
 }
 
+/*** Background I/O for stored conjuncts ***/
+
+/* CUDD is not thread safe, and so DDs are always converted to and from
+   their stored form by the main thread, using in-memory buffers.
+   A background thread performs the file I/O on these buffers.
+   Spilled DDs are written behind, and can be reloaded from their buffers
+   until the writes complete.  Stored arguments of candidate pairs are read ahead.
+*/
+typedef struct IOREQ {
+    bool write;          // Write buffer to file, rather than read file into buffer
+    bool done;           // Set by I/O thread
+    bool ok;             // Set by I/O thread
+    bool libc_buf;       // Buffer allocated by open_memstream
+    char *buf;
+    size_t bytes;
+    double seconds;      // Time spent by I/O thread
+    rset_ele *owner;
+    struct IOREQ *next;  // Next request waiting for I/O thread
+    struct IOREQ *onext; // Next outstanding request
+} io_request;
+
+static pthread_mutex_t io_mutex = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t io_cvar = PTHREAD_COND_INITIALIZER;
+static pthread_cond_t io_done_cvar = PTHREAD_COND_INITIALIZER;
+static bool io_thread_running = false;
+/* Requests waiting for I/O thread */
+static io_request *io_head = NULL;
+static io_request *io_tail = NULL;
+/* All requests not yet finished.  Only accessed by main thread */
+static io_request *io_outstanding = NULL;
+/* Time spent by I/O thread.  Protected by io_mutex */
+static double io_thread_seconds = 0.0;
+
+static void io_check(int code, char *source) {
+    if (code != 0)
+	err(true, "Error in %s.  Number %d", source, code);
+}
+
+static void *io_thread(void *arg) {
+    while (true) {
+	io_check(pthread_mutex_lock(&io_mutex), "io_thread");
+	while (io_head == NULL)
+	    io_check(pthread_cond_wait(&io_cvar, &io_mutex), "io_thread");
+	io_request *req = io_head;
+	io_head = req->next;
+	if (io_head == NULL)
+	    io_tail = NULL;
+	io_check(pthread_mutex_unlock(&io_mutex), "io_thread");
+
+	double start = elapsed_time();
+	bool ok = false;
+	FILE *file = fopen(req->owner->file_name, req->write ? "w" : "r");
+	if (file != NULL) {
+	    if (req->write)
+		ok = fwrite(req->buf, 1, req->bytes, file) == req->bytes;
+	    else
+		ok = fread(req->buf, 1, req->bytes, file) == req->bytes;
+	    ok = fclose(file) == 0 && ok;
+	}
+	double seconds = elapsed_time() - start;
+
+	io_check(pthread_mutex_lock(&io_mutex), "io_thread");
+	req->ok = ok;
+	req->seconds = seconds;
+	req->done = true;
+	io_thread_seconds += seconds;
+	io_check(pthread_cond_broadcast(&io_done_cvar), "io_thread");
+	io_check(pthread_mutex_unlock(&io_mutex), "io_thread");
+    }
+    return NULL;
+}
+
+static io_request *io_new(bool write, rset_ele *owner, char *buf, size_t bytes, bool libc_buf) {
+    io_request *req = malloc_or_fail(sizeof(io_request), "io_new");
+    req->write = write;
+    req->done = false;
+    req->ok = false;
+    req->libc_buf = libc_buf;
+    req->buf = buf;
+    req->bytes = bytes;
+    req->seconds = 0.0;
+    req->owner = owner;
+    req->next = NULL;
+    req->onext = NULL;
+    return req;
+}
+
+static void io_submit(io_request *req) {
+    if (!io_thread_running) {
+	pthread_t thread;
+	io_check(pthread_create(&thread, NULL, io_thread, NULL), "io_submit");
+	io_check(pthread_detach(thread), "io_submit");
+	io_thread_running = true;
+    }
+    req->owner->io = req;
+    req->onext = io_outstanding;
+    io_outstanding = req;
+    io_check(pthread_mutex_lock(&io_mutex), "io_submit");
+    if (io_tail == NULL)
+	io_head = req;
+    else
+	io_tail->next = req;
+    io_tail = req;
+    io_check(pthread_cond_signal(&io_cvar), "io_submit");
+    io_check(pthread_mutex_unlock(&io_mutex), "io_submit");
+}
+
+static bool io_is_done(io_request *req) {
+    io_check(pthread_mutex_lock(&io_mutex), "io_is_done");
+    bool done = req->done;
+    io_check(pthread_mutex_unlock(&io_mutex), "io_is_done");
+    return done;
+}
+
+/* Block until request completes */
+static void io_wait(io_request *req) {
+    double start = elapsed_time();
+    io_check(pthread_mutex_lock(&io_mutex), "io_wait");
+    while (!req->done)
+	io_check(pthread_cond_wait(&io_done_cvar, &io_mutex), "io_wait");
+    io_check(pthread_mutex_unlock(&io_mutex), "io_wait");
+    total_io_wait_seconds += elapsed_time() - start;
+}
+
+/* Release completed request */
+static void io_finish(io_request *req) {
+    io_request **pp = &io_outstanding;
+    while (*pp != req)
+	pp = &(*pp)->onext;
+    *pp = req->onext;
+    if (req->libc_buf)
+	free(req->buf);
+    else
+	free_block(req->buf, req->bytes);
+    req->owner->io = NULL;
+    free_block(req, sizeof(io_request));
+}
+
+static double io_background_seconds() {
+    io_check(pthread_mutex_lock(&io_mutex), "io_background_seconds");
+    double seconds = io_thread_seconds;
+    io_check(pthread_mutex_unlock(&io_mutex), "io_background_seconds");
+    return seconds;
+}
+
+/* Convert buffer back into DD */
+static ref_t buffer_load(char *buf, size_t bytes) {
+    return shadow_load_buffer(smgr, (unsigned char *) buf, bytes);
+}
+
+/* Release completed writes.  A failed write leaves the DD in memory */
+static void io_reap() {
+    io_request *req = io_outstanding;
+    while (req) {
+	io_request *next = req->onext;
+	if (req->write && io_is_done(req)) {
+	    rset_ele *ele = req->owner;
+	    if (!req->ok) {
+		err(false, "Failed to write DD file '%s'.  Keeping DD in memory", ele->file_name);
+		if (REF_IS_INVALID(ele->fun)) {
+		    ele->fun = buffer_load(req->buf, req->bytes);
+		    if (REF_IS_INVALID(ele->fun))
+			err(true, "Failed to recover DD for file '%s'", ele->file_name);
+		    root_addref(ele->fun, true);
+		}
+		ele->in_file = false;
+		ele->file_bytes = 0;
+	    } else
+		report(5, "Completed write of %zd bytes to file '%s' in %.3f seconds",
+		       req->bytes, ele->file_name, req->seconds);
+	    io_finish(req);
+	}
+	req = next;
+    }
+}
+
+/* Wait for any I/O on element and then discard it */
+static void io_discard(rset_ele *ele) {
+    io_request *req = ele->io;
+    if (req == NULL)
+	return;
+    io_wait(req);
+    io_finish(req);
+}
+
+/*** Quantification schedule ***/
+
+/* During conjunction with quantification, track how many conjuncts in the set
+   have each variable in their support.  A variable whose occurrences are confined
+   to the arguments of a conjunction is dead once they are combined, and so it
+   can be quantified in the same traversal (AND-EXISTS).
+*/
+static int *var_occurrences = NULL;
+static int var_occurrence_size = 0;
+
+static void schedule_update(index_set *support, int delta) {
+    int i;
+    if (support == NULL)
+	return;
+    for (i = 0; i < support->count; i++) {
+	int v = support->indices[i];
+	if (v >= var_occurrence_size) {
+	    err(false, "Internal error.  Variable %d outside quantification schedule", v);
+	    continue;
+	}
+	var_occurrences[v] += delta;
+    }
+}
+
+static void schedule_add(rset_ele *ele) {
+    if (var_occurrences == NULL || ele->scheduled)
+	return;
+    schedule_update(ele->support, 1);
+    ele->scheduled = true;
+}
+
+static void schedule_remove(rset_ele *ele) {
+    if (var_occurrences == NULL || !ele->scheduled)
+	return;
+    schedule_update(ele->support, -1);
+    ele->scheduled = false;
+}
+
+/* Compute occurrence counts for all variables, over all conjuncts in set */
+static void schedule_start(rset_ele *set) {
+    int max_index = -1;
+    rset_ele *ele;
+    for (ele = set; ele; ele = ele->next) {
+	index_set *support = ele->support;
+	if (support && support->count > 0 && support->indices[support->count-1] > max_index)
+	    max_index = support->indices[support->count-1];
+    }
+    var_occurrence_size = max_index+1;
+    var_occurrences = calloc_or_fail(var_occurrence_size+1, sizeof(int), "schedule_start");
+    for (ele = set; ele; ele = ele->next)
+	schedule_add(ele);
+}
+
+static void schedule_finish(rset_ele *set) {
+    rset_ele *ele;
+    if (var_occurrences == NULL)
+	return;
+    for (ele = set; ele; ele = ele->next)
+	ele->scheduled = false;
+    free_array(var_occurrences, var_occurrence_size+1, sizeof(int));
+    var_occurrences = NULL;
+    var_occurrence_size = 0;
+}
+
+/* Find variables that occur only in ele1 and (optionally) ele2 */
+static index_set *schedule_dead(rset_ele *ele1, rset_ele *ele2) {
+    index_set *iset = ele2 == NULL ? index_set_duplicate(ele1->support) : index_set_union(ele1->support, ele2->support);
+    int i;
+    int ncount = 0;
+    for (i = 0; i < iset->count; i++) {
+	int v = iset->indices[i];
+	int pair_count = 1;
+	if (ele2 != NULL && index_set_member(ele1->support, v) && index_set_member(ele2->support, v))
+	    pair_count = 2;
+	if (v < var_occurrence_size && var_occurrences[v] == pair_count)
+	    iset->indices[ncount++] = v;
+    }
+    iset->count = ncount;
+    return iset;
+}
+
+/*** Conjunction trace ***/
+
+/* When enabled, a structured record of each conjunction is written as
+   one JSON object per line.  Events:
+   start:      New conjunction
+   arg:        Initial argument (id, name, size, support)
+   update:     Argument changed by soft-and simplification or quantification
+   candidates: Candidate pairs (with similarities) for a combining step
+   try:        Attempted AND of a pair, with limit and outcome
+   and:        Chosen product for a step
+   done:       End of conjunction
+   Times are in seconds.  See timer/conjunct-trace.py for analysis.
+*/
+static FILE *trace_file = NULL;
+static int trace_conj = 0;
+static int trace_step = 0;
+
+static void trace_support(index_set *iset) {
+    fprintf(trace_file, "[");
+    if (iset) {
+	int i;
+	for (i = 0; i < iset->count; i++)
+	    fprintf(trace_file, i == 0 ? "%d" : ",%d", iset->indices[i]);
+    }
+    fprintf(trace_file, "]");
+}
+
+static void trace_string(char *str) {
+    fputc('"', trace_file);
+    char *c;
+    for (c = str; *c; c++) {
+	if (*c == '"' || *c == '\\')
+	    fputc('\\', trace_file);
+	fputc(*c, trace_file);
+    }
+    fputc('"', trace_file);
+}
+
+/* Element being introduced or changed */
+static void trace_ele(char *event, rset_ele *ele, char *name) {
+    if (!trace_file)
+	return;
+    fprintf(trace_file, "{\"ev\":\"%s\",\"conj\":%d,\"id\":%d,", event, trace_conj, ele->id);
+    if (name) {
+	fprintf(trace_file, "\"name\":");
+	trace_string(name);
+	fprintf(trace_file, ",");
+    }
+    fprintf(trace_file, "\"size\":%zd,\"support\":", ele->size);
+    trace_support(ele->support);
+    fprintf(trace_file, ",\"time\":%.4f}\n", elapsed_time());
+}
+
+bool do_trace(int argc, char *argv[]) {
+    if (trace_file) {
+	fclose(trace_file);
+	trace_file = NULL;
+    }
+    if (argc < 2)
+	return true;
+    trace_file = fopen(argv[1], "w");
+    if (!trace_file) {
+	report(0, "Couldn't open trace file '%s'", argv[1]);
+	return false;
+    }
+    return true;
+}
+
 /*** Operations on rsets ***/
 static void rset_ele_new_fun(rset_ele *ele, ref_t fun) {
     /* Get rid of stuff associated with existing function */
+    io_discard(ele);
     /* See if there's a DD stored in a file */
     if (ele->in_file && !keep_conjunct_files) {
 	bool done = remove(ele->file_name) == 0;
@@ -203,6 +602,10 @@ static void rset_ele_new_fun(rset_ele *ele, ref_t fun) {
 	    report(3, "Attempt to delete DD file '%s' failed", ele->file_name);
     }
     ele->in_file = false;
+    ele->file_bytes = 0;
+    ele->version++;
+    bool scheduled = ele->scheduled;
+    schedule_remove(ele);
     if (ele->support != NULL)
 	index_set_free(ele->support);
     if (!REF_IS_INVALID(ele->fun))
@@ -216,6 +619,10 @@ static void rset_ele_new_fun(rset_ele *ele, ref_t fun) {
 	ele->size = cudd_single_size(smgr, ele->fun);
 	ele->support = shadow_support_indices(smgr, ele->fun);
 	root_addref(fun, false);
+	if (scheduled)
+	    schedule_add(ele);
+	if (ele->id > 0)
+	    trace_ele("update", ele, NULL);
     }
 }
 
@@ -244,6 +651,13 @@ static rset_ele *rset_new(ref_t fun) {
     ele->fun = REF_INVALID;
     ele->size = 0;
     ele->support = NULL;
+    ele->file_bytes = 0;
+    ele->io = NULL;
+    ele->version = 0;
+    ele->slot = -1;
+    ele->scheduled = false;
+    ele->position = 0;
+    ele->level = 0;
     rset_ele_new_fun(ele, fun);
     ele->next = NULL;
     ele->id = 0;
@@ -339,30 +753,87 @@ static size_t get_size(rset_ele *ptr) {
 
 static ref_t get_function(rset_ele *ptr) {
     if (REF_IS_INVALID(ptr->fun) && ptr->in_file) {
-	FILE *infile = fopen(ptr->file_name, "r");
-	if (infile == NULL) {
-	    err(true, "Failed to open DD file '%s' to read", ptr->file_name);
-	} else {
-	    ptr->fun = shadow_load(smgr, infile);
-	    if (REF_IS_INVALID(ptr->fun))
-		err(true, "Failed to load DD from file '%s'", ptr->file_name);
-	    root_addref(ptr->fun, true);
-	    report(4, "Retrieved DD of size %zd from file '%s'", get_size(ptr), ptr->file_name);
-	    total_loads++;
-	    total_loaded_nodes += get_size(ptr);
-	    fclose(infile);
+	io_request *req = ptr->io;
+	if (req != NULL) {
+	    /* Either write is still buffered or read has been started */
+	    if (!req->write)
+		io_wait(req);
+	    if (req->write || req->ok)
+		ptr->fun = buffer_load(req->buf, req->bytes);
+	    if (!REF_IS_INVALID(ptr->fun)) {
+		if (req->write)
+		    total_buffer_loads++;
+		else
+		    total_prefetch_hits++;
+		report(4, "Retrieved DD of size %zd for file '%s' from %s buffer", get_size(ptr), ptr->file_name,
+		       req->write ? "write" : "prefetch");
+	    }
+	    if (!req->write)
+		io_finish(req);
+	}
+	if (REF_IS_INVALID(ptr->fun)) {
+	    double start = elapsed_time();
+	    ptr->fun = shadow_load_file(smgr, ptr->file_name);
+	    total_sync_load_seconds += elapsed_time() - start;
+	    if (!REF_IS_INVALID(ptr->fun))
+		report(4, "Retrieved DD of size %zd from file '%s'", get_size(ptr), ptr->file_name);
 	}
+	if (REF_IS_INVALID(ptr->fun))
+	    err(true, "Failed to load DD from file '%s'", ptr->file_name);
+	root_addref(ptr->fun, true);
+	total_loads++;
+	total_loaded_nodes += get_size(ptr);
     } else
 	report(5, "Retrieved DD for %s from memory", ptr->file_name);
     return ptr->fun;
 }
 
+/* Start reading stored DD in background */
+static void prefetch_function(rset_ele *ptr) {
+    if (!async_io || !REF_IS_INVALID(ptr->fun) || !ptr->in_file || ptr->io != NULL || ptr->file_bytes == 0)
+	return;
+    char *buf = malloc_or_fail(ptr->file_bytes, "prefetch_function");
+    io_submit(io_new(false, ptr, buf, ptr->file_bytes, false));
+    total_prefetches++;
+    report(5, "Prefetching %zd bytes from file '%s'", ptr->file_bytes, ptr->file_name);
+}
+
+/* Store DD in buffer and write it to file in background */
+static void spill_function(rset_ele *ptr) {
+    char *buf = NULL;
+    size_t bytes = 0;
+    FILE *outfile = open_memstream(&buf, &bytes);
+    if (outfile == NULL) {
+	err(false, "Couldn't create buffer to store DD for file '%s'", ptr->file_name);
+	return;
+    }
+    bool ok = shadow_store(smgr, ptr->fun, outfile);
+    fclose(outfile);
+    if (!ok) {
+	free(buf);
+	err(false, "Failed to store DD of size %zd to file '%s'", get_size(ptr), ptr->file_name);
+	return;
+    }
+    ptr->in_file = true;
+    ptr->file_bytes = bytes;
+    root_deref(ptr->fun);
+    ptr->fun = REF_INVALID;
+    io_submit(io_new(true, ptr, buf, bytes, true));
+    report(4, "Flushed in-memory copy and queued DD of size %zd for storage to file '%s'", get_size(ptr), ptr->file_name);
+    total_stores++;
+    total_async_stores++;
+    total_stored_nodes += get_size(ptr);
+}
+
 static void release_function(rset_ele *ptr) {
+    io_reap();
     if (ptr->in_file) {
 	report(5, "DD of size %zd already stored in file '%s'", get_size(ptr), ptr->file_name);
     } else if (REF_IS_INVALID(ptr->fun) || get_size(ptr) <= memory_store_threshold) {
 	/* Either nothing to save, or it's already been saved */
 	report(4, "Didn't store DD of size %zd to file '%s'", get_size(ptr), ptr->file_name);
+    } else if (async_io) {
+	spill_function(ptr);
     } else {
 	/* Attempt to save file.  If successful, flush in-memory copy */
 	FILE *outfile = fopen(ptr->file_name, "w");
@@ -371,6 +842,7 @@ static void release_function(rset_ele *ptr) {
 	} else {
 	    if (shadow_store(smgr, ptr->fun, outfile)) {
 		ptr->in_file = true;
+		ptr->file_bytes = (size_t) ftell(outfile);
 		root_deref(ptr->fun);
 		ptr->fun = REF_INVALID;
 		fclose(outfile);
@@ -421,35 +893,9 @@ static double get_support_coverage(rset_ele *ptr1, rset_ele *ptr2, bool weighted
     return cov;
 }
 
-/* Find largest element in set */
-static size_t rset_max_size(rset_ele *set) {
-    size_t size = 0;
-    rset_ele *ptr;
-    for (ptr = set; ptr; ptr = ptr->next) {
-	size_t esize = get_size(ptr);
-	if (esize > size)
-	    size = esize;
-    }
-    return size;
-}
-
-/* Find largest element in set */
-static size_t rset_min_size(rset_ele *set) {
-    if (rset_is_empty(set))
-	return 0;
-    size_t size = get_size(set);
-    rset_ele *ptr;
-    for (ptr = set->next; ptr; ptr = ptr->next) {
-	size_t esize = get_size(ptr);
-	if (esize < size)
-	    size = esize;
-    }
-    return size;
-}
-
-static void compute_size_range(rset_ele *set) {
-    max_argument_size = rset_max_size(set);
-    min_argument_size = rset_min_size(set);
+static void set_size_range(size_t min_size, size_t max_size) {
+    max_argument_size = max_size;
+    min_argument_size = min_size;
     log10_max_size = log10(max_argument_size == 0 ? 1.0 : (double) max_argument_size);
     log10_min_size = log10(min_argument_size == 0 ? 1.0 : (double) min_argument_size);
 }
@@ -510,19 +956,130 @@ static void check_gc() {
 	report(3, "CUDD reports %zd nodes collected", collected);
 	total_stored_nodes_last_gc = total_stored_nodes;
     }
+    memory_govern();
 }
 
-static size_t other_size_limit(size_t size) {
+/* Which piece of the other size limit function applies */
+static int other_size_piece(size_t size) {
     int t;
     for (t = 0; t < SRR_PIECES; t++) {
-	if (size > srr_threshold[t]) {
-	    return srr_ratio[t] * size;
-	}
+	if (size > srr_threshold[t])
+	    return t;
     }
+    return -1;
+}
+
+static size_t other_size_limit(size_t size) {
+    int t = other_size_piece(size);
+    if (t >= 0)
+	return srr_ratio[t] * size;
     err(false, "Failed to find other size limit for argument size %zd", size);
     return size;
 }
 
+/*** Online tuning of limits ***/
+
+/* Each tuned limit tracks an exponentially weighted success rate of the
+   operations it governs.  After every TUNE_WINDOW outcomes, the limit is
+   raised if the rate is below the target, and lowered if it is above */
+#define TUNE_WINDOW 20
+#define TUNE_DECAY 0.9
+/* Dead band around target */
+#define TUNE_SLACK 0.1
+#define TUNE_UP 1.25
+#define TUNE_DOWN 0.8
+
+typedef struct {
+    double rate;
+    int count;
+} tune_stat;
+
+static tune_stat tune_soft_nodes = { 0.5, 0 };
+static tune_stat tune_soft_lookups = { 0.5, 0 };
+static tune_stat tune_srr[SRR_PIECES] = { { 0.5, 0 }, { 0.5, 0 }, { 0.5, 0 } };
+static tune_stat tune_first_pass = { 0.5, 0 };
+static tune_stat tune_early_success = { 0.5, 0 };
+
+/* Value for abort_limit to take effect at start of next conjunction */
+static int tuned_abort_limit = 0;
+
+/* Record outcome.  Returns direction of adjustment (+1 up, -1 down), or 0 if none yet */
+static int tune_record(tune_stat *ts, bool success) {
+    ts->rate = TUNE_DECAY * ts->rate + (1.0 - TUNE_DECAY) * (success ? 1.0 : 0.0);
+    if (++ts->count < TUNE_WINDOW)
+	return 0;
+    ts->count = 0;
+    double target = 0.01 * tune_target_scaled;
+    if (ts->rate < target - TUNE_SLACK)
+	return 1;
+    if (ts->rate > target + TUNE_SLACK)
+	return -1;
+    return 0;
+}
+
+static int tune_int(int val, int dir, int min_val, int max_val) {
+    int nval = dir > 0 ? (int) (val * TUNE_UP + 0.5) : (int) (val * TUNE_DOWN + 0.5);
+    if (dir > 0 && nval == val)
+	nval++;
+    if (dir < 0 && nval == val)
+	nval--;
+    if (nval < min_val)
+	nval = min_val;
+    if (nval > max_val)
+	nval = max_val;
+    return nval;
+}
+
+static void tune_param(int *param, char *name, tune_stat *ts, bool success, int min_val, int max_val) {
+    int dir = tune_record(ts, success);
+    if (dir == 0)
+	return;
+    int nval = tune_int(*param, dir, min_val, max_val);
+    if (nval != *param)
+	report(1, "TUNE: %s %d --> %d (success rate %.2f)", name, *param, nval, ts->rate);
+    *param = nval;
+}
+
+/* Record outcome of soft and.  Successful means it reduced the argument size */
+static void tune_soft_and(size_t size, bool node_fail, bool lookup_fail, bool reduced) {
+    if (!autotune)
+	return;
+    tune_param(&soft_and_expansion_ratio_scaled, "generate", &tune_soft_nodes, !node_fail, 101, 10000);
+    tune_param(&cache_soft_lookup_ratio, "softlookup", &tune_soft_lookups, !lookup_fail, 10, 100000);
+    /* Allow larger other arguments when soft and tends to pay off */
+    int t = other_size_piece(size);
+    if (t < 0)
+	return;
+    int dir = tune_record(&tune_srr[t], reduced);
+    if (dir == 0)
+	return;
+    double nratio = dir > 0 ? srr_ratio[t] * TUNE_DOWN : srr_ratio[t] * TUNE_UP;
+    if (nratio < 0.1)
+	nratio = 0.1;
+    if (nratio > 100.0)
+	nratio = 100.0;
+    report(1, "TUNE: Other size ratio for sizes > %zd %.3f --> %.3f (success rate %.2f)",
+	   srr_threshold[t], srr_ratio[t], nratio, tune_srr[t].rate);
+    srr_ratio[t] = nratio;
+}
+
+/* Record outcome of conjunction step.  try_index is the position of the chosen pair in the candidate list */
+static void tune_conjunction(bool first_pass, int try_index, int ccount) {
+    if (!autotune)
+	return;
+    tune_param(&expansion_factor_scaled, "expand", &tune_first_pass, first_pass, 110, 1000);
+    /* Raise abort limit when successful pairs often come from the back of the list */
+    if (ccount < abort_limit)
+	return;
+    int dir = tune_record(&tune_early_success, try_index < ccount/2);
+    if (dir == 0)
+	return;
+    int nlimit = tune_int(abort_limit, dir, 2, 50);
+    if (nlimit != abort_limit)
+	report(1, "TUNE: abort %d --> %d (early success rate %.2f)", abort_limit, nlimit, tune_early_success.rate);
+    tuned_abort_limit = nlimit;
+}
+
 /* Conditionally simplify elements of one set with those of another */
 static void soft_simplify(rset_ele *set, rset_ele *other_set, double threshold, char *docstring) {
     rset_ele *myptr, *otherptr;
@@ -563,6 +1120,7 @@ static void soft_simplify(rset_ele *set, rset_ele *other_set, double threshold,
 		delta = elapsed - start;
 		total_soft_and++;
 		if (REF_IS_INVALID(nval)) {
+		    tune_soft_and(current_size, lookups < lookup_limit, lookups >= lookup_limit, false);
 		    if (lookups >= lookup_limit) {
 			total_soft_and_lookup_fail++;
 			report(3, "Elapsed time %.1f.  Delta %.1f.  Soft_And.  %s.  cov = %.3f.  size = %zd.  Other size = %zd.  Lookups = %zd.  Too many cache lookups",
@@ -583,6 +1141,7 @@ static void soft_simplify(rset_ele *set, rset_ele *other_set, double threshold,
 		double reduction = (double) current_size/new_size;
 		report(3, "Elapsed time %.1f.  Delta %.1f.  Soft_And.  %s.  cov = %.3f.  size = %zd.  Other size = %zd.  Lookups = %zd.  Size --> %zd (%.3fX)",
 		       elapsed, delta, docstring, cov, current_size, other_size, lookups, new_size, reduction);
+		tune_soft_and(current_size, false, false, new_size < current_size);
 		if (new_size < current_size || soft_and_allow_growth) {
 #if RPT >= 3
 		    {
@@ -622,25 +1181,16 @@ static void soft_simplify(rset_ele *set, rset_ele *other_set, double threshold,
     }
 }
 
-/* Attempt existential quantification of those variables occuring in ele that do not occur in any functions in set */
-/* Possible for ele to be in set, in which case just skip over it */
-static void try_quantification(rset_ele *ele, rset_ele *set) {
+/* Attempt existential quantification of those variables occuring in ele that do not occur in any other functions in set */
+/* Relies on quantification schedule */
+static void try_quantification(rset_ele *ele) {
     if (quantify_threshold == 0 || ele->size < quantify_threshold)
 	return;
-    index_set *iset = index_set_duplicate(ele->support);
-    rset_ele *sele;
-    int ecount = 0;
-    for (sele = set; sele; sele = sele->next) {
-	ecount++;
-	if (sele == ele)
-	    continue;
-	index_set_remove(iset, sele->support);
-	if (iset->count == 0) {
-	    int length = rset_length(set);
-	    report(1, "QUANT: Unique support dropped from %zd to 0 after %d/%d conjuncts for conjunct %d",
-		   ele->support->count, ecount, length, ele->id);
-	    return;
-	}
+    index_set *iset = schedule_dead(ele, NULL);
+    if (iset->count == 0) {
+	report(3, "QUANT: No unique support variables for conjunct %d", ele->id);
+	index_set_free(iset);
+	return;
     }
 
     size_t osize = ele->size;
@@ -673,11 +1223,285 @@ static void clear_candidates(pair *candidates) {
     }
 }
 
+/* Persistent record of pairwise support similarities during conjunction.
+   Unweighted similarities only change when the support of a conjunct changes,
+   and so they are computed once per pair and kept in a max-heap.
+   Each conjunct occupies a slot.  A heap entry becomes stale once either
+   of its slots is vacated or its conjunct changes, as detected by the slot stamps.
+   Stale entries are discarded lazily.
+*/
+typedef struct {
+    double sim;       // Unweighted similarity
+    int slot1;        // Slot of conjunct occurring earlier in set
+    int slot2;
+    unsigned stamp1;
+    unsigned stamp2;
+} pair_entry;
+
+typedef struct {
+    int nslots;
+    int live_count;
+    rset_ele **ele;   // Conjunct in each slot (NULL if vacant)
+    unsigned *stamp;  // Incremented whenever pairs for slot become stale
+    int *version;     // Version of conjunct when its pairs were computed
+    int *order;       // Position in set.  Lower values occur earlier
+    int *mark;        // Status during rescoring
+    int next_order;   // Order for next conjunct added to front of set
+    int strategy;     // Pairing strategy
+    int *low;         // Lowest and highest variable levels in support (PAIRING_ORDER)
+    int *high;
+    pair_entry *heap;
+    size_t heap_count;
+    size_t heap_alloc;
+} pair_table;
+
+/* Marks used during rescoring */
+#define PAIR_CLEAN 0
+#define PAIR_DIRTY 1
+#define PAIR_DONE  2
+
+/* How many stale entries beyond twice the number of live pairs before compacting heap */
+#define PAIR_HEAP_SLACK 1024
+
+static void pair_table_add(pair_table *pt, rset_ele *ele, int order) {
+    int s;
+    for (s = 0; s < pt->nslots; s++) {
+	if (pt->ele[s] == NULL)
+	    break;
+    }
+    if (s == pt->nslots) {
+	err(true, "Internal error.  No free slot in pair table");
+	return;
+    }
+    pt->ele[s] = ele;
+    pt->order[s] = order;
+    pt->mark[s] = PAIR_DIRTY;
+    pt->live_count++;
+    ele->slot = s;
+}
+
+static void pair_table_remove(pair_table *pt, rset_ele *ele) {
+    int s = ele->slot;
+    if (s < 0)
+	return;
+    pt->stamp[s]++;
+    pt->ele[s] = NULL;
+    pt->mark[s] = PAIR_CLEAN;
+    pt->live_count--;
+    ele->slot = -1;
+}
+
+/* Create table holding at most nslots conjuncts, starting with those in set */
+static pair_table *pair_table_new(rset_ele *set, int nslots) {
+    pair_table *pt = malloc_or_fail(sizeof(pair_table), "pair_table_new");
+    pt->nslots = nslots;
+    pt->live_count = 0;
+    pt->ele = calloc_or_fail(nslots, sizeof(rset_ele *), "pair_table_new");
+    pt->stamp = calloc_or_fail(nslots, sizeof(unsigned), "pair_table_new");
+    pt->version = calloc_or_fail(nslots, sizeof(int), "pair_table_new");
+    pt->order = calloc_or_fail(nslots, sizeof(int), "pair_table_new");
+    pt->mark = calloc_or_fail(nslots, sizeof(int), "pair_table_new");
+    pt->low = calloc_or_fail(nslots, sizeof(int), "pair_table_new");
+    pt->high = calloc_or_fail(nslots, sizeof(int), "pair_table_new");
+    pt->strategy = pairing_strategy;
+    size_t npairs = (size_t) nslots * (nslots-1) / 2;
+    pt->heap_alloc = npairs < 16 ? 16 : npairs;
+    pt->heap = calloc_or_fail(pt->heap_alloc, sizeof(pair_entry), "pair_table_new");
+    pt->heap_count = 0;
+    /* Existing conjuncts get ascending orders.  New ones get added to front of set */
+    int order = 0;
+    rset_ele *ptr;
+    for (ptr = set; ptr; ptr = ptr->next)
+	pair_table_add(pt, ptr, order++);
+    pt->next_order = -1;
+    return pt;
+}
+
+static void pair_table_free(pair_table *pt) {
+    int s;
+    for (s = 0; s < pt->nslots; s++) {
+	if (pt->ele[s] != NULL)
+	    pt->ele[s]->slot = -1;
+    }
+    free_array(pt->ele, pt->nslots, sizeof(rset_ele *));
+    free_array(pt->stamp, pt->nslots, sizeof(unsigned));
+    free_array(pt->version, pt->nslots, sizeof(int));
+    free_array(pt->order, pt->nslots, sizeof(int));
+    free_array(pt->mark, pt->nslots, sizeof(int));
+    free_array(pt->low, pt->nslots, sizeof(int));
+    free_array(pt->high, pt->nslots, sizeof(int));
+    free_array(pt->heap, pt->heap_alloc, sizeof(pair_entry));
+    free_block(pt, sizeof(pair_table));
+}
+
+static bool pair_entry_valid(pair_table *pt, pair_entry *e) {
+    return pt->stamp[e->slot1] == e->stamp1 && pt->stamp[e->slot2] == e->stamp2;
+}
+
+static void pair_heap_up(pair_table *pt, size_t idx) {
+    pair_entry e = pt->heap[idx];
+    while (idx > 0) {
+	size_t pidx = (idx-1)/2;
+	if (pt->heap[pidx].sim >= e.sim)
+	    break;
+	pt->heap[idx] = pt->heap[pidx];
+	idx = pidx;
+    }
+    pt->heap[idx] = e;
+}
+
+static void pair_heap_down(pair_table *pt, size_t idx) {
+    pair_entry e = pt->heap[idx];
+    size_t count = pt->heap_count;
+    while (2*idx+1 < count) {
+	size_t cidx = 2*idx+1;
+	if (cidx+1 < count && pt->heap[cidx+1].sim > pt->heap[cidx].sim)
+	    cidx++;
+	if (e.sim >= pt->heap[cidx].sim)
+	    break;
+	pt->heap[idx] = pt->heap[cidx];
+	idx = cidx;
+    }
+    pt->heap[idx] = e;
+}
+
+static void pair_heap_push(pair_table *pt, int slot1, int slot2, double sim) {
+    if (pt->heap_count == pt->heap_alloc) {
+	size_t nalloc = 2 * pt->heap_alloc;
+	pt->heap = realloc_or_fail(pt->heap, pt->heap_alloc * sizeof(pair_entry),
+				   nalloc * sizeof(pair_entry), "pair_heap_push");
+	pt->heap_alloc = nalloc;
+    }
+    pair_entry *e = &pt->heap[pt->heap_count];
+    e->sim = sim;
+    e->slot1 = slot1;
+    e->slot2 = slot2;
+    e->stamp1 = pt->stamp[slot1];
+    e->stamp2 = pt->stamp[slot2];
+    pair_heap_up(pt, pt->heap_count++);
+}
+
+/* Remove top element, leaving it just beyond end of heap */
+static void pair_heap_pop(pair_table *pt) {
+    pair_entry top = pt->heap[0];
+    pt->heap_count--;
+    if (pt->heap_count > 0) {
+	pt->heap[0] = pt->heap[pt->heap_count];
+	pair_heap_down(pt, 0);
+    }
+    pt->heap[pt->heap_count] = top;
+}
+
+/* Discard stale entries once they dominate the heap */
+static void pair_heap_compact(pair_table *pt) {
+    size_t live_pairs = (size_t) pt->live_count * (pt->live_count-1) / 2;
+    if (pt->heap_count <= 2 * live_pairs + PAIR_HEAP_SLACK)
+	return;
+    size_t i;
+    size_t ncount = 0;
+    for (i = 0; i < pt->heap_count; i++) {
+	if (pair_entry_valid(pt, &pt->heap[i]))
+	    pt->heap[ncount++] = pt->heap[i];
+    }
+    report(5, "Compacted pair heap from %zd to %zd entries", pt->heap_count, ncount);
+    pt->heap_count = ncount;
+    for (i = ncount/2; i > 0; i--)
+	pair_heap_down(pt, i-1);
+}
+
+/* Find range of variable levels in support of conjunct in slot */
+static void pair_table_levels(pair_table *pt, int s) {
+    index_set *iset = pt->ele[s]->support;
+    int low = -1;
+    int high = -1;
+    int i;
+    for (i = 0; iset && i < iset->count; i++) {
+	int level = shadow_index_level(smgr, iset->indices[i]);
+	if (low < 0 || level < low)
+	    low = level;
+	if (level > high)
+	    high = level;
+    }
+    pt->low[s] = low;
+    pt->high[s] = high;
+}
+
+/* Bring table up to date with set.
+   Adds new conjuncts, computes similarities (or level ranges) for those that are new or have changed,
+   and updates size range */
+static void pair_table_refresh(pair_table *pt, rset_ele *set) {
+    rset_ele *ptr;
+    for (ptr = set; ptr; ptr = ptr->next) {
+	if (ptr->slot < 0)
+	    pair_table_add(pt, ptr, pt->next_order--);
+	else if (pt->version[ptr->slot] != ptr->version) {
+	    pt->stamp[ptr->slot]++;
+	    pt->mark[ptr->slot] = PAIR_DIRTY;
+	}
+    }
+    pair_heap_compact(pt);
+    size_t min_size = 0;
+    size_t max_size = 0;
+    bool first = true;
+    int s, t;
+    for (s = 0; s < pt->nslots; s++) {
+	if (pt->ele[s] == NULL)
+	    continue;
+	size_t size = get_size(pt->ele[s]);
+	if (first || size < min_size)
+	    min_size = size;
+	if (size > max_size)
+	    max_size = size;
+	first = false;
+    }
+    set_size_range(min_size, max_size);
+    /* Each pair involving a dirty conjunct gets computed exactly once */
+    int rcount = 0;
+    for (s = 0; s < pt->nslots; s++) {
+	rset_ele *ele = pt->ele[s];
+	if (ele == NULL || pt->mark[s] != PAIR_DIRTY)
+	    continue;
+	if (pt->strategy == PAIRING_ORDER)
+	    pair_table_levels(pt, s);
+	for (t = 0; pt->strategy == PAIRING_SIMILARITY && t < pt->nslots; t++) {
+	    if (t == s || pt->ele[t] == NULL || pt->mark[t] == PAIR_DONE)
+		continue;
+	    double sim = get_support_similarity(ele, pt->ele[t], false);
+	    if (pt->order[s] < pt->order[t])
+		pair_heap_push(pt, s, t, sim);
+	    else
+		pair_heap_push(pt, t, s, sim);
+	}
+	pt->mark[s] = PAIR_DONE;
+	pt->version[s] = ele->version;
+	rcount++;
+    }
+    for (s = 0; s < pt->nslots; s++)
+	pt->mark[s] = PAIR_CLEAN;
+    report(5, "Computed similarities for %d conjuncts.  Pair heap has %zd entries", rcount, pt->heap_count);
+}
+
+/* Does pair (ptr1, ptr2) with similarity sim rank ahead of other candidate?
+   Ties are broken according to position in set */
+static bool pair_precedes(pair_table *pt, rset_ele *ptr1, rset_ele *ptr2, double sim, pair *other) {
+    if (other->ptr1 == NULL)
+	return true;
+    if (ptr1 == NULL)
+	return false;
+    if (sim != other->sim)
+	return sim > other->sim;
+    int order1 = pt->order[ptr1->slot];
+    int oorder1 = pt->order[other->ptr1->slot];
+    if (order1 != oorder1)
+	return order1 < oorder1;
+    return pt->order[ptr2->slot] < pt->order[other->ptr2->slot];
+}
+
 /* Ordered insertion into candidates.  Element 0 has highest sim */
-static void insert_candidate(pair *candidates, rset_ele *ptr1, rset_ele *ptr2, double sim)  {
+static void insert_candidate(pair_table *pt, pair *candidates, rset_ele *ptr1, rset_ele *ptr2, double sim)  {
     int idx;
     for (idx = 0; idx < abort_limit; idx++) {
-	if (sim > candidates[idx].sim) {
+	if (pair_precedes(pt, ptr1, ptr2, sim, &candidates[idx])) {
 	    /* Replace with new values and shift old values down */
 	    rset_ele *nptr1 = candidates[idx].ptr1;
 	    rset_ele *nptr2 = candidates[idx].ptr2;
@@ -692,7 +1516,209 @@ static void insert_candidate(pair *candidates, rset_ele *ptr1, rset_ele *ptr2, d
     }
 }
 
+/* Pairing strategies.  Each fills candidates with the best pairs,
+   using field sim as the score, and returns the number of candidates */
+
+/* Fill candidates with best pairs according to weighted similarity.
+   Weighted similarity is at most max_weight times the unweighted one,
+   and so the search stops once no remaining pair can displace a candidate. */
+static int similarity_candidates(pair_table *pt, pair *candidates) {
+    double max_penalty = 0.01 * max_large_argument_penalty_scaled;
+    double max_weight = max_penalty < 0.0 ? 1.0 - max_penalty : 1.0;
+    /* Popped entries are kept beyond end of heap and then restored */
+    size_t saved_end = pt->heap_count;
+    int ccount = 0;
+    while (pt->heap_count > 0) {
+	if (ccount > 0 && ccount == abort_limit &&
+	    pt->heap[0].sim * max_weight < candidates[abort_limit-1].sim)
+	    break;
+	pair_heap_pop(pt);
+	pair_entry *e = &pt->heap[pt->heap_count];
+	if (!pair_entry_valid(pt, e)) {
+	    /* Drop stale entry */
+	    saved_end--;
+	    pt->heap[pt->heap_count] = pt->heap[saved_end];
+	    continue;
+	}
+	rset_ele *ptr1 = pt->ele[e->slot1];
+	rset_ele *ptr2 = pt->ele[e->slot2];
+	double sim = e->sim * size_weight(ptr1, ptr2);
+	insert_candidate(pt, candidates, ptr1, ptr2, sim);
+	if (ccount < abort_limit)
+	    ccount++;
+    }
+    while (pt->heap_count < saved_end)
+	pair_heap_up(pt, pt->heap_count++);
+    return ccount;
+}
+
+/* Score for pair of conjuncts in slots s and t.  Higher is better */
+typedef double (*pair_score_function)(pair_table *pt, int s, int t);
+
+/* Consider all pairs of live conjuncts */
+static int scored_candidates(pair_table *pt, pair *candidates, pair_score_function score) {
+    int ccount = 0;
+    int s, t;
+    for (s = 0; s < pt->nslots; s++) {
+	if (pt->ele[s] == NULL)
+	    continue;
+	for (t = 0; t < pt->nslots; t++) {
+	    if (pt->ele[t] == NULL || pt->order[t] <= pt->order[s])
+		continue;
+	    insert_candidate(pt, candidates, pt->ele[s], pt->ele[t], score(pt, s, t));
+	    if (ccount < abort_limit)
+		ccount++;
+	}
+    }
+    return ccount;
+}
+
+/* Huffman-like: combine smallest arguments first */
+static double smallest_score(pair_table *pt, int s, int t) {
+    return -(double) (get_size(pt->ele[s]) + get_size(pt->ele[t]));
+}
+
+/* Balanced tree: combine lowest-level arguments, in order of argument number */
+#define LEVEL_WEIGHT 1e9
+static double balanced_score(pair_table *pt, int s, int t) {
+    rset_ele *ptr1 = pt->ele[s];
+    rset_ele *ptr2 = pt->ele[t];
+    return -LEVEL_WEIGHT * (ptr1->level + ptr2->level) - (ptr1->position + ptr2->position);
+}
+
+/* Variable order clustering: minimize span of variable levels covered by product */
+static double order_score(pair_table *pt, int s, int t) {
+    int low = pt->low[s];
+    int high = pt->high[s];
+    if (low < 0 || (pt->low[t] >= 0 && pt->low[t] < low))
+	low = pt->low[t];
+    if (pt->high[t] > high)
+	high = pt->high[t];
+    return low < 0 ? 0.0 : -(double) (high - low);
+}
+
+static int smallest_candidates(pair_table *pt, pair *candidates) {
+    return scored_candidates(pt, candidates, smallest_score);
+}
+
+static int balanced_candidates(pair_table *pt, pair *candidates) {
+    return scored_candidates(pt, candidates, balanced_score);
+}
+
+static int order_candidates(pair_table *pt, pair *candidates) {
+    return scored_candidates(pt, candidates, order_score);
+}
+
+/* Follow static schedule.  Falls back to smallest-first when schedule doesn't apply */
+static int schedule_candidates(pair_table *pt, pair *candidates) {
+    /* Each step removes one conjunct */
+    int step = pt->nslots - pt->live_count + 1;
+    if (step > pair_schedule_length) {
+	report(1, "Step %d beyond end of pairing schedule.  Using smallest-first", step);
+	return smallest_candidates(pt, candidates);
+    }
+    int pos1 = pair_schedule[2*(step-1)];
+    int pos2 = pair_schedule[2*(step-1)+1];
+    int s1 = -1;
+    int s2 = -1;
+    int s;
+    for (s = 0; s < pt->nslots; s++) {
+	if (pt->ele[s] == NULL)
+	    continue;
+	if (pt->ele[s]->position == pos1)
+	    s1 = s;
+	else if (pt->ele[s]->position == pos2)
+	    s2 = s;
+    }
+    if (s1 < 0 || s2 < 0) {
+	report(1, "Pairing schedule step %d: Arguments %d and %d not available.  Using smallest-first",
+	       step, pos1, pos2);
+	return smallest_candidates(pt, candidates);
+    }
+    if (pt->order[s2] < pt->order[s1]) {
+	int tmp = s1;
+	s1 = s2;
+	s2 = tmp;
+    }
+    candidates[0].ptr1 = pt->ele[s1];
+    candidates[0].ptr2 = pt->ele[s2];
+    candidates[0].sim = 1.0;
+    return 1;
+}
+
+typedef int (*pairing_function)(pair_table *pt, pair *candidates);
+
+static struct {
+    char *name;
+    pairing_function candidates;
+} pairing_strategies[PAIRING_COUNT] = {
+    { "similarity", similarity_candidates },
+    { "smallest",   smallest_candidates   },
+    { "balanced",   balanced_candidates   },
+    { "order",      order_candidates      },
+    { "schedule",   schedule_candidates   }
+};
+
+static int pair_table_candidates(pair_table *pt, pair *candidates) {
+    return pairing_strategies[pt->strategy].candidates(pt, candidates);
+}
+
+static void check_pairing(int oldval) {
+    if (pairing_strategy < 0 || pairing_strategy >= PAIRING_COUNT) {
+	report(0, "Invalid pairing strategy %d", pairing_strategy);
+	pairing_strategy = oldval;
+    }
+}
+
+bool do_schedule(int argc, char *argv[]) {
+    pair_schedule_length = 0;
+    if (argc < 2)
+	return true;
+    FILE *infile = fopen(argv[1], "r");
+    if (!infile) {
+	report(0, "Couldn't open schedule file '%s'", argv[1]);
+	return false;
+    }
+    char buf[1024];
+    int lineno = 0;
+    bool ok = true;
+    while (fgets(buf, sizeof(buf), infile)) {
+	int pos1, pos2;
+	char *c = buf;
+	lineno++;
+	while (*c == ' ' || *c == '\t')
+	    c++;
+	if (*c == '#' || *c == '\n' || *c == '\0')
+	    continue;
+	if (sscanf(c, "%d %d", &pos1, &pos2) != 2 || pos1 <= 0 || pos2 <= 0 || pos1 == pos2) {
+	    report(0, "Schedule file '%s', line %d: Expected two distinct argument numbers", argv[1], lineno);
+	    ok = false;
+	    break;
+	}
+	if (pair_schedule_length == pair_schedule_alloc) {
+	    int nalloc = pair_schedule_alloc == 0 ? 64 : 2 * pair_schedule_alloc;
+	    pair_schedule = realloc_or_fail(pair_schedule, 2 * pair_schedule_alloc * sizeof(int),
+					    2 * nalloc * sizeof(int), "do_schedule");
+	    pair_schedule_alloc = nalloc;
+	}
+	pair_schedule[2*pair_schedule_length] = pos1;
+	pair_schedule[2*pair_schedule_length+1] = pos2;
+	pair_schedule_length++;
+    }
+    fclose(infile);
+    if (!ok) {
+	pair_schedule_length = 0;
+	return false;
+    }
+    report(1, "Read pairing schedule with %d steps", pair_schedule_length);
+    return true;
+}
+
 static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quantify) {
+    if (tuned_abort_limit > 0) {
+	abort_limit = tuned_abort_limit;
+	tuned_abort_limit = 0;
+    }
     double expansion_factor = (double) expansion_factor_scaled * 0.01;
     pair candidates[abort_limit];
     size_t abort_count = 0;
@@ -707,28 +1733,39 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
     
     /* Do initial quantification over entire set */
     if (quantify) {
+	schedule_start(set);
 	rset_ele *ele;
 	for (ele = set; ele; ele = ele->next) {
-	    try_quantification(ele, set);
+	    try_quantification(ele);
 	    release_function(ele);
 	}
     }
 
 
+    pair_table *ptable = pair_table_new(set, argument_count);
+    report(2, "Using %s pairing strategy", pairing_strategies[ptable->strategy].name);
     size_t set_size = argument_count;
+    int step = 0;
     while (set_size > 1 && !rset_contains_zero(set)) {
-	compute_size_range(set);
+	double step_start = elapsed_time();
+	pair_table_refresh(ptable, set);
 	clear_candidates(candidates);
 	rset_ele *ptr1 = NULL;
 	rset_ele *ptr2 = NULL;
-	int ccount = 0;
-	for (ptr1 = set; ptr1; ptr1 = ptr1->next) {
-	    for (ptr2 = ptr1->next; ptr2; ptr2 = ptr2->next) {
-		double sim = get_support_similarity(ptr1, ptr2, true);
-		insert_candidate(candidates, ptr1, ptr2, sim);
-		if (ccount < abort_limit)
-		    ccount++;
-	    }
+	int ccount = pair_table_candidates(ptable, candidates);
+	int pidx;
+	if (trace_file) {
+	    trace_step++;
+	    fprintf(trace_file, "{\"ev\":\"candidates\",\"conj\":%d,\"step\":%d,\"pairs\":[",
+		    trace_conj, trace_step);
+	    for (pidx = 0; pidx < ccount; pidx++)
+		fprintf(trace_file, "%s[%d,%d,%.4f]", pidx == 0 ? "" : ",",
+			candidates[pidx].ptr1->id, candidates[pidx].ptr2->id, candidates[pidx].sim);
+	    fprintf(trace_file, "]}\n");
+	}
+	for (pidx = 0; pidx < ccount && pidx < prefetch_pairs; pidx++) {
+	    prefetch_function(candidates[pidx].ptr1);
+	    prefetch_function(candidates[pidx].ptr2);
 	}
 	/* Loop around all cases.  If don't succeed with bounded AND on first pass
 	   then do one more try with unbounded.
@@ -747,6 +1784,11 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 	int try_limit = ccount * pass_limit + 1;
 	int try;
 	size_t lookups = 0;
+	/* Results of current batch of concurrent tries */
+	ref_t batch_vals[MAX_PARALLEL_TRIES];
+	size_t batch_lookups[MAX_PARALLEL_TRIES];
+	int batch_start = 0;
+	int batch_end = 0;
 	for (try = 0; try <= try_limit; try++) {
 	    ref_t arg1 = REF_INVALID;
 	    ref_t arg2 = REF_INVALID;
@@ -776,9 +1818,60 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 
 	    root_checkref(arg1);
 	    root_checkref(arg2);
+	    /* Variables confined to the two arguments can be quantified during the conjunction */
+	    index_set *dead = NULL;
+	    if (quantify && set_size > 2) {
+		dead = schedule_dead(ptr1, ptr2);
+		if (dead->count == 0) {
+		    index_set_free(dead);
+		    dead = NULL;
+		}
+	    }
 	    double start = elapsed_time();
-	    shadow_delta_cache_lookups(smgr);
-	    if (final_try) {
+	    bool batched = try >= batch_start && try < batch_end;
+	    if (!batched && !final_try && !quantify && parallel_tries > 1) {
+		/* Start batch of limited tries within this pass */
+		int bcount = parallel_tries;
+		if (bcount > MAX_PARALLEL_TRIES)
+		    bcount = MAX_PARALLEL_TRIES;
+		if (bcount > ccount - tidx)
+		    bcount = ccount - tidx;
+		if (bcount > try_limit - try)
+		    bcount = try_limit - try;
+		if (bcount > 1) {
+		    ref_t aargs[MAX_PARALLEL_TRIES];
+		    ref_t bargs[MAX_PARALLEL_TRIES];
+		    size_t llimits[MAX_PARALLEL_TRIES];
+		    int b;
+		    for (b = 0; b < bcount; b++) {
+			rset_ele *bptr1 = candidates[tidx+b].ptr1;
+			rset_ele *bptr2 = candidates[tidx+b].ptr2;
+			aargs[b] = get_function(bptr1);
+			bargs[b] = get_function(bptr2);
+			llimits[b] = (get_size(bptr1) + get_size(bptr2)) * cache_hard_lookup_ratio;
+		    }
+		    shadow_and_limit_parallel(smgr, bcount, aargs, bargs, size_limit, llimits,
+					      batch_vals, batch_lookups);
+		    total_and_limit += bcount;
+		    batch_start = try;
+		    batch_end = try + bcount;
+		    batched = true;
+		}
+	    }
+	    if (!batched)
+		shadow_delta_cache_lookups(smgr);
+	    if (batched) {
+		nval = batch_vals[try - batch_start];
+		lookups = batch_lookups[try - batch_start];
+	    } else if (dead) {
+		nval = index_and_equant(smgr, arg1, arg2, dead, final_try ? 0 : size_limit);
+		total_and_exists++;
+		if (!REF_IS_INVALID(nval))
+		    total_and_exists_vars += dead->count;
+		report(3, "QUANT: AND-EXISTS of %s & %s quantifies %d variables",
+		       ptr1->file_name, ptr2->file_name, dead->count);
+		index_set_free(dead);
+	    } else if (final_try) {
 		nval = shadow_and(smgr, arg1, arg2);
 		total_and++;
 	    } else {
@@ -787,7 +1880,15 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 	    }
 	    double elapsed = elapsed_time();
 	    double delta = elapsed-start;
-	    lookups = shadow_delta_cache_lookups(smgr);
+	    if (!batched)
+		lookups = shadow_delta_cache_lookups(smgr);
+	    if (trace_file)
+		fprintf(trace_file,
+			"{\"ev\":\"try\",\"conj\":%d,\"step\":%d,\"a\":%d,\"b\":%d,\"sim\":%.4f,\"try\":%d,"
+			"\"limit\":%zd,\"ok\":%s,\"size\":%zd,\"lookups\":%zd,\"secs\":%.4f}\n",
+			trace_conj, trace_step, ptr1->id, ptr2->id, sim, try+1, final_try ? 0 : size_limit,
+			REF_IS_INVALID(nval) ? "false" : "true",
+			REF_IS_INVALID(nval) ? 0 : cudd_single_size(smgr, nval), lookups, delta);
 
 	    if (REF_IS_INVALID(nval)) {
 		abort_count ++;
@@ -827,22 +1928,49 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 		    rset_free(nset);
 		}
 	    }
-	    release_function(ptr1);
-	    release_function(ptr2);
+	    if (!batched) {
+		release_function(ptr1);
+		release_function(ptr2);
+	    } else if (try == batch_end-1) {
+		/* Keep arguments resident until batch has been processed */
+		int b;
+		for (b = batch_start; b < batch_end; b++) {
+		    release_function(candidates[b % ccount].ptr1);
+		    release_function(candidates[b % ccount].ptr2);
+		}
+	    }
 	}
 	if (best_nset == NULL)
 	    err(true, "Couldn't compute conjunction");
+	tune_conjunction(best_try < ccount, best_try % ccount, ccount);
+	expansion_factor = (double) expansion_factor_scaled * 0.01;
 
 	set = rset_remove_element(set, best_ptr1);
 	set = rset_remove_element(set, best_ptr2);
+	pair_table_remove(ptable, best_ptr1);
+	pair_table_remove(ptable, best_ptr2);
+	schedule_remove(best_ptr1);
+	schedule_remove(best_ptr2);
+	schedule_add(best_nset);
 
 	report(3, "%s (%zd nodes) & %s (%zd nodes) (sim = %.3f, try #%d) --> %s (%zd nodes).  %zd cache lookups",
 	       best_ptr1->file_name, get_size(best_ptr1), best_ptr2->file_name, get_size(best_ptr2), best_sim,
 	       best_try+1, best_nset->file_name, get_size(best_nset), best_lookups);
 
 	assign_id(best_nset);
+	step++;
+	best_nset->position = argument_count + step;
+	best_nset->level = (best_ptr1->level > best_ptr2->level ? best_ptr1->level : best_ptr2->level) + 1;
 	if (track_conjunction)
 		report(1, "TRACK\tAND\t%d\t%d\t%d", best_ptr1->id, best_ptr2->id, best_nset->id);
+	if (trace_file) {
+	    fprintf(trace_file,
+		    "{\"ev\":\"and\",\"conj\":%d,\"step\":%d,\"a\":%d,\"b\":%d,\"id\":%d,\"size\":%zd,\"support\":",
+		    trace_conj, trace_step, best_ptr1->id, best_ptr2->id, best_nset->id, get_size(best_nset));
+	    trace_support(best_nset->support);
+	    fprintf(trace_file, ",\"tries\":%d,\"secs\":%.4f,\"time\":%.4f}\n",
+		    best_try+1, elapsed_time()-step_start, elapsed_time());
+	}
 	rset_ele_free(best_ptr1);
 	rset_ele_free(best_ptr2);
 
@@ -856,7 +1984,7 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 
 	    /* Optionally apply existential quantification */
 	    if (quantify)
-		try_quantification(best_nset, set);
+		try_quantification(best_nset);
 
 	}
 	set = rset_add_element(set, best_nset);
@@ -868,6 +1996,9 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 	    check_gc();
     }
 
+    pair_table_free(ptable);
+    schedule_finish(set);
+
     ref_t rval;
 
     double elapsed = elapsed_time();
@@ -884,6 +2015,11 @@ static ref_t similarity_combine(rset_ele *set, conjunction_data *data, bool quan
 	rset_free(set);
 	rval = shadow_zero(smgr);
     }
+    if (trace_file) {
+	fprintf(trace_file, "{\"ev\":\"done\",\"conj\":%d,\"steps\":%d,\"aborts\":%zd,\"size\":%zd,\"time\":%.4f}\n",
+		trace_conj, trace_step, abort_count, cudd_single_size(smgr, rval), elapsed_time());
+	fflush(trace_file);
+    }
     return rval;
 }
 
@@ -931,6 +2067,15 @@ bool do_conjunct(int argc, char *argv[]) {
 
     double pthreshold = 0.01 * preprocess_soft_and_threshold_scaled;
 
+    if (trace_file) {
+	trace_conj++;
+	trace_step = 0;
+	fprintf(trace_file, "{\"ev\":\"start\",\"conj\":%d,\"dest\":", trace_conj);
+	trace_string(argv[dest_arg]);
+	fprintf(trace_file, ",\"quantify\":%s,\"args\":%d,\"time\":%.4f}\n",
+		quantify ? "true" : "false", argc-dest_arg-1, elapsed_time());
+    }
+
     int i;
     rset_ele *set = NULL;
     /* Track statistics on pre/post simplification sizes */
@@ -953,8 +2098,10 @@ bool do_conjunct(int argc, char *argv[]) {
 	}
 	rset_ele *ele = rset_new(rarg);
 	assign_id(ele);
+	ele->position = i - dest_arg;
 	if (track_conjunction)
 	    report(1, "TRACK\tARG\t%s\t%d", argv[i], ele->id);
+	trace_ele("arg", ele, argv[i]);
 	size_t asize = get_size(ele);
 	itotal += asize;
 	imax = SMAX(asize, imax);
@@ -1005,8 +2152,14 @@ bool do_conjunct(int argc, char *argv[]) {
     report(3, "Total skip soft and = %zd", total_skip);
     report(3, "Total limit ands = %zd", total_and_limit);
     report(3, "Total regular ands = %zd", total_and);
+    report(3, "Total and-exists = %zd (%zd variables quantified)", total_and_exists, total_and_exists_vars);
     report(3, "Total stores = %zd (%zd nodes)", total_stores, total_stored_nodes);
     report(3, "Total loads = %zd (%zd nodes)", total_loads, total_loaded_nodes);
+    double io_seconds = io_background_seconds();
+    report(3, "Total async stores = %zd.  Loads from write buffer = %zd.  Prefetches = %zd (%zd used)",
+	   total_async_stores, total_buffer_loads, total_prefetches, total_prefetch_hits);
+    report(3, "Background I/O %.3f secs.  Waiting for I/O %.3f secs.  Synchronous loads %.3f secs.  Stall time saved %.3f secs",
+	   io_seconds, total_io_wait_seconds, total_sync_load_seconds, io_seconds - total_io_wait_seconds);
 
     return true;
 }
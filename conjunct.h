@@ -11,6 +11,8 @@ void assign_ref(char *name, ref_t r, bool fresh, bool variable);
 
 /* Functions defined in runbdd.c */
 ref_t get_ref(char *name);
+/* Adjust memory use when running with memory governor */
+void memory_govern();
 
 /* Global variables defined in conjunct.c */
 extern int preprocess_soft_and_threshold_scaled;
@@ -22,6 +24,8 @@ extern int cache_soft_lookup_ratio;
 extern int cache_hard_lookup_ratio;
 extern int track_conjunction;
 extern int quantify_threshold;
+extern size_t memory_store_threshold;
+extern size_t stored_gc_limit;
 
 /* Functions defined in conjunct.c */
 void init_conjunct();
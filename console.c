@@ -63,6 +63,17 @@ static int echo = 0;
 static bool quit_flag = false;
 static char *prompt = "cmd>";
 
+/* Number of lines read from primary command input */
+static size_t primary_lines = 0;
+/* Number of initial lines of primary command input to skip */
+static size_t skip_lines = 0;
+
+/* Optional function to call after each command */
+static hook_function command_hook = NULL;
+
+/* Optional function to call before and after each command line */
+static profile_function profiler = NULL;
+
 
 /* Optional function to call as part of exit process */
 /* Maximum number of quit functions */
@@ -228,6 +239,14 @@ void record_error() {
     }
 }
 
+/* Find operation for named command.  Returns NULL if not found */
+cmd_function find_cmd(char *name) {
+    cmd_ptr next_cmd = cmd_list;
+    while (next_cmd && strcmp(name, next_cmd->name) != 0)
+	next_cmd = next_cmd->next;
+    return next_cmd ? next_cmd->operation : NULL;
+}
+
 /* Execute a command that has already been split into arguments */
 static bool interpret_cmda(int argc, char *argv[]) {
     if (argc == 0)
@@ -258,7 +277,11 @@ bool interpret_cmd(char *cmdline) {
     report(6, "Interpreting command '%s'\n", cmdline);
 #endif
     char **argv = parse_args(cmdline, &argc);
+    if (profiler && argc > 0)
+	profiler(argc, argv, false);
     bool ok = interpret_cmda(argc, argv);
+    if (profiler && argc > 0)
+	profiler(argc, argv, true);
     int i;
     for (i = 0; i < argc; i++)
 	free_string(argv[i]);
@@ -386,6 +409,14 @@ bool do_option_cmd(int argc, char *argv[]) {
     return true;
 }
 
+void write_options(FILE *outfile) {
+    param_ptr plist = param_list;
+    while (plist) {
+	fprintf(outfile, "option %s %d\n", plist->name, *plist->valp);
+	plist = plist->next;
+    }
+}
+
 bool do_source_cmd(int argc, char *argv[]) {
     if (argc < 2) {
 	report(0, "No source file given");
@@ -475,6 +506,7 @@ static char *readline() {
 
     if (buf_stack == NULL)
 	return NULL;
+    bool primary = buf_stack->prev == NULL;
 
     for (cnt = 0; cnt < RIO_BUFSIZE-2; cnt++) {
 	if (buf_stack->cnt <= 0) {
@@ -491,6 +523,8 @@ static char *readline() {
 		    *lptr++ = '\0';
 		    if (echo)
 			report_noreturn(0, "%s%s", prompt, linebuf);
+		    if (primary)
+			primary_lines++;
 		    return linebuf;
 		} else
 		    return NULL;
@@ -510,10 +544,50 @@ static char *readline() {
     *lptr++ = '\0';
     if (echo)
 	report_noreturn(0, "%s%s", prompt, linebuf);
+    if (primary)
+	primary_lines++;
     return linebuf;
 }
 
 
+/* Read command, skipping initial lines of primary input when resuming */
+static char *next_cmdline() {
+    char *cmdline = readline();
+    while (cmdline && primary_lines <= skip_lines)
+	cmdline = readline();
+    return cmdline;
+}
+
+/* Execute command line and then any command hook */
+static void run_cmdline(char *cmdline) {
+    interpret_cmd(cmdline);
+    if (command_hook && !quit_flag)
+	command_hook();
+}
+
+size_t cmd_offset() {
+    if (buf_stack && buf_stack->prev)
+	/* Within source file.  Primary command still executing */
+	return primary_lines - 1;
+    return primary_lines;
+}
+
+void set_cmd_skip(size_t count) {
+    skip_lines = count;
+}
+
+void set_command_hook(hook_function hf) {
+    command_hook = hf;
+}
+
+size_t cmd_line_number() {
+    return primary_lines;
+}
+
+void set_profile_function(profile_function pf) {
+    profiler = pf;
+}
+
 void block_console() {
     block_flag = true;
 }
@@ -554,8 +628,9 @@ int cmd_select(int nfds, fd_set *readfds, fd_set *writefds, fd_set *exceptfds,
     int infd;
     fd_set local_readset;
     while (!block_flag && read_ready()) {
-	cmdline = readline();
-	interpret_cmd(cmdline);
+	cmdline = next_cmdline();
+	if (cmdline)
+	    run_cmdline(cmdline);
 	prompt_flag = true;
     }
     if (cmd_done())
@@ -570,7 +645,8 @@ int cmd_select(int nfds, fd_set *readfds, fd_set *writefds, fd_set *exceptfds,
 	if (infd == STDIN_FILENO && prompt_flag) {
 	    printf("%s", prompt);
 	    fflush(stdout);
-	    prompt_flag = true;
+	    /* Don't repeat prompt when select times out */
+	    prompt_flag = false;
 	}
 	if (infd >= nfds) {
 	    nfds = infd+1;
@@ -586,9 +662,10 @@ int cmd_select(int nfds, fd_set *readfds, fd_set *writefds, fd_set *exceptfds,
 	/* Commandline input available */
 	FD_CLR(infd, readfds);
 	result--;
-	cmdline = readline();
+	cmdline = next_cmdline();
 	if (cmdline)
-	    interpret_cmd(cmdline);
+	    run_cmdline(cmdline);
+	prompt_flag = true;
     }
     return result;
 }
@@ -33,6 +33,9 @@ void init_cmd();
 /* Add a new command */
 void add_cmd(char *name, cmd_function operation, char *documentation);
 
+/* Find function for command.  Returns NULL if not found */
+cmd_function find_cmd(char *name);
+
 /* Add a new parameter */
 void add_param(char *name, int *valp, char *doccumentation,
 	       setter_function setter);
@@ -55,6 +58,28 @@ void add_quit_helper(cmd_function qf);
 /* Set prompt */
 void set_prompt(char *prompt);
 
+/* Number of commands read from primary command input that have completed.
+   A command in progress when called from within a sourced file is not counted */
+size_t cmd_offset();
+
+/* Skip first count commands of primary command input (for resuming a run) */
+void set_cmd_skip(size_t count);
+
+/* Function to be executed after each command */
+typedef void (*hook_function)();
+void set_command_hook(hook_function hf);
+
+/* Line number within primary command input of most recent command */
+size_t cmd_line_number();
+
+/* Optional function called before (done = false) and after (done = true)
+   executing each command line */
+typedef void (*profile_function)(int argc, char *argv[], bool done);
+void set_profile_function(profile_function pf);
+
+/* Write settings of all parameters, as option commands */
+void write_options(FILE *outfile);
+
 /*
   Some console commands require network activity to complete.
   Program maintains a flag indicating whether console is ready to execute a new
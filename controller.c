@@ -57,6 +57,21 @@ static set_ptr worker_fd_set = NULL;
 /* Set of client file descriptors */
 static set_ptr client_fd_set = NULL;
 
+/* Map from worker file descriptors to agent IDs */
+static keyvalue_table_ptr worker_agent_map = NULL;
+
+/* Workers joining after startup */
+/* How many more workers may join */
+static int join_slots = 0;
+/* Workers that have registered, but are not yet part of the system */
+static set_ptr join_fd_set = NULL;
+/* Subset of joining workers that are ready to be added */
+static set_ptr join_ready_set = NULL;
+/* Has set of workers changed since last GC? */
+static bool workers_changed = false;
+/* Are worker IDs other than 0 .. worker_cnt-1? */
+static bool workers_renumbered = false;
+
 /* Collect statistics from workers as a set of messages */
 static int stat_message_cnt = 0;
 static chunk_ptr *stat_messages = NULL;
@@ -98,6 +113,22 @@ static global_op_ptr global_ops = NULL;
       Message type MSG_GC_FINISH
       Enter GC_READY state
 
+When the set of workers has changed (a worker has joined):
+   5: Before notifying workers to finish GC, send them list of workers
+      Message type MSG_WORKERS
+   6: Workers send unique table entries to their new owners via controller,
+      and then notify when they are done.
+      Message type MSG_MIGRATE, followed by MSG_GC_FINISH
+   7: When all workers have responded, send end marker to all workers
+      Message type MSG_MIGRATE (with no data)
+      Enter GC_WAIT_MIGRATE state
+   8: Workers echo end marker, indicating that all entries have been received
+      Message type MSG_MIGRATE
+   9: When all workers have responded, send list of workers to clients,
+      and then notify them to finish GC
+      Message types MSG_WORKERS, MSG_GC_FINISH
+      Enter GC_READY state
+
 Other events:
    - Flush or kill will cause GC to abort.  Return to GC_READY state
    - Client may request unary operation before it is notified by step #3.
@@ -109,7 +140,8 @@ typedef enum {
     GC_READY,
     GC_WAIT_WORKER_START,
     GC_WAIT_CLIENT,
-    GC_WAIT_WORKER_FINISH
+    GC_WAIT_WORKER_FINISH,
+    GC_WAIT_MIGRATE
 } gc_state_t;
 
 /* GC status information */
@@ -124,6 +156,13 @@ static set_ptr defer_client_fd_set = NULL;
 /* Garbage collector generation */
 static unsigned gc_generation = 0;
 
+/* Telemetry: Number of completed GCs, total time spent in them,
+   and longest pause */
+static size_t gc_cnt = 0;
+static double gc_secs = 0.0;
+static double gc_max = 0.0;
+static double gc_start_time = 0.0;
+
 /***** End of global state *****/
 
 
@@ -166,13 +205,14 @@ static int receive_global_op_worker_ack(unsigned id) {
     if (ele) {
 	ele->worker_ack_cnt++;
 	if (ele->worker_ack_cnt >= worker_cnt) {
+	    int client_fd = ele->client_fd;
 	    /* Remove entry */
 	    if (prev)
 		prev->next = ele->next;
 	    else
 		global_ops = ele->next;
 	    free_block(ele, sizeof(global_op_ele));
-	    return ele->client_fd;
+	    return client_fd;
 	}
     } else {
 	err(false, "Failed to find entry for global operation with id %u", id);
@@ -186,6 +226,7 @@ bool quit_controller(int argc, char *argv[]);
 bool do_controller_flush_cmd(int argc, char *argv[]);
 bool do_controller_collect_cmd(int argc, char *argv[]);
 bool do_controller_status_cmd(int argc, char *argv[]);
+bool do_controller_addworker_cmd(int argc, char *argv[]);
 
 static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient);
 
@@ -210,6 +251,9 @@ static void init_controller(int port, int nrouters, int nworkers) {
     router_fd_set = word_set_new();
     worker_fd_set = word_set_new();
     client_fd_set = word_set_new();
+    worker_agent_map = word_keyvalue_new();
+    join_fd_set = word_set_new();
+    join_ready_set = word_set_new();
     init_cmd();
     add_cmd("status", do_controller_status_cmd,
 	    "              | Determine status of connected nodes");
@@ -217,6 +261,8 @@ static void init_controller(int port, int nrouters, int nworkers) {
 	    "              | Flush state of all agents");
     add_cmd("collect", do_controller_collect_cmd,
 	    "              | Initiate garbage collection");
+    add_cmd("addworker", do_controller_addworker_cmd,
+	    " [N]          | Allow N (default 1) more workers to join");
     add_quit_helper(quit_controller);
     need_routers = nrouters;
     need_workers = nworkers;
@@ -230,6 +276,67 @@ static void init_controller(int port, int nrouters, int nworkers) {
     need_client_fd_set = NULL;
     defer_client_fd_set = NULL;
     gc_generation = 0;
+    join_slots = 0;
+    workers_changed = false;
+    workers_renumbered = false;
+}
+
+/* Send list of worker agent IDs to each agent in set */
+static void send_workers(set_ptr fd_set) {
+    unsigned nw = worker_fd_set->nelements;
+    unsigned *ids = calloc_or_fail(nw, sizeof(unsigned), "send_workers");
+    unsigned i = 0;
+    word_t w, wa;
+    set_iterstart(worker_fd_set);
+    while (set_iternext(worker_fd_set, &w)) {
+	if (keyvalue_find(worker_agent_map, w, &wa))
+	    ids[i++] = (unsigned) wa;
+    }
+    chunk_ptr msg = msg_new_workers(i, ids);
+    set_iterstart(fd_set);
+    while (set_iternext(fd_set, &w)) {
+	int fd = (int) w;
+	if (!chunk_write(fd, msg))
+	    err(false, "Failed to send list of workers to fd %d", fd);
+    }
+    chunk_free(msg);
+    free_array(ids, nw, sizeof(unsigned));
+}
+
+/* Find file descriptor for worker.  Return -1 if not found */
+static int worker_fd_for_agent(unsigned agent) {
+    word_t w, wa;
+    set_iterstart(worker_fd_set);
+    while (set_iternext(worker_fd_set, &w)) {
+	if (keyvalue_find(worker_agent_map, w, &wa) && wa == agent)
+	    return (int) w;
+    }
+    return -1;
+}
+
+/* Bring joining workers that are ready into the system.
+   Must wait until no GC, flush, or global operation is underway.
+   Starts a GC, during which unique table entries are migrated */
+static void admit_workers() {
+    word_t w;
+    if (join_ready_set->nelements == 0 || gc_state != GC_READY
+	|| global_ops != NULL || stat_message_cnt > 0)
+	return;
+    int ncnt = worker_cnt + join_ready_set->nelements;
+    stat_messages = realloc_or_fail(stat_messages,
+				    worker_cnt * sizeof(chunk_ptr),
+				    ncnt * sizeof(chunk_ptr), "admit_workers");
+    while (set_removenext(join_ready_set, &w)) {
+	set_member(join_fd_set, w, true);
+	set_insert(worker_fd_set, w);
+    }
+    worker_cnt = ncnt;
+    workers_changed = true;
+    workers_renumbered = true;
+#if RPT >= 1
+    report(1, "Admitted new workers.  Now have %d workers", worker_cnt);
+#endif
+    do_controller_collect_cmd(0, NULL);
 }
 
 bool do_controller_status_cmd(int argc, char *argv[]) {
@@ -238,6 +345,26 @@ bool do_controller_status_cmd(int argc, char *argv[]) {
 	   client_fd_set->nelements);
     report(0, "%d/%u worker stat messages received",
 	   stat_message_cnt, worker_fd_set->nelements);
+    if (join_fd_set->nelements > 0 || join_slots > 0)
+	report(0, "Joining workers: %u registered, %u ready, %d slots open",
+	       join_fd_set->nelements, join_ready_set->nelements, join_slots);
+    return true;
+}
+
+bool do_controller_addworker_cmd(int argc, char *argv[]) {
+    int n = 1;
+    if (argc > 2 || (argc == 2 && !get_int(argv[1], &n)) || n < 1) {
+	report(0, "Usage: %s [N]", argv[0]);
+	return false;
+    }
+    if (need_workers > 0) {
+	err(false, "Cannot add workers until initial workers have connected");
+	return false;
+    }
+    join_slots += n;
+#if RPT >= 1
+    report(1, "Waiting for %d more workers to join", join_slots);
+#endif
     return true;
 }
 
@@ -266,6 +393,12 @@ bool do_controller_flush_cmd(int argc, char *argv[]) {
     }
     chunk_free(msg);
     free_global_ops();
+    if (workers_changed) {
+	/* Flushed state has nothing to migrate */
+	send_workers(worker_fd_set);
+	send_workers(client_fd_set);
+	workers_changed = false;
+    }
     gc_state = GC_READY;
     need_worker_cnt = 0;
     if (need_client_fd_set != NULL)
@@ -286,6 +419,7 @@ bool do_controller_collect_cmd(int argc, char *argv[]) {
 	return false;
     }
     gc_generation++;
+    init_time(&gc_start_time);
     chunk_ptr msg = msg_new_gc_start();
     set_iterstart(worker_fd_set);
     while (set_iternext(worker_fd_set, &w)) {
@@ -308,6 +442,8 @@ bool do_controller_collect_cmd(int argc, char *argv[]) {
 
 
 bool quit_controller(int argc, char *argv[]) {
+    /* Final telemetry sample */
+    telem_stop();
     /* Send kill messages to other nodes and close file connections */
     chunk_ptr msg = msg_new_kill();
     word_t w;
@@ -333,6 +469,14 @@ bool quit_controller(int argc, char *argv[]) {
 		"Failed to send kill message to worker with descriptor %d", fd);
 	close(fd);
     }
+    set_iterstart(join_fd_set);
+    while (set_iternext(join_fd_set, &w)) {
+	fd = w;
+	if (!chunk_write(fd, msg))
+	    err(false,
+		"Failed to send kill message to worker with descriptor %d", fd);
+	close(fd);
+    }
     set_iterstart(client_fd_set);
     while (set_iternext(client_fd_set, &w)) {
 	fd = w;
@@ -348,6 +492,9 @@ bool quit_controller(int argc, char *argv[]) {
     set_free(router_fd_set);
     set_free(worker_fd_set);
     set_free(client_fd_set);
+    keyvalue_free(worker_agent_map);
+    set_free(join_fd_set);
+    set_free(join_ready_set);
     while (stat_message_cnt > 0) {
 	chunk_free(stat_messages[--stat_message_cnt]);
     }
@@ -363,6 +510,27 @@ bool quit_controller(int argc, char *argv[]) {
     return true;
 }
 
+/* Report counters for telemetry sample */
+static void controller_telem() {
+    size_t gop_cnt = 0;
+    global_op_ptr ls;
+    for (ls = global_ops; ls; ls = ls->next)
+	gop_cnt++;
+    telem_field("workers", worker_fd_set->nelements);
+    telem_field("joining", join_fd_set->nelements);
+    telem_field("clients", client_fd_set->nelements);
+    telem_field("global_ops", gop_cnt);
+    telem_field("gc_cnt", gc_cnt);
+    telem_field_double("gc_secs", gc_secs);
+    telem_field_double("gc_max", gc_max);
+    telem_field("gc_active", gc_state == GC_READY ? 0 : 1);
+    telem_field("msgs_out", chunks_sent);
+    telem_field("bytes_out", chunk_bytes_sent);
+    telem_field("msgs_in", chunks_received);
+    telem_field("bytes_in", chunk_bytes_received);
+    telem_field("mem", current_bytes);
+}
+
 static fd_set set;
 static int maxfd = 0;
 
@@ -374,10 +542,15 @@ static void add_fd(int fd) {
 
 #define MAX_IDS (CHUNK_MAX_LENGTH-1)
 
-/* Add new agent.  Send agent ID + number of workers +  router map */
-static void add_agent(int fd, bool isclient) {
+/* Add new agent.  Send agent ID + number of workers +  router map.
+   If workers have been renumbered, follow with list of workers.
+   Only clients are subject to the client limit.
+   Returns false if agent was refused or could not be notified */
+static bool add_agent(int fd, bool isclient) {
     unsigned agent = next_agent++;
-    if (agent >= worker_cnt + maxclients) {
+    /* Opcode field of header indicates whether list of workers follows */
+    word_t wflag = workers_renumbered ? (word_t) 1 << 8 : 0;
+    if (isclient && agent >= worker_cnt + maxclients) {
 	/* Exceeded client limit */
 	chunk_ptr msg = msg_new_nack();
 	if (chunk_write(fd, msg)) {
@@ -391,7 +564,7 @@ static void add_agent(int fd, bool isclient) {
 #endif
 	}
 	chunk_free(msg);
-	return;
+	return false;
     }
 
     /* Need to break into sequence of messages according to max. chunk length */
@@ -415,7 +588,7 @@ static void add_agent(int fd, bool isclient) {
 	if (bcount == MAX_IDS) {
 	    /* This block is filled */
 	    size_t h1 = ((word_t) agent << 48) | ((word_t) ncount << 32) |
-		((word_t) worker_cnt << 16) | MSG_ACK_AGENT;
+		((word_t) worker_cnt << 16) | wflag | MSG_ACK_AGENT;
 	    chunk_insert_word(msg, h1, 0);
 	    ok = chunk_write(fd, msg);
 	    chunk_free(msg);
@@ -425,15 +598,24 @@ static void add_agent(int fd, bool isclient) {
     }
     if (ok && ncount > 0) {
 	size_t h1 = ((word_t) agent << 48) | ((word_t) ncount << 32) |
-	    ((word_t) worker_cnt << 16) | MSG_ACK_AGENT;
+	    ((word_t) worker_cnt << 16) | wflag | MSG_ACK_AGENT;
 	chunk_insert_word(msg, h1, 0);
 	ok = chunk_write(fd, msg);
 	chunk_free(msg);
 	ncount -= bcount;
     }
+    if (!isclient)
+	keyvalue_insert(worker_agent_map, (word_t) fd, (word_t) agent);
+    if (ok && wflag) {
+	set_ptr fd_set = word_set_new();
+	set_insert(fd_set, (word_t) fd);
+	send_workers(fd_set);
+	set_free(fd_set);
+    }
 #if RPT >= 3
     report(3, "Added agent %u with descriptor %d", agent, fd);
 #endif
+    return ok;
 }
 
 /* Accumulate worker messages with statistics */
@@ -527,9 +709,16 @@ static void run_controller(char *infile_name) {
 		fd = w;
 		add_fd(fd);
 	    }
+	    /* Accept messages from joining workers */
+	    set_iterstart(join_fd_set);
+	    while (set_iternext(join_fd_set, &w)) {
+		fd = w;
+		add_fd(fd);
+	    }
 	}
 
-	cmd_select(maxfd+1, &set, NULL, NULL, NULL);
+	cmd_select(maxfd+1, &set, NULL, NULL, telem_timeout());
+	telem_check();
 
 	for (fd = 0; fd <= maxfd; fd++) {
 	    if (!FD_ISSET(fd, &set))
@@ -554,6 +743,12 @@ static void run_controller(char *infile_name) {
 		    err(false, "Unexpected EOF from connected worker, fd %d.  Shutting down", fd);
 		    /* Shut down system */
 		    finish_cmd();
+		} else if (set_member(join_fd_set, (word_t) fd, true)) {
+		    err(false, "Unexpected EOF from joining worker, fd %d", fd);
+		    set_member(join_ready_set, (word_t) fd, true);
+		    keyvalue_remove(worker_agent_map, (word_t) fd, NULL, NULL);
+		    /* Make slot available to another worker */
+		    join_slots++;
 		} else if (set_member(client_fd_set, (word_t) fd, true)) {
 #if RPT >= 3
 		    report(3, "Disconnection from client (fd %d)", fd);
@@ -616,6 +811,21 @@ static void run_controller(char *infile_name) {
 		    break;
 		case MSG_REGISTER_WORKER:
 		    if (worker_fd_set->nelements >= worker_cnt) {
+			if (join_slots > 0 && need_workers == 0) {
+			    join_slots--;
+			    set_insert(join_fd_set, (word_t) fd);
+#if RPT >= 2
+			    report(2, "Worker with fd %d joining", fd);
+#endif
+			    if (!add_agent(fd, false)) {
+				err(false, "Couldn't add joining worker with fd %d", fd);
+				set_member(join_fd_set, (word_t) fd, true);
+				keyvalue_remove(worker_agent_map, (word_t) fd, NULL, NULL);
+				join_slots++;
+				close(fd);
+			    }
+			    break;
+			}
 			err(false, "Unexpected worker registration.  (Ignored)");
 			close(fd);
 			break;
@@ -711,10 +921,50 @@ static void run_controller(char *infile_name) {
 		    chunk_free(msg);
 		    handle_gc_msg(code, gen, fd, false);
 		    break;
+		case MSG_MIGRATE:
+		    if (msg->length == 1) {
+			/* Worker has received all migrated entries */
+			handle_gc_msg(code, 0, fd, false);
+		    } else {
+			/* Forward unique table entries to new owner */
+			agent = msg_get_header_agent(h);
+			int dfd = worker_fd_for_agent(agent);
+			if (dfd < 0 || !chunk_write(dfd, msg))
+			    err(false,
+"Failed to forward migration message to worker %u", agent);
+		    }
+		    chunk_free(msg);
+		    break;
+		case MSG_LOAD:
+		    /* Pass queue depth on to other workers */
+		    set_iterstart(worker_fd_set);
+		    while (set_iternext(worker_fd_set, &w)) {
+			int worker_fd = (int) w;
+			if (worker_fd == fd)
+			    continue;
+			if (!chunk_write(worker_fd, msg))
+			    err(false,
+"Failed to send load information to worker with fd %d", worker_fd);
+		    }
+		    chunk_free(msg);
+		    break;
 		default:
 		    chunk_free(msg);
 		    err(false, "Unexpected message code %u from worker", code);
 		}
+	    } else if (set_member(join_fd_set, (word_t) fd, false)) {
+		/* Message from joining worker */
+		chunk_free(msg);
+		if (code == MSG_READY_WORKER) {
+		    set_insert(join_ready_set, (word_t) fd);
+#if RPT >= 2
+		    report(2, "Joining worker with fd %d ready", fd);
+#endif
+		    admit_workers();
+		} else {
+		    err(false, "Unexpected message code %u from joining worker",
+			code);
+		}
 	    } else if (set_member(client_fd_set, (word_t) fd, false)) {
 		/* Message from client */
 		switch(code){
@@ -795,6 +1045,46 @@ static void run_controller(char *infile_name) {
 }
 
 
+/* Final step of GC: Notify clients and admit deferred agents */
+static void finish_gc_clients() {
+    word_t w;
+    chunk_ptr msg = msg_new_gc_finish();
+    set_iterstart(client_fd_set);
+    while (set_iternext(client_fd_set, &w)) {
+	int cfd = (int) w;
+	if (!chunk_write(cfd, msg))
+	    err(false,
+"Failed to send GC finish message to client with fd %d", cfd);
+    }
+    chunk_free(msg);
+    /* See if there are deferred client connections */
+    if (defer_client_fd_set != NULL) {
+	set_iterstart(defer_client_fd_set);
+	while (set_iternext(defer_client_fd_set, &w)) {
+	    int cfd = (int) w;
+	    set_insert(client_fd_set, (word_t) cfd);
+#if RPT >= 4
+	    report(4, "Added deferred client with fd %d", cfd);
+#endif
+	    if (need_workers == 0)
+		add_agent(cfd, true);
+	}
+	set_free(defer_client_fd_set);
+	defer_client_fd_set = NULL;
+    }
+    gc_state = GC_READY;
+    double pause = delta_time(&gc_start_time);
+    gc_cnt++;
+    gc_secs += pause;
+    if (pause > gc_max)
+	gc_max = pause;
+#if RPT >= 2
+    report(2, "GC completed.  Pause %.3f seconds", pause);
+#endif
+    /* Workers waiting to join can do so now */
+    admit_workers();
+}
+
 static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient) {
     char *source = isclient ? "client" : "worker";
     word_t w;
@@ -866,6 +1156,9 @@ static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient) {
 		if (need_client_fd_set->nelements == 0) {
 		    set_free(need_client_fd_set);
 		    need_client_fd_set = NULL;
+		    if (workers_changed)
+			/* Workers must know new owners before finishing */
+			send_workers(worker_fd_set);
 		    chunk_ptr msg = msg_new_gc_finish();
 		    set_iterstart(worker_fd_set);
 		    while (set_iternext(worker_fd_set, &w)) {
@@ -901,34 +1194,26 @@ static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient) {
 	if (code == MSG_GC_FINISH && !isclient) {
 	    need_worker_cnt--;
 	    if (need_worker_cnt == 0) {
-		chunk_ptr msg = msg_new_gc_finish();
-		set_iterstart(client_fd_set);
-		while (set_iternext(client_fd_set, &w)) {
-		    int cfd = (int) w;
-		    if (!chunk_write(cfd, msg))
-			err(false,
-"Failed to send GC finish message to client with fd %d", fd);
-		}
-		chunk_free(msg);
-		/* See if there are deferred client connections */
-		if (defer_client_fd_set != NULL) {
-		    set_iterstart(defer_client_fd_set);
-		    while (set_iternext(defer_client_fd_set, &w)) {
-			int cfd = (int) w;
-			set_insert(client_fd_set, (word_t) cfd);
-#if RPT >= 4
-			report(4, "Added deferred client with fd %d", cfd);
-#endif
-			if (need_workers == 0)
-			    add_agent(cfd, true);
+		if (workers_changed) {
+		    /* Make sure all migrated entries have been received */
+		    chunk_ptr msg = msg_new_migrate(0, 0);
+		    set_iterstart(worker_fd_set);
+		    while (set_iternext(worker_fd_set, &w)) {
+			int wfd = (int) w;
+			if (!chunk_write(wfd, msg)) {
+			    err(false,
+"Failed to send end of migration message to worker with fd %d", wfd);
+			}
 		    }
-		    set_free(defer_client_fd_set);
-		    defer_client_fd_set = NULL;
-		}
-		gc_state = GC_READY;
+		    chunk_free(msg);
+		    gc_state = GC_WAIT_MIGRATE;
+		    need_worker_cnt = worker_fd_set->nelements;
 #if RPT >= 3
-		report(3, "GC completed");
+		    report(3, "GC waiting for workers to complete migration");
 #endif
+		} else {
+		    finish_gc_clients();
+		}
 	    }
 	} else if (code == MSG_GC_REQUEST) {
 #if RPT >= 4
@@ -941,6 +1226,26 @@ static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient) {
 		code, source);
 	}
 	break;
+    case GC_WAIT_MIGRATE:
+	if (code == MSG_MIGRATE && !isclient) {
+	    need_worker_cnt--;
+	    if (need_worker_cnt == 0) {
+		/* Clients must know new owners before resuming */
+		send_workers(client_fd_set);
+		workers_changed = false;
+		finish_gc_clients();
+	    }
+	} else if (code == MSG_GC_REQUEST) {
+#if RPT >= 4
+	    report(4,
+"GC request by worker while waiting for migration.  Ignored.");
+#endif
+	} else {
+	    err(false,
+"Unexpected code %u from %s while waiting for migration",
+		code, source);
+	}
+	break;
     default:
 	err(false, "GC in unexpected state %u", gc_state);
     }
@@ -948,7 +1253,7 @@ static void handle_gc_msg(unsigned code, unsigned gen, int fd, bool isclient) {
 
 
 static void usage(char *cmd) {
-    printf("Usage: %s [-h] [-v VLEVEL] [-p port] [-r RCNT] [-w WCNT] [-c CCNT] [-C]\n",
+    printf("Usage: %s [-h] [-v VLEVEL] [-p port] [-r RCNT] [-w WCNT] [-c CCNT] [-C] [-T FILE] [-i SECS]\n",
 	   cmd);
     printf("\t-h         Print this information\n");
     printf("\t-v VLEVEL  Set verbosity level\n");
@@ -957,6 +1262,8 @@ static void usage(char *cmd) {
     printf("\t-w WCNT    Specify number of workers\n");
     printf("\t-c CCNT    Specify maximum number of clients\n");
     printf("\t-C         Operate without console\n");
+    printf("\t-T FILE    Append telemetry samples to FILE\n");
+    printf("\t-i SECS    Interval between telemetry samples (default 1.0)\n");
     exit(0);
 }
 
@@ -969,7 +1276,9 @@ int main(int argc, char *argv[]) {
     int c;
     int level = 1;
     bool console = true;
-    while ((c = getopt(argc, argv, "hv:p:r:w:c:C")) != -1) {
+    char *telem_file = NULL;
+    double telem_interval = 1.0;
+    while ((c = getopt(argc, argv, "hv:p:r:w:c:CT:i:")) != -1) {
 	switch (c) {
 	case 'h':
 	    usage(argv[0]);
@@ -992,6 +1301,12 @@ int main(int argc, char *argv[]) {
 	case 'C':
 	    console = false;
 	    break;
+	case 'T':
+	    telem_file = optarg;
+	    break;
+	case 'i':
+	    telem_interval = atof(optarg);
+	    break;
 	default:
 	    printf("Unknown option '%c'\n", c);
 	    usage(argv[0]);
@@ -1002,6 +1317,8 @@ int main(int argc, char *argv[]) {
     if (signal(SIGTERM, sigterm_handler) == SIG_ERR)
 	err(false, "Couldn't install signal handler");
     init_controller(port, nrouters, nworkers);
+    if (telem_file)
+	telem_start(telem_file, "controller", telem_interval, controller_telem);
     if (!console)
 	block_console();
     run_controller(NULL);
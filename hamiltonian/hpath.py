@@ -442,6 +442,8 @@ class Cluster:
     okFormula = None
     vertexFormulaDict = {}
     stepFormulaDict = {}
+    # Store all formulas of cluster in single file with shared nodes
+    sharedStore = True
 
     def __init__(self, graph, id, stepMin = None, stepMax = None, vertexSet = None):
         self.graph = graph
@@ -487,32 +489,46 @@ class Cluster:
         fields = suffix.split("_")
         return fields[-1]
 
+    # Name of file holding all formulas when using shared store
+    def sharedFileName(self):
+        return str(self) + ".bdd"
+
+    # Returns list of file names, one per formula.
+    # With shared store, these only encode the formula names
     def store(self):
         fnames = []
+        formulas = []
         fname = self.fname("o", self.okFormula)
         fnames.append(fname)
-        self.graph.ckt.store(self.okFormula, fname)
+        formulas.append(self.okFormula)
         for k in self.vertexFormulaDict.keys():
-            fname = self.fname("v", self.vertexFormulaDict[k])
-            fnames.append(fname)
-            self.graph.ckt.store(self.vertexFormulaDict[k], fname)
+            fnames.append(self.fname("v", self.vertexFormulaDict[k]))
+            formulas.append(self.vertexFormulaDict[k])
         for k in self.stepFormulaDict.keys():
-            fname = self.fname("s", self.stepFormulaDict[k])
-            fnames.append(fname)
-            self.graph.ckt.store(self.stepFormulaDict[k], fname)        
+            fnames.append(self.fname("s", self.stepFormulaDict[k]))
+            formulas.append(self.stepFormulaDict[k])
+        if self.sharedStore:
+            self.graph.ckt.storeRoots(self.sharedFileName(), formulas)
+        else:
+            for (f, fname) in zip(formulas, fnames):
+                self.graph.ckt.store(f, fname)
         return fnames
 
     def load(self, id, fnames):
+        if self.sharedStore:
+            self.graph.ckt.loadRoots(self.sharedFileName())
         onames = [fname for fname in fnames if self.getTag(fname) == 'o']
         if len(onames) != 1:
             raise GraphException("Couldn't find OK formula for cluster %s" % self.getId(fnames[0]))
         self.okFormula = self.getSuffix(onames[0])
-        self.graph.ckt.load(self.okFormula, onames[0])
+        if not self.sharedStore:
+            self.graph.ckt.load(self.okFormula, onames[0])
         vnames = [fname for fname in fnames if self.getTag(fname) == 'v']
         for fname in vnames:
             suffix = self.getSuffix(fname)
             step = int(suffix[-2:])
-            self.graph.ckt.load(suffix, fname)
+            if not self.sharedStore:
+                self.graph.ckt.load(suffix, fname)
             self.vertexFormulaDict[step] = suffix
         snames = [fname for fname in fnames if self.getTag(fname) == 's']        
         self.vertexSet = set([])
@@ -520,7 +536,8 @@ class Cluster:
             suffix = self.getSuffix(fname)
             vertex = self.getVertex(fname)
             self.vertexSet |= {vertex}
-            self.graph.ckt.load(suffix, fname)
+            if not self.sharedStore:
+                self.graph.ckt.load(suffix, fname)
             self.stepFormulaDict[vertex] = suffix
 
     def unitCluster(self, vertex, step):
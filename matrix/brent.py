@@ -1033,6 +1033,9 @@ class MProblem:
             self.dfGenerator(streamlineNode, check, prefix = nprefix)
             tlist.append(BrentTerm(nprefix))
         terms = self.ckt.addVec(circuit.Vec(tlist))
+        if check and level > 1:
+            # Check the terms just built with a single command before combining them
+            self.ckt.checkConstants(terms, 1)
         args = terms
         if level == self.streamlineLevel and streamlineNode is not None:
             tlist = [streamlineNode] + tlist
@@ -1040,7 +1043,7 @@ class MProblem:
         bn = BrentTerm(prefix)
         self.ckt.andN(bn, args)
         self.ckt.decRefs([terms])
-        if check:
+        if check and level == 6:
             self.ckt.checkConstant(bn, 1)
         if level == 6:
             # Top level cleanup
@@ -1055,6 +1058,7 @@ class MProblem:
         ranges = self.fullRanges()
         for level in unitRange(6):
             self.ckt.comment("Combining terms at level %d" % level)
+            self.ckt.profileTag("level%d" % level)
             gcount = ranges[-1]
             ranges = ranges[:-1]
             indices = indexExpand(ranges)
@@ -1099,6 +1103,7 @@ class MProblem:
             
         for level in levelList:
             self.ckt.comment("Combining terms at level %d" % level)
+            self.ckt.profileTag("level%d" % level)
             gcounts = ranges[6-level:6-lastLevel]
             ranges = ranges[:6-level]
             indices = indexExpand(ranges)
@@ -1115,8 +1120,9 @@ class MProblem:
                 else:
                     self.ckt.andN(bn, args)
                 self.ckt.decRefs([terms])
-                if check:
-                    self.ckt.checkConstant(bn, 1)
+            if check:
+                # Check all terms at this level with a single command
+                self.ckt.checkConstants(circuit.Vec([BrentTerm(idx) for idx in indices]), 1)
             if streamlineNode is not None and level == slevel:
                 self.ckt.decRefs([streamlineNode])
             if not check:
@@ -1132,13 +1138,16 @@ class MProblem:
         self.ckt.comment("Generate all Brent equations")
         first = True
         for idx in indices:
-            self.generateBrent(idx, kset = kset, check = check, useZdd = useZdd, fixKV = fixKV, boundNonKernels = boundNonKernels)
+            self.generateBrent(idx, kset = kset, useZdd = useZdd, fixKV = fixKV, boundNonKernels = boundNonKernels)
             if first and not check:
                 first = False
                 name = circuit.Vec([BrentTerm(idx)])
                 self.ckt.comment("Find size of typical Brent term")
                 self.ckt.information(name)
-        if not check:
+        if check:
+            # Check all equations with a single command before combining them
+            self.ckt.checkConstants(circuit.Vec([BrentTerm(idx) for idx in indices]), 1)
+        else:
             names = circuit.Vec([BrentTerm(idx) for idx in indices])
             self.ckt.comment("Find combined size of all Brent terms")
             self.ckt.information(names)
@@ -141,6 +141,9 @@ class Vec:
 # Framework for creating expressions
 class Circuit:
     outfile = None
+    # Should vector operations be performed by single "vector" commands?
+    # Off by default, so that generated scripts are unchanged
+    batchVectors = False
     # Set of (nonvector) nodes
     nodes = None
     # Set of vectors
@@ -217,6 +220,10 @@ class Circuit:
     def comment(self, line):
         self.write("# " + line)
 
+    # Attribute subsequent commands to tag when profiling
+    def profileTag(self, tag):
+        self.cmdLine("profile", ["tag", tag])
+
     # Generate single line command
     # Obj can be single node or vector, or list of nodes/vectors
     def cmdLine(self, cmd, obj):
@@ -230,6 +237,38 @@ class Circuit:
     def declare(self, varv):
         self.cmdLine("var", varv)
 
+    # Declare variables following order written by "orderstore" in earlier run.
+    # Names not in file are declared afterward, in their given order
+    def declareOrdered(self, names, fname):
+        try:
+            ofile = open(fname, 'r')
+        except IOError:
+            self.comment("Couldn't open order file '%s'" % fname)
+            self.declare(names)
+            return
+        nameSet = set(names)
+        ordered = []
+        for line in ofile:
+            name = line.strip()
+            if name in nameSet:
+                ordered.append(name)
+                nameSet.remove(name)
+        ofile.close()
+        ordered += [name for name in names if name in nameSet]
+        self.declare(ordered)
+
+    # Keep adjacent variables together during dynamic reordering
+    def group(self, varv, fixed = False):
+        ls = ["-f"] if fixed else []
+        ls += [str(v) for v in varv]
+        self.cmdLine("group", ls)
+
+    # Save session to directory.  Nonzero seconds gives periodic checkpoints
+    # Resume with runbdd -R dirName -f <same command file>
+    def checkpoint(self, dirName, seconds = None):
+        ls = [] if seconds is None else ["-a", str(seconds)]
+        self.cmdLine("checkpoint", ls + [dirName])
+
     def delete(self, obj):
         self.cmdLine("delete", obj)
 
@@ -242,11 +281,49 @@ class Circuit:
     def status(self):
         self.write("status")
 
-    def count(self, fv):
-        self.cmdLine("count", fv)
+    # Count solutions of functions in a single pass.
+    # projectVars: optional list of variables onto which to project
+    # fast: use floating-point counts
+    def count(self, fv, projectVars = None, fast = False):
+        opts = []
+        if fast:
+            opts.append("-f")
+        if projectVars is not None:
+            opts += ["-p", ",".join(map(str, projectVars))]
+        if len(opts) == 0:
+            self.cmdLine("count", fv)
+        else:
+            self.cmdLine("count " + " ".join(opts), fv)
 
-    def satisfy(self, fv):
-        self.cmdLine("satisfy", fv)
+    # Optionally limit number of cubes, generate random samples,
+    # and write solutions (packed as hex) to file
+    def satisfy(self, fv, limit = None, samples = None, fname = None, packed = False):
+        ls = []
+        if limit is not None:
+            ls += ["-n", str(limit)]
+        if samples is not None:
+            ls += ["-s", str(samples)]
+        if packed:
+            ls += ["-p"]
+        if fname is not None:
+            ls += ["-o", fname]
+        if type(fv) in [type([]), type(())]:
+            ls += [str(f) for f in fv]
+        else:
+            ls.append(str(fv))
+        self.cmdLine("satisfy", ls)
+
+    # Format list of names as argument to "vector" command:
+    # Prefix form when names are root0, root1, ..., single name when all the same,
+    # and bracketed list otherwise
+    def vectorArg(self, names):
+        if len(set(names)) == 1:
+            return names[0]
+        if names[0][-1:] == '0':
+            root = names[0][:-1]
+            if names == [root + str(i) for i in range(len(names))]:
+                return root + '*'
+        return '[' + ','.join(names) + ']'
 
     # Generate sequence of commands
     # argList should be list of vectors
@@ -254,6 +331,10 @@ class Circuit:
         n = max([len(v) for v in argList])
         nargList = [v.extend(n) for v in argList]
         lists = [v.nodes for v in nargList]
+        if self.batchVectors and n > 1:
+            args = ["-n", n, cmd] + [self.vectorArg(ls) for ls in lists]
+            self.cmdLine("vector", args)
+            return
         for i in range(n):
             args = [ele[i] for ele in lists]
             self.cmdLine(cmd, args)
@@ -273,6 +354,20 @@ class Circuit:
         ls.extend(args)
         self.cmdLine("conjunct", ls)
 
+    # Conjunction following a static pairing schedule, written to file fname.
+    # Schedule is a list of pairs (i, j) of argument numbers, one per step.
+    # Arguments are numbered from 1, and the product of step s is numbered len(argList)+s.
+    # Restores default (similarity) pairing afterward
+    def conjunctSchedule(self, dest, argList, schedule, fname):
+        sfile = open(fname, 'w')
+        for (i, j) in schedule:
+            sfile.write("%d %d\n" % (i, j))
+        sfile.close()
+        self.cmdLine("schedule", [fname])
+        self.cmdLine("option", ["pairing", 4])
+        self.conjunctN(dest, argList)
+        self.cmdLine("option", ["pairing", 0])
+
     def orN(self, dest, argList):
         ls = [dest]
         ls.extend(argList)
@@ -302,15 +397,30 @@ class Circuit:
             self.comment("Couldn't assign value %s to node %s" % (val, dest)) 
 
     def checkConstant(self, dest, val):
+        self.checkConstants(dest, val)
+
+    # Check that every node in dests (node, list, or vector) equals constant val
+    # with a single assert command.  Only failures are reported.
+    # With stopOnFail, checking stops at the first failure, which counts as a command error
+    def checkConstants(self, dests, val, stopOnFail = False):
         cnode = None
         if val == 1:
             cnode = self.one
         elif val == 0:
             cnode = self.zero
         if cnode is None:
-            self.comment("Couldn't check that node %s = %d" % (dest, val))
+            self.comment("Couldn't check that nodes %s = %d" % (dests, val))
             return
-        self.cmdLine("equal", [dest, cnode])
+        opts = "-s " if stopOnFail else ""
+        self.cmdLine("assert " + opts + "-c " + str(cnode), dests)
+
+    # Check that each pair (a, b) in pairs has a == b with a single assert command
+    def checkEqual(self, pairs, stopOnFail = False):
+        ls = []
+        for (a, b) in pairs:
+            ls += [a, b]
+        opts = " -s" if stopOnFail else ""
+        self.cmdLine("assert" + opts, ls)
 
 
     def notV(self, dest, v):
@@ -760,7 +870,7 @@ def Multiplier(n, f = sys.stdout, zdd = Z.none, reverseA = False, reverseB = Fal
     if check:
         checkvec = ckt.nameVec("cout", n+n)
         ckt.multblast(checkvec, avec, bvec)
-        ckt.cmdSequence("equal", [outvec, checkvec])
+        ckt.checkEqual(zip(outvec.nodes, checkvec.nodes))
     ckt.status()
     ckt.comment("Flush state")
     ckt.write("flush")
@@ -237,7 +237,39 @@ def getPeakNodes(fname):
     
 
 # Extract solutions from file:
+# Solution files are written by "satisfy -o FILE".
+# Returns None if file is not a solution file.
+# Variables that are don't cares within a cube are set to 0.
+def getFileSolutions(fname):
+    try:
+        inf = open(fname, 'r')
+    except:
+        return None
+    fields = inf.readline().split()
+    if len(fields) != 3 or fields[0:2] != ['#', 'vars']:
+        inf.close()
+        return None
+    nvars = int(fields[2])
+    slist = []
+    for line in inf:
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+        fields = line.split()
+        if len(fields) == 2:
+            # Unpacked cube
+            slist.append(fields[0].replace('-', '0'))
+        else:
+            # Packed value, with optional mask
+            value = int(line.split('/')[0], 16)
+            slist.append(''.join(['1' if (value >> i) & 1 else '0' for i in range(nvars)]))
+    inf.close()
+    return slist
+
 def getBitSolutions(fname):
+    slist = getFileSolutions(fname)
+    if slist is not None:
+        return slist
     slist = []
     matcher = re.compile("[01]+")
     try:
@@ -291,6 +291,31 @@ chunk_ptr msg_new_gc_finish() {
     return msg_new_op(MSG_GC_FINISH);
 }
 
+chunk_ptr msg_new_workers(unsigned nworker, unsigned *ids) {
+    chunk_ptr msg = chunk_new(nworker+1);
+    word_t h = ((nworker & MASK16) << 16) | MSG_WORKERS;
+    chunk_insert_word(msg, h, 0);
+    unsigned i;
+    for (i = 0; i < nworker; i++)
+	chunk_insert_word(msg, (word_t) ids[i], i+1);
+    return msg;
+}
+
+chunk_ptr msg_new_migrate(unsigned agent, unsigned nword) {
+    chunk_ptr msg = chunk_new(nword+1);
+    word_t h = ((word_t) agent << 48) | MSG_MIGRATE;
+    chunk_insert_word(msg, h, 0);
+    return msg;
+}
+
+chunk_ptr msg_new_load(unsigned agent, size_t depth) {
+    chunk_ptr msg = chunk_new(2);
+    word_t h = ((word_t) agent << 48) | MSG_LOAD;
+    chunk_insert_word(msg, h, 0);
+    chunk_insert_word(msg, (word_t) depth, 1);
+    return msg;
+}
+
 /* Create listening socket.
    Port value of 0 indicates that port can be chosen arbitrarily.
    If successful, set fdp to fd for listening socket and portp to port.
@@ -32,7 +32,13 @@ enum {
     /* Intiated by controller */
     MSG_GC_REQUEST,
     MSG_GC_START,
-    MSG_GC_FINISH
+    MSG_GC_FINISH,
+    /* Load balancing.  From worker to controller, and then on to workers */
+    MSG_LOAD,
+    /* Worker membership.  From controller to worker or client */
+    MSG_WORKERS,
+    /* Unique table migration.  From worker to controller to worker */
+    MSG_MIGRATE
 };
 
 /**********************************************************
@@ -171,6 +177,25 @@ chunk_ptr msg_new_gc_request(unsigned gen);
 chunk_ptr msg_new_gc_start();
 chunk_ptr msg_new_gc_finish();
 
+/*
+  Create message advertising the queue depth of a worker.
+  Header has agent ID.  Second word has number of pending operations.
+ */
+chunk_ptr msg_new_load(unsigned agent, size_t depth);
+
+/*
+  Create message listing agent IDs of all workers.
+  Sent when set of workers changes.
+ */
+chunk_ptr msg_new_workers(unsigned nworker, unsigned *ids);
+
+/*
+  Create message carrying unique table entries to worker agent.
+  Caller fills in nword data words following header.
+  Message with no data words marks end of migration.
+ */
+chunk_ptr msg_new_migrate(unsigned agent, unsigned nword);
+
 
 /** Useful functions **/
 
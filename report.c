@@ -389,3 +389,108 @@ void random_hex(char *dest, int digits) {
 	sprintf(&dest[i], "%x", r & 0xF);
     }
 }
+
+/** Periodic telemetry **/
+
+static int telem_fd = -1;
+static char *telem_role = "unknown";
+static int telem_agent = -1;
+static double telem_interval = 1.0;
+static double telem_next = 0.0;
+static telem_function telem_fun = NULL;
+static struct timeval telem_tv;
+
+/* Line being assembled */
+#define TELEM_MAX 2048
+static char telem_buf[TELEM_MAX];
+static size_t telem_len = 0;
+
+static double wall_time() {
+    struct timeval tv;
+    gettimeofday(&tv, NULL);
+    return tv.tv_sec + 1.0E-6 * tv.tv_usec;
+}
+
+bool telem_start(char *file_name, char *role, double interval,
+		 telem_function fun) {
+    int fd = open(file_name, O_WRONLY|O_CREAT|O_APPEND, 0644);
+    if (fd < 0) {
+	err(false, "Couldn't open telemetry file '%s'", file_name);
+	return false;
+    }
+    telem_fd = fd;
+    telem_role = role;
+    telem_interval = interval > 0.0 ? interval : 1.0;
+    telem_fun = fun;
+    telem_next = wall_time() + telem_interval;
+    return true;
+}
+
+void telem_set_agent(unsigned agent) {
+    telem_agent = (int) agent;
+}
+
+struct timeval *telem_timeout() {
+    if (telem_fd < 0)
+	return NULL;
+    double wait = telem_next - wall_time();
+    if (wait < 0.0)
+	wait = 0.0;
+    telem_tv.tv_sec = (long) wait;
+    telem_tv.tv_usec = (long) (1.0E6 * (wait - telem_tv.tv_sec));
+    return &telem_tv;
+}
+
+static void telem_append(char *fmt, ...) {
+    va_list ap;
+    va_start(ap, fmt);
+    if (telem_len < TELEM_MAX) {
+	int n = vsnprintf(telem_buf + telem_len, TELEM_MAX - telem_len,
+			  fmt, ap);
+	if (n > 0)
+	    telem_len += n;
+	if (telem_len >= TELEM_MAX)
+	    telem_len = TELEM_MAX-1;
+    }
+    va_end(ap);
+}
+
+void telem_field(char *name, size_t val) {
+    telem_append(" %s=%lu", name, (long unsigned) val);
+}
+
+void telem_field_double(char *name, double val) {
+    telem_append(" %s=%.6f", name, val);
+}
+
+static void telem_sample(double now) {
+    telem_len = 0;
+    telem_append("TELEM %.3f %s %d", now, telem_role, telem_agent);
+    if (telem_fun)
+	telem_fun();
+    telem_append("\n");
+    /* Line may have been truncated */
+    telem_buf[telem_len-1] = '\n';
+    if (write(telem_fd, telem_buf, telem_len) < 0)
+	err(false, "Couldn't write telemetry sample");
+}
+
+void telem_check() {
+    if (telem_fd < 0)
+	return;
+    double now = wall_time();
+    if (now < telem_next)
+	return;
+    telem_sample(now);
+    /* Skip over any intervals that were missed */
+    while (telem_next <= now)
+	telem_next += telem_interval;
+}
+
+void telem_stop() {
+    if (telem_fd < 0)
+	return;
+    telem_sample(wall_time());
+    close(telem_fd);
+    telem_fd = -1;
+}
@@ -108,3 +108,43 @@ void sigterm_handler(int sig);
 
 /* Generate random sequence of hex digits */
 void random_hex(char *dest, int digits);
+
+/** Periodic telemetry **/
+
+/*
+  Agents can periodically append counter values to a file.
+  Each sample is a single line of the form:
+
+    TELEM <time> <role> <agent> <name>=<value> <name>=<value> ...
+
+  where <time> is wall-clock seconds since the epoch (so that lines from
+  different processes can be aligned), <role> is one of
+  controller, router, worker, or client, and <agent> is the agent ID
+  (-1 when the process has none).  Counters are cumulative
+  unless documented otherwise.  Each line is written with a
+  single call to write, so multiple processes can share one file.
+*/
+
+/* Function that supplies counter values by calling telem_field */
+typedef void (*telem_function)();
+
+/* Start sampling every interval seconds.  Return false if can't open file */
+bool telem_start(char *file_name, char *role, double interval,
+		 telem_function fun);
+
+/* Set agent ID once it has been assigned */
+void telem_set_agent(unsigned agent);
+
+/* Timeout to use for select, so that samples are taken on time.
+   Returns NULL if telemetry not enabled */
+struct timeval *telem_timeout();
+
+/* Generate sample if sampling interval has elapsed */
+void telem_check();
+
+/* Add counter to current sample */
+void telem_field(char *name, size_t val);
+void telem_field_double(char *name, double val);
+
+/* Generate final sample and close file */
+void telem_stop();
@@ -55,6 +55,21 @@ static queue_ptr outq_tail = NULL;
 /* switch for deactivating buffering */
 static int bufferingEnabled = 0;
 
+/* Telemetry: Number of queued messages and number routed */
+static size_t outq_cnt = 0;
+static size_t routed_cnt = 0;
+
+static void router_telem() {
+    telem_field("queue", outq_cnt);
+    telem_field("routed", routed_cnt);
+    telem_field("agents", routing_table->nelements);
+    telem_field("msgs_out", chunks_sent);
+    telem_field("bytes_out", chunk_bytes_sent);
+    telem_field("msgs_in", chunks_received);
+    telem_field("bytes_in", chunk_bytes_received);
+    telem_field("mem", current_bytes);
+}
+
 
 static void init_router(char *controller_name, unsigned controller_port) {
     unsigned myport = 0;
@@ -89,6 +104,8 @@ static void init_router(char *controller_name, unsigned controller_port) {
 }
 
 static void quit_router() {
+    /* Final telemetry sample */
+    telem_stop();
     /* Close file connections */
     chunk_deinit();
     int fd;
@@ -115,8 +132,6 @@ static void quit_router() {
 	chunk_free(ele->msg);
 	free_block(ele, sizeof(queue_ele));
     }
-
-
 }
 
 #if 0
@@ -156,6 +171,7 @@ static void insert_queue(chunk_ptr msg) {
     } else {
 	outq_head = outq_tail = ele;
     }
+    outq_cnt++;
 #if RPT >= 2
     word_t id = msg_get_dheader_op_id(dh);
     report(2, "Queued message with id 0x%lx for agent %u.", id, agent);
@@ -219,7 +235,7 @@ static void run_router() {
 	    add_outfd(ls->fd);
 	    ls = ls->next;
 	}
-            buf_select(maxfd+1, &inset, &outset, NULL, NULL);
+            buf_select(maxfd+1, &inset, &outset, NULL, telem_timeout());
 
 
 	/* Go through inputs */
@@ -334,8 +350,10 @@ static void run_router() {
 		if (outq_tail == ls)
 		    outq_tail = prev;
 		ls = ls->next;
+		outq_cnt--;
 		/* Send the message */
 		if (chunk_write(fd, outmsg)) {
+		    routed_cnt++;
 #if RPT >= 2
 		    dword_t dh = chunk_get_dword(outmsg, 0);
 		    word_t id = msg_get_dheader_op_id(dh);
@@ -354,17 +372,20 @@ static void run_router() {
 		ls = ls->next;
 	    }
 	}
+	telem_check();
     }
 }
 
 static void usage(char *cmd) {
-    printf("Usage: %s [-h] [-v VLEVEL] [-H HOST] [-P PORT]\n", cmd);
+    printf("Usage: %s [-h] [-v VLEVEL] [-H HOST] [-P PORT] [-T FILE] [-i SECS]\n", cmd);
     printf("\t-h         Print this information\n");
     printf("\t-v VLEVEL  Set verbosity level\n");
     printf("\t-H HOST    Use HOST as controller host\n");
     printf("\t-P PORT    Use PORT as controller port\n");
     printf("\t-b BUF_ON  Set 1 or 0 to turn buffering on or off");
     printf(", respectively (default 1)\n");
+    printf("\t-T FILE    Append telemetry samples to FILE\n");
+    printf("\t-i SECS    Interval between telemetry samples (default 1.0)\n");
     exit(0);
 }
 
@@ -375,7 +396,9 @@ int main(int argc, char *argv[]) {
     unsigned port = CPORT;
     int c;
     int level = 1;
-    while ((c = getopt(argc, argv, "hb:v:H:P:B:")) != -1) {
+    char *telem_file = NULL;
+    double telem_interval = 1.0;
+    while ((c = getopt(argc, argv, "hb:v:H:P:B:T:i:")) != -1) {
 	switch (c) {
 	case 'h':
 	    usage(argv[0]);
@@ -394,6 +417,12 @@ int main(int argc, char *argv[]) {
             bufferingEnabled = (((atoi(optarg) & 1) == atoi(optarg)) ?
 				atoi(optarg) : 1);
             break;
+	case 'T':
+	    telem_file = optarg;
+	    break;
+	case 'i':
+	    telem_interval = atof(optarg);
+	    break;
 	default:
 	    printf("Unknown option '%c'\n", c);
 	    usage(argv[0]);
@@ -404,6 +433,8 @@ int main(int argc, char *argv[]) {
     if (signal(SIGTERM, sigterm_handler) == SIG_ERR)
 	err(false, "Couldn't install signal handler");
     init_router(buf, port);
+    if (telem_file)
+	telem_start(telem_file, "router", telem_interval, router_telem);
     run_router();
     quit_router();
     mem_status(stdout);
@@ -8,7 +8,10 @@
 #include <getopt.h>
 #include <stdbool.h>
 #include <sys/select.h>
+#include <sys/stat.h>
 #include <signal.h>
+#include <errno.h>
+#include <time.h>
 
 #include "dtype.h"
 #include "table.h"
@@ -42,8 +45,26 @@ chaining_t chaining_type = CHAIN_NONE;
    should I assume all variables are in support of function? */
 int all_vars = 1;
 
-/* Should combining be done linearly or as a tree */
+/* Should combining be done linearly (0), as a tree (1), or adaptively (2) */
 int tree_reduction = 0;
+#define REDUCE_ADAPTIVE 2
+
+/* Adaptive reduction */
+/* Number of smallest operands considered when choosing pair to combine */
+int reduce_window = 4;
+/* Size limit for bounded AND attempts, as ratio to sum of argument sizes (scaled by 100) */
+int reduce_growth_scaled = 200;
+
+/* Memory governor.  Keep memory use within megabytes limit */
+int memory_governor = 0;
+
+/* Dynamic variable reordering (CUDD only).  Nonpositive values leave CUDD settings unchanged */
+/* Node count that triggers next reordering */
+int reorder_threshold = 4004;
+/* Max growth in node count while sifting a variable (scaled by 100) */
+int reorder_growth_scaled = 120;
+/* Max number of variables sifted */
+int reorder_sift_vars = 1000;
 
 
 /* Data structures */
@@ -67,6 +88,7 @@ keyvalue_table_ptr reftable;
 /* Forward declarations */
 bool do_aconvert(int argc, char *argv[]);
 bool do_and(int argc, char *argv[]);
+bool do_assert(int argc, char *argv[]);
 bool do_collect(int argc, char *argv[]);
 bool do_delete(int argc, char *argv[]);
 bool do_cofactor(int argc, char *argv[]);
@@ -87,11 +109,27 @@ bool do_size(int argc, char *argv[]);
 bool do_soft_and(int argc, char *argv[]);
 bool do_status(int argc, char *argv[]);
 bool do_store(int argc, char *argv[]);
+bool do_store_roots(int argc, char *argv[]);
+bool do_load_roots(int argc, char *argv[]);
+bool do_profile(int argc, char *argv[]);
 bool do_uquant(int argc, char *argv[]);
 bool do_var(int argc, char *argv[]);
 bool do_vector(int argc, char *argv[]);
 bool do_xor(int argc, char *argv[]);
 bool do_zconvert(int argc, char *argv[]);
+bool do_reorder(int argc, char *argv[]);
+bool do_autoreorder(int argc, char *argv[]);
+bool do_group(int argc, char *argv[]);
+bool do_order_store(int argc, char *argv[]);
+bool do_order_load(int argc, char *argv[]);
+bool do_checkpoint(int argc, char *argv[]);
+
+static void set_reorder_limits(int oldval);
+static bool resume_checkpoint(char *dir);
+static void after_command();
+static void profile_command(int argc, char *argv[], bool done);
+static void profile_free();
+static void set_governor(int oldval);
 
 chunk_ptr run_flush();
 
@@ -120,13 +158,15 @@ static void console_init(bool do_dist) {
 	    " af f ...       | Convert f to ADD and name af");
     add_cmd("and", do_and,
 	    " fd f1 f2 ...   | fd <- f1 & f2 & ...");
+    add_cmd("assert", do_assert,
+	    " [-s] [-c C] f1 g1 ... | Check f1 = g1, ...  (-c: check each fi = C, -s: stop and fail at first failure)");
     add_cmd("cofactor", do_cofactor,
 	    " fd f l1 ...    | fd <- cofactor(f, l1, ...");
     if (do_local || do_cudd)
 	add_cmd("collect", do_collect,
 		"            | Perform garbage collection (local & cudd only)");
     add_cmd("count", do_count,
-	    " f1 f2 ...      | Display function counts");
+	    " [-f] [-p v1,v2,...] f1 f2 ... | Display function counts (-f: floating point, -p: project onto variables)");
     add_cmd("delete", do_delete,
 	    " f1 f2 ...      | Delete functions");
     add_cmd("equal", do_equal,
@@ -138,6 +178,8 @@ static void console_init(bool do_dist) {
             "                | Flush local state");
     add_cmd("ite", do_ite,
 	    " fd fi ft fe    | fd <- ITE(fi, ft, fe)");
+    add_cmd("profile", do_profile,
+	    " on [F]|off|reset|tag T|show [F] | Profile commands (records to F), group by tag T");
     add_cmd("or", do_or,
 	    " fd f1 f2 ...   | fd <- f1 | f2 | ...");
     add_cmd("not", do_not,
@@ -145,7 +187,7 @@ static void console_init(bool do_dist) {
     add_cmd("info", do_information,
 	    " f1 ..          | Display combined information about functions");
     add_cmd("satisfy", do_satisfy,
-	    " f1 ..          | Print satisfying values for functions");
+	    " [-n N] [-c C] [-s K] [-r R] [-p] [-o F] f1 .. | Print satisfying values (N cubes from cursor C, or K random, packed, to file F)");
     add_cmd("shift", do_shift,
 	    " fd f v1' v1 ...| Variable shift");
     add_cmd("size", do_nothing,
@@ -156,6 +198,8 @@ static void console_init(bool do_dist) {
 	    " fd f v1 ...    | Universal quantification");
     add_cmd("var", do_var,
 	    " v1 v2 ...      | Create variables");
+    add_cmd("vector", do_vector,
+	    " [-n N] cmd v1 v2 ... | Apply cmd element-wise to vectors (root*, [a,b,...], or name)");
     add_cmd("xor", do_xor,
 	    " fd f1 f2 ...   | fd <- f1 ^ f2 ^ ...");
     add_cmd("restrict", do_restrict,
@@ -168,15 +212,61 @@ static void console_init(bool do_dist) {
 	    " f file         | Store f in file");
     add_cmd("load", do_load,
 	    " f file         | Load f from file");
+    add_cmd("mstore", do_store_roots,
+	    " file f1 f2 ... | Store f1, f2, ... in file with shared nodes");
+    add_cmd("mload", do_load_roots,
+	    " file [f1 ...]  | Load functions stored by mstore (only f1, ... when given)");
     add_param("collect", &enable_collect, "Enable garbage collection", NULL);
     add_param("allvars", &all_vars, "Count all variables in support", NULL);
-    add_param("tree", &tree_reduction, "Do reduction operations as tree", NULL);
+    add_param("tree", &tree_reduction, "Do reduction operations linearly (0), as tree (1), or adaptively (2)", NULL);
+    add_param("rwindow", &reduce_window, "Number of smallest operands considered by adaptive reduction", NULL);
+    add_param("rgrowth", &reduce_growth_scaled, "Size limit for bounded AND in adaptive reduction (scaled by 100)", NULL);
+    add_param("compact", &compact_store, "Store BDDs in compact format", NULL);
+    add_param("zlevel", &store_compress_level, "zlib compression level for compact format (0 = none)", NULL);
+    if (do_cudd)
+	add_param("governor", &memory_governor, "Tune memory use to stay within megabytes limit", set_governor);
+    if (do_cudd) {
+	add_cmd("reorder", do_reorder,
+		" [method]       | Reorder variables now (default sift)");
+	add_cmd("autoreorder", do_autoreorder,
+		" method         | Enable dynamic reordering with method (none to disable)");
+	add_cmd("group", do_group,
+		" [-f] v1 v2 ... | Keep adjacent variables together when reordering (-f: fix their order)");
+	add_cmd("orderstore", do_order_store,
+		" file           | Write variable order to file");
+	add_cmd("orderload", do_order_load,
+		" file           | Impose variable order from file");
+	add_param("reordernext", &reorder_threshold, "Node count that triggers next dynamic reordering", set_reorder_limits);
+	add_param("reordergrowth", &reorder_growth_scaled, "Max growth while sifting a variable (scaled by 100)", set_reorder_limits);
+	add_param("siftvars", &reorder_sift_vars, "Max number of variables sifted during reordering", set_reorder_limits);
+	add_cmd("checkpoint", do_checkpoint,
+		" [-a SECS] dir  | Save session to dir (-a: every SECS seconds, 0 to disable)");
+	set_command_hook(after_command);
+    }
     init_conjunct();
+    set_profile_function(profile_command);
 }
 
+/* Directory for periodic checkpoints */
+static char *checkpoint_dir = NULL;
+/* Seconds between periodic checkpoints (0 = disabled) */
+static int checkpoint_interval = 0;
+/* Time of last checkpoint */
+static double checkpoint_last = 0.0;
+/* Most recent dynamic reordering method, for checkpointing */
+static char *autoreorder_name = NULL;
+/* Sequence number of next checkpoint */
+static int checkpoint_seq = 0;
+
 static bool bdd_quit(int argc, char *argv[]) {
     word_t wk, wv;
 
+    if (checkpoint_dir)
+	free_string(checkpoint_dir);
+    if (autoreorder_name)
+	free_string(autoreorder_name);
+    profile_free();
+
     while (keyvalue_removenext(nametable, &wk, &wv)) {
 	char *s = (char *) wk;
 	ref_t rold = (ref_t) wv;
@@ -230,12 +320,13 @@ static bool bdd_quit(int argc, char *argv[]) {
 
 static void usage(char *cmd) {
     printf(
-"Usage: %s [-h] [-f FILE][-v VLEVEL] [-M MBYTES] [-c][-l][-d][-H HOST] [-P PORT][-r][-L FILE][-t LIMIT][-C chain][-K LOOKUP][-G GEN][-g][-p][-q QTHRES][-T]\n",
+"Usage: %s [-h] [-f FILE][-v VLEVEL] [-M MBYTES][-m] [-c][-l][-d][-H HOST] [-P PORT][-r][-L FILE][-t LIMIT][-C chain][-K LOOKUP][-G GEN][-g][-p][-q QTHRES][-T][-R DIR]\n",
 	   cmd);
     printf("\t-h         Print this information\n");
     printf("\t-f FILE    Read commands from file\n");
     printf("\t-v VLEVEL  Set verbosity level\n");
     printf("\t-M MBYTES  Set memory limit to MBYTES megabytes\n");
+    printf("\t-m         Tune cache, node limits, GC, and spilling to stay within memory limit\n");
     printf("\t-L FILE    Echo results to FILE\n");
     printf("\t-t LIMIT   Set time limit (in seconds)\n");
     printf("\t-C CHAIN   n: No chaining; c: constant chaining; a: Or chaining, z: Zero chaining\n");
@@ -245,6 +336,7 @@ static void usage(char *cmd) {
     printf("\t-p         Preprocess conjuncts with soft-and simplification\n");
     printf("\t-q QTHRES  Set BDD size threshold at which attempt existential quantification of conjuncts\n");    
     printf("\t-T         Generate tracking information on conjunctions\n");
+    printf("\t-R DIR     Resume from checkpoint in DIR (with same command file)\n");
     printf("Distributed BDD options\n");
     printf("\t-c         Use CUDD\n");
     printf("\t-l         Use local refs\n");
@@ -270,6 +362,8 @@ int main(int argc, char *argv[]) {
     char hbuf[BUFSIZE] = "localhost";
     unsigned port = CPORT;
     bool try_local_router = false;
+    char rbuf[BUFSIZE];
+    char *resume_dir = NULL;
     
     do_cudd = 1;
     do_local = 0;
@@ -277,7 +371,7 @@ int main(int argc, char *argv[]) {
     chaining_type = CHAIN_ALL;
 
 
-    while ((c = getopt(argc, argv, "hv:M:f:cldH:P:rL:t:C:R:K:G:gpq:T")) != -1) {
+    while ((c = getopt(argc, argv, "hv:M:mf:cldH:P:rL:t:C:R:K:G:gpq:T")) != -1) {
 	switch(c) {
 	case 'h':
 	    usage(argv[0]);
@@ -292,6 +386,9 @@ int main(int argc, char *argv[]) {
 	case 'M':
 	    mblimit = atoi(optarg);
 	    break;
+	case 'm':
+	    memory_governor = 1;
+	    break;
 	case 'c':
 	    do_cudd = true;
 	    break;
@@ -354,6 +451,10 @@ int main(int argc, char *argv[]) {
 	case 'T':
 	    track_conjunction = 1;
 	    break;
+	case 'R':
+	    resume_dir = strncpy(rbuf, optarg, BUFSIZE-1);
+	    rbuf[BUFSIZE-1] = '\0';
+	    break;
 	default:
 	    printf("Unknown option '%c'\n", c);
 	    usage(argv[0]);
@@ -371,8 +472,16 @@ int main(int argc, char *argv[]) {
 	set_agent_stat_helper(do_summary_stat);
     }
     console_init(do_dist);
+    if (memory_governor)
+	set_governor(0);
     show_options(1);
     add_quit_helper(bdd_quit);
+    if (resume_dir) {
+	if (!do_cudd || do_dist)
+	    err(true, "Resuming from checkpoint requires CUDD without distribution");
+	if (!resume_checkpoint(resume_dir))
+	    err(true, "Couldn't resume from checkpoint in '%s'", resume_dir);
+    }
     if (signal(SIGTERM, sigterm_handler) == SIG_ERR)
 	err(false, "Couldn't install signal handler");
     if (do_dist) {
@@ -675,6 +784,139 @@ static ref_t linear_reduce(char *argv[], ref_t unit_ref, combine_fun_t  cfun, in
 
 }
 
+/*
+  Adaptive reduction.  Result has incremented reference count.
+  Repeatedly combines a pair chosen from the smallest operands, preferring
+  small combined size and high support overlap (Huffman-style).
+  For AND, pairs are first attempted with a bound on the result size,
+  falling back to the best-scoring pair without a bound.
+  Stops early when an operand becomes absorbing (zero for AND, one for OR).
+  Requires CUDD for sizes and supports.  Otherwise uses tree reduction.
+*/
+#define MAX_REDUCE_WINDOW 16
+static ref_t adaptive_reduce(char *argv[], ref_t unit_ref, combine_fun_t cfun, int arglo, int arghi) {
+    int count = arghi - arglo + 1;
+    if (count <= 2 || !smgr->do_cudd)
+	return tree_reduce(argv, unit_ref, cfun, arglo, arghi);
+    ref_t *vals = calloc_or_fail(count, sizeof(ref_t), "adaptive_reduce");
+    size_t *sizes = calloc_or_fail(count, sizeof(size_t), "adaptive_reduce");
+    index_set **supports = calloc_or_fail(count, sizeof(index_set *), "adaptive_reduce");
+    int nargs = count;
+    bool is_and = cfun == shadow_and;
+    ref_t absorb = is_and ? shadow_zero(smgr) : cfun == shadow_or ? shadow_one(smgr) : REF_INVALID;
+    size_t input_nodes = 0;
+    size_t max_nodes = 0;
+    int aborts = 0;
+    int i, j;
+    ref_t rval = REF_INVALID;
+    for (i = 0; i < count; i++) {
+	ref_t r = get_ref(argv[arglo+i]);
+	if (REF_IS_INVALID(r)) {
+	    count = i;
+	    rval = REF_INVALID;
+	    goto done;
+	}
+	root_addref(r, false);
+	vals[i] = r;
+	sizes[i] = cudd_single_size(smgr, r);
+	supports[i] = shadow_support_indices(smgr, r);
+	input_nodes += sizes[i];
+	if (r == absorb)
+	    rval = r;
+    }
+    int window = reduce_window < 2 ? 2 : reduce_window > MAX_REDUCE_WINDOW ? MAX_REDUCE_WINDOW : reduce_window;
+    while (count > 1 && REF_IS_INVALID(rval)) {
+	/* Find smallest operands */
+	int wcount = 0;
+	int widx[MAX_REDUCE_WINDOW];
+	for (i = 0; i < count; i++) {
+	    int pos = wcount < window ? wcount++ : window;
+	    while (pos > 0 && sizes[widx[pos-1]] > sizes[i]) {
+		if (pos < window)
+		    widx[pos] = widx[pos-1];
+		pos--;
+	    }
+	    if (pos < window)
+		widx[pos] = i;
+	}
+	/* Rank pairs by combined size, discounted by support overlap */
+	int npairs = 0;
+	int pair1[MAX_REDUCE_WINDOW*MAX_REDUCE_WINDOW/2];
+	int pair2[MAX_REDUCE_WINDOW*MAX_REDUCE_WINDOW/2];
+	double score[MAX_REDUCE_WINDOW*MAX_REDUCE_WINDOW/2];
+	for (i = 0; i < wcount; i++) {
+	    for (j = i+1; j < wcount; j++) {
+		int a = widx[i];
+		int b = widx[j];
+		double sc = (double) (sizes[a] + sizes[b]) *
+		    (1.0 - 0.5 * index_similarity(supports[a], supports[b]));
+		int pos = npairs++;
+		while (pos > 0 && score[pos-1] > sc) {
+		    pair1[pos] = pair1[pos-1];
+		    pair2[pos] = pair2[pos-1];
+		    score[pos] = score[pos-1];
+		    pos--;
+		}
+		pair1[pos] = a < b ? a : b;
+		pair2[pos] = a < b ? b : a;
+		score[pos] = sc;
+	    }
+	}
+	ref_t nval = REF_INVALID;
+	int p = 0;
+	if (is_and) {
+	    for (p = 0; p < npairs; p++) {
+		size_t limit = (size_t) (0.01 * reduce_growth_scaled * (sizes[pair1[p]] + sizes[pair2[p]]));
+		nval = shadow_and_limit(smgr, vals[pair1[p]], vals[pair2[p]], limit == 0 ? 1 : limit, 0);
+		if (!REF_IS_INVALID(nval))
+		    break;
+		aborts++;
+	    }
+	}
+	if (REF_IS_INVALID(nval)) {
+	    p = 0;
+	    nval = cfun(smgr, vals[pair1[p]], vals[pair2[p]]);
+	}
+	int a = pair1[p];
+	int b = pair2[p];
+	root_addref(nval, true);
+	root_deref(vals[a]);
+	root_deref(vals[b]);
+	index_set_free(supports[a]);
+	index_set_free(supports[b]);
+	vals[a] = nval;
+	sizes[a] = cudd_single_size(smgr, nval);
+	supports[a] = shadow_support_indices(smgr, nval);
+	max_nodes = sizes[a] > max_nodes ? sizes[a] : max_nodes;
+	count--;
+	vals[b] = vals[count];
+	sizes[b] = sizes[count];
+	supports[b] = supports[count];
+	if (nval == absorb)
+	    rval = nval;
+	/* Check for local garbage collection */
+	if (shadow_gc_check(smgr))
+	    do_collect(0, NULL);
+	/* Initiate any deferred garbage collection */
+	if (do_dist)
+	    undefer();
+    }
+    if (REF_IS_INVALID(rval))
+	rval = vals[0];
+    root_addref(rval, false);
+    report(2, "Adaptive %s of %d arguments.  %zd --> %zd nodes.  Max intermediate %zd.  %d aborted attempts",
+	   argv[0], nargs, input_nodes, cudd_single_size(smgr, rval), max_nodes, aborts);
+ done:
+    for (i = 0; i < count; i++) {
+	root_deref(vals[i]);
+	index_set_free(supports[i]);
+    }
+    free_array(vals, nargs, sizeof(ref_t));
+    free_array(sizes, nargs, sizeof(size_t));
+    free_array(supports, nargs, sizeof(index_set *));
+    return rval;
+}
+
 /* Perform reduction. */
 static bool do_reduce(int argc, char *argv[], ref_t unit_ref, combine_fun_t cfun) {
     char buf[24];
@@ -683,8 +925,11 @@ static bool do_reduce(int argc, char *argv[], ref_t unit_ref, combine_fun_t cfun
 	report(0, "Need destination name");
 	return false;
     }
-    rval = tree_reduction ? tree_reduce(argv, unit_ref, cfun, 2, argc-1) : 
-	linear_reduce(argv, unit_ref, cfun, 2, argc-1);
+    if (tree_reduction == REDUCE_ADAPTIVE)
+	rval = adaptive_reduce(argv, unit_ref, cfun, 2, argc-1);
+    else
+	rval = tree_reduction ? tree_reduce(argv, unit_ref, cfun, 2, argc-1) :
+	    linear_reduce(argv, unit_ref, cfun, 2, argc-1);
     if (REF_IS_INVALID(rval))
 	return false;
     assign_ref(argv[1], rval, false, false);
@@ -1003,7 +1248,99 @@ bool do_aconvert(int argc, char *argv[]) {
     }
 }
 
+static keyvalue_table_ptr variable_index_table();
+
+/*
+  Count functions in a single pass with shared memoization.
+  When proj is non-NULL, it is a comma-separated list of variable names
+  onto which the functions are projected.
+*/
+static bool count_shared(int argc, char *argv[], bool fast, char *proj) {
+    int nroots = argc;
+    int nproj = 0;
+    int maxproj = 0;
+    int *pindices = NULL;
+    int i;
+    if (proj) {
+	keyvalue_table_ptr vtable = variable_index_table();
+	char *names = strsave_or_fail(proj, "count_shared");
+	maxproj = 1;
+	char *c;
+	for (c = names; *c; c++)
+	    if (*c == ',')
+		maxproj++;
+	pindices = calloc_or_fail(maxproj, sizeof(int), "count_shared");
+	bool ok = true;
+	char *name;
+	for (name = strtok(names, ","); ok && name; name = strtok(NULL, ",")) {
+	    word_t wv;
+	    if (keyvalue_find(vtable, (word_t) name, &wv))
+		pindices[nproj++] = (int) wv;
+	    else {
+		report(0, "'%s' is not a variable", name);
+		ok = false;
+	    }
+	}
+	free_string(names);
+	keyvalue_free(vtable);
+	if (!ok) {
+	    free_array(pindices, maxproj, sizeof(int));
+	    return false;
+	}
+    }
+    ref_t *roots = calloc_or_fail(nroots, sizeof(ref_t), "count_shared");
+    double *fcounts = calloc_or_fail(nroots, sizeof(double), "count_shared");
+    char **exact = fast ? NULL : calloc_or_fail(nroots, sizeof(char *), "count_shared");
+    bool ok = true;
+    for (i = 0; ok && i < nroots; i++) {
+	roots[i] = get_ref(argv[i]);
+	if (REF_IS_INVALID(roots[i]))
+	    ok = false;
+    }
+    ok = ok && shadow_count_roots(smgr, nroots, roots, nproj, pindices, fcounts, exact);
+#if RPT >= 1
+    for (i = 0; ok && i < nroots; i++) {
+	if (exact)
+	    report(1, "%s:	%s", argv[i], exact[i]);
+	else
+	    report(1, "%s:	%.0f", argv[i], fcounts[i]);
+    }
+#endif
+    if (exact && ok) {
+	for (i = 0; i < nroots; i++)
+	    free_string(exact[i]);
+    }
+    if (exact)
+	free_array(exact, nroots, sizeof(char *));
+    free_array(fcounts, nroots, sizeof(double));
+    free_array(roots, nroots, sizeof(ref_t));
+    if (pindices)
+	free_array(pindices, maxproj, sizeof(int));
+    return ok;
+}
+
 bool do_count(int argc, char *argv[]) {
+    bool fast = false;
+    char *proj = NULL;
+    int first = 1;
+    while (first < argc && argv[first][0] == '-') {
+	if (strcmp(argv[first], "-f") == 0)
+	    fast = true;
+	else if (strcmp(argv[first], "-p") == 0 && first+1 < argc)
+	    proj = argv[++first];
+	else {
+	    report(0, "Unknown count option '%s'", argv[first]);
+	    return false;
+	}
+	first++;
+    }
+    /* Keep cross-checking counts when other engines are active */
+    if (smgr->do_cudd && (fast || proj || (all_vars && !do_local && !do_dist)))
+	return count_shared(argc-first, argv+first, fast, proj);
+    if (fast || proj) {
+	report(0, "Count options require CUDD");
+	return false;
+    }
     set_ptr roots = get_refs(argc-1, argv+1);
     int i;
     if (!roots)
@@ -1077,6 +1414,65 @@ bool do_equal(int argc, char *argv[]) {
     return true;
 }
 
+/*
+  Check a list of equalities in one command.  Only failures are reported.
+  With -c C, each argument is compared against C.  Otherwise arguments form pairs.
+  As with equal, failed checks do not make the command fail.  With -s, checking stops at the first failure,
+  and the command fails, counting toward the error limit
+*/
+bool do_assert(int argc, char *argv[]) {
+    bool stop = false;
+    char *cname = NULL;
+    int first = 1;
+    while (first < argc && argv[first][0] == '-') {
+	if (strcmp(argv[first], "-s") == 0)
+	    stop = true;
+	else if (strcmp(argv[first], "-c") == 0 && first+1 < argc)
+	    cname = argv[++first];
+	else {
+	    report(0, "Unknown assert option '%s'", argv[first]);
+	    return false;
+	}
+	first++;
+    }
+    int step = cname ? 1 : 2;
+    if (!cname && (argc - first) % 2 != 0) {
+	report(0, "assert requires pairs of arguments");
+	return false;
+    }
+    ref_t rc = REF_INVALID;
+    if (cname) {
+	rc = get_ref(cname);
+	if (do_ref(smgr) && REF_IS_INVALID(rc))
+	    return false;
+    }
+    int checked = 0;
+    int failed = 0;
+    int i;
+    for (i = first; i + step <= argc; i += step) {
+	char *bname = cname ? cname : argv[i+1];
+	ref_t ra = get_ref(argv[i]);
+	ref_t rb = cname ? rc : get_ref(bname);
+	checked++;
+	bool eq = ra == rb;
+	if (do_ref(smgr) && (REF_IS_INVALID(ra) || REF_IS_INVALID(rb)))
+	    eq = false;
+	if (!eq) {
+	    failed++;
+	    char bufa[24], bufb[24];
+	    shadow_show(smgr, ra, bufa);
+	    shadow_show(smgr, rb, bufb);
+	    report(0, "TEST FAILED %s (%s) != %s (%s)", argv[i], bufa, bname, bufb);
+	    if (stop)
+		break;
+	}
+    }
+#if RPT >= 1
+    report(1, "Assertions: %d checked, %d failed", checked, failed);
+#endif
+    return !stop || failed == 0;
+}
+
 bool do_local_flush(int argc, char *argv[]) {
 #if RPT >= 1
     report(1, "Flushing state");
@@ -1210,7 +1606,99 @@ bool do_uquant(int argc, char *argv[]) {
 }
 
 
+/* Bounded, resumable, or sampled satisfy.  Options:
+   -n N: Generate at most N cubes
+   -c C: Resume enumeration at cursor C
+   -s K: Generate K random solutions, uniformly distributed
+   -r R: Seed random number generator with R
+   -p:   Packed (hexadecimal) output
+   -o F: Write solutions to file F, rather than to stdout
+*/
+static bool satisfy_bounded(int argc, char *argv[]) {
+    satisfy_options opts;
+    opts.limit = 0;
+    opts.cursor = 0;
+    opts.samples = 0;
+    opts.packed = false;
+    opts.outfile = stdout;
+    char *fname = NULL;
+    int i = 1;
+    while (i < argc && argv[i][0] == '-' && strlen(argv[i]) == 2) {
+	char opt = argv[i][1];
+	if (opt == 'p') {
+	    opts.packed = true;
+	    i++;
+	    continue;
+	}
+	if (i+1 >= argc) {
+	    report(0, "Option -%c requires value", opt);
+	    return false;
+	}
+	char *val = argv[i+1];
+	switch (opt) {
+	case 'n':
+	    opts.limit = (size_t) atol(val);
+	    break;
+	case 'c':
+	    opts.cursor = (size_t) atol(val);
+	    break;
+	case 's':
+	    opts.samples = (size_t) atol(val);
+	    break;
+	case 'r':
+	    srandom((unsigned) atol(val));
+	    break;
+	case 'o':
+	    fname = val;
+	    break;
+	default:
+	    report(0, "Unknown satisfy option '-%c'", opt);
+	    return false;
+	}
+	i += 2;
+    }
+    if (fname) {
+	opts.outfile = fopen(fname, "w");
+	if (!opts.outfile) {
+	    report(0, "Couldn't open solution file '%s'", fname);
+	    return false;
+	}
+	fprintf(opts.outfile, "# vars %zd\n", smgr->nvars);
+    }
+    bool ok = true;
+    for (; i < argc; i++) {
+	ref_t r = get_ref(argv[i]);
+	if (REF_IS_INVALID(r)) {
+	    ok = false;
+	    continue;
+	}
+	if (fname)
+	    fprintf(opts.outfile, "# %s\n", argv[i]);
+	else
+	    report(1, "%s:", argv[i]);
+	size_t next_cursor = 0;
+	long count = shadow_satisfy_bounded(smgr, r, &opts, &next_cursor);
+	if (count < 0) {
+	    ok = false;
+	    continue;
+	}
+	if (opts.samples > 0)
+	    report(1, "%s: Generated %ld random solutions", argv[i], count);
+	else if (next_cursor > 0)
+	    report(1, "%s: Generated %ld cubes.  More remain.  Resume with cursor %zd", argv[i], count, next_cursor);
+	else
+	    report(1, "%s: Generated %ld cubes.  No more remain", argv[i], count);
+    }
+    if (fname)
+	fclose(opts.outfile);
+    else
+	fflush(stdout);
+    return ok;
+}
+
 bool do_satisfy(int argc, char *argv[]) {
+    if (argc > 1 && argv[1][0] == '-')
+	return satisfy_bounded(argc, argv);
     size_t i;
     for (i = 1; i < argc; i++) {
 	ref_t r;
@@ -1226,6 +1714,140 @@ bool do_satisfy(int argc, char *argv[]) {
     return true;
 }
 
+/* Vector arguments */
+#define VEC_SCALAR 0  // Same name for every element
+#define VEC_PREFIX 1  // Names formed by appending element number
+#define VEC_LIST   2  // Explicit list of names
+
+/*
+  Apply command element-wise to vectors:
+    vector [-n N] cmd arg1 arg2 ...
+  Each argument is one of:
+    root*      Names root0, root1, ..., root(N-1) (e.g., x.* gives x.0, x.1, ...)
+    [a,b,...]  Explicit list.  Elements separated by commas and/or spaces
+    name       Same name for every element
+  N is given by -n, or else by the length of the explicit lists
+*/
+bool do_vector(int argc, char *argv[]) {
+    int n = -1;
+    int idx = 1;
+    if (argc > 2 && strcmp(argv[1], "-n") == 0) {
+	n = atoi(argv[2]);
+	idx = 3;
+    }
+    if (idx >= argc) {
+	report(0, "vector requires command");
+	return false;
+    }
+    char *cmd = argv[idx++];
+    cmd_function fun = find_cmd(cmd);
+    if (!fun) {
+	report(0, "Unknown command '%s'", cmd);
+	return false;
+    }
+    /* Parse arguments */
+    int maxargs = argc - idx;
+    int *kind = calloc_or_fail(maxargs+1, sizeof(int), "do_vector");
+    char **text = calloc_or_fail(maxargs+1, sizeof(char *), "do_vector");
+    char ***elements = calloc_or_fail(maxargs+1, sizeof(char **), "do_vector");
+    int *counts = calloc_or_fail(maxargs+1, sizeof(int), "do_vector");
+    int nargs = 0;
+    bool ok = true;
+    while (ok && idx < argc) {
+	char *arg = argv[idx++];
+	size_t len = strlen(arg);
+	if (arg[0] == '[') {
+	    /* Gather tokens up through closing bracket */
+	    char buf[MAX_CHAR * 4];
+	    buf[0] = '\0';
+	    strncat(buf, arg+1, sizeof(buf)-1);
+	    while (buf[0] == '\0' || buf[strlen(buf)-1] != ']') {
+		if (idx >= argc || strlen(buf) + strlen(argv[idx]) + 2 >= sizeof(buf)) {
+		    report(0, "Invalid vector list");
+		    ok = false;
+		    break;
+		}
+		strcat(buf, ",");
+		strcat(buf, argv[idx++]);
+	    }
+	    if (!ok)
+		break;
+	    buf[strlen(buf)-1] = '\0';
+	    int cnt = 0;
+	    char *c;
+	    for (c = buf; *c; c++) {
+		if (*c == ',')
+		    cnt++;
+	    }
+	    /* List is NULL-terminated.  Record its capacity */
+	    char **elist = calloc_or_fail(cnt+2, sizeof(char *), "do_vector");
+	    counts[nargs] = cnt+2;
+	    cnt = 0;
+	    char *tok;
+	    for (tok = strtok(buf, ","); tok; tok = strtok(NULL, ","))
+		elist[cnt++] = strsave_or_fail(tok, "do_vector");
+	    kind[nargs] = VEC_LIST;
+	    elements[nargs] = elist;
+	    if (n < 0)
+		n = cnt;
+	    else if (n != cnt) {
+		report(0, "Vector lengths differ (%d vs. %d)", n, cnt);
+		ok = false;
+	    }
+	} else if (len > 1 && arg[len-1] == '*') {
+	    kind[nargs] = VEC_PREFIX;
+	    text[nargs] = strsave_or_fail(arg, "do_vector");
+	    text[nargs][len-1] = '\0';
+	} else {
+	    kind[nargs] = VEC_SCALAR;
+	    text[nargs] = arg;
+	}
+	nargs++;
+    }
+    if (ok && n < 0) {
+	report(0, "vector requires -n N unless arguments include explicit lists");
+	ok = false;
+    }
+    /* Perform operations */
+    char **eargv = calloc_or_fail(nargs+1, sizeof(char *), "do_vector");
+    char **names = calloc_or_fail(nargs+1, sizeof(char *), "do_vector");
+    int a, i;
+    for (a = 0; a < nargs; a++)
+	names[a] = calloc_or_fail(MAX_CHAR, sizeof(char), "do_vector");
+    eargv[0] = cmd;
+    for (i = 0; ok && i < n; i++) {
+	for (a = 0; a < nargs; a++) {
+	    if (kind[a] == VEC_LIST)
+		eargv[a+1] = elements[a][i];
+	    else if (kind[a] == VEC_PREFIX) {
+		snprintf(names[a], MAX_CHAR, "%s%d", text[a], i);
+		eargv[a+1] = names[a];
+	    } else
+		eargv[a+1] = text[a];
+	}
+	ok = fun(nargs+1, eargv);
+	if (!ok)
+	    report(0, "vector %s failed on element %d", cmd, i);
+    }
+    /* Clean up */
+    for (a = 0; a < nargs; a++) {
+	free_array(names[a], MAX_CHAR, sizeof(char));
+	if (kind[a] == VEC_LIST) {
+	    for (i = 0; elements[a][i]; i++)
+		free_string(elements[a][i]);
+	    free_array(elements[a], counts[a], sizeof(char *));
+	} else if (kind[a] == VEC_PREFIX)
+	    free_string(text[a]);
+    }
+    free_array(eargv, nargs+1, sizeof(char *));
+    free_array(names, nargs+1, sizeof(char *));
+    free_array(kind, maxargs+1, sizeof(int));
+    free_array(text, maxargs+1, sizeof(char *));
+    free_array(elements, maxargs+1, sizeof(char **));
+    free_array(counts, maxargs+1, sizeof(int));
+    return ok;
+}
+
 bool do_shift(int argc, char *argv[]) {
     char buf[24];
     if (argc <= 3 || (argc-3) % 2 != 0) {
@@ -1369,8 +1991,119 @@ bool do_nothing(int argc, char *argv[]) {
     return true;
 }
 
+/*** Memory governor ***/
+
+/*
+  With a megabytes limit and the governor enabled, CUDD's limits are sized
+  to fit the budget.  After each command, and at each step of a conjunction,
+  memory use (estimated from live nodes, since CUDD keeps freed memory)
+  is compared with the budget.  Each time use rises above the high mark, garbage is
+  collected and conjunct terms are spilled to files more readily, down to a floor.
+  Use must fall back below the high mark before thresholds are tightened again.
+  When use drops below the low mark, the spill and GC thresholds relax back
+  to their original values.
+*/
+#define GOVERN_HIGH 0.80
+#define GOVERN_LOW 0.50
+/* Thresholds are never tightened below this fraction of their original values */
+#define GOVERN_FLOOR 0.125
+
+/* Original values of conjunct thresholds */
+static size_t base_store_threshold = 0;
+static size_t base_gc_limit = 0;
+/* Have thresholds been tightened since use last rose above high mark? */
+static bool govern_tight = false;
+static size_t govern_collections = 0;
+
+static size_t memory_budget() {
+    return mblimit > 0 ? (size_t) mblimit << 20 : 0;
+}
+
+static size_t memory_used() {
+    return shadow_live_bytes(smgr) + current_bytes;
+}
+
+/* Halve threshold, but not below floor fraction of base value */
+static size_t govern_tighten(size_t val, size_t base) {
+    size_t minval = (size_t) (GOVERN_FLOOR * base);
+    if (minval < 1)
+	minval = 1;
+    val /= 2;
+    return val < minval ? minval : val;
+}
+
+static void set_governor(int oldval) {
+    if (memory_governor && !oldval) {
+	if (mblimit <= 0) {
+	    err(false, "Memory governor requires megabytes limit");
+	    memory_governor = 0;
+	    return;
+	}
+	base_store_threshold = memory_store_threshold;
+	base_gc_limit = stored_gc_limit;
+	govern_tight = false;
+	shadow_set_memory_budget(smgr, memory_budget());
+    } else if (!memory_governor && oldval) {
+	/* CUDD limits remain in effect */
+	memory_store_threshold = base_store_threshold;
+	stored_gc_limit = base_gc_limit;
+    }
+}
+
+void memory_govern() {
+    if (!memory_governor || mblimit <= 0)
+	return;
+    size_t budget = memory_budget();
+    size_t used = memory_used();
+    double load = (double) used / budget;
+    if (load > GOVERN_HIGH) {
+	if (govern_tight)
+	    return;
+	govern_tight = true;
+	int collected = cudd_collect(smgr);
+	govern_collections++;
+	report(2, "Memory use at %.1f%% of budget.  Collected %d nodes", 100.0 * load, collected);
+	memory_store_threshold = govern_tighten(memory_store_threshold, base_store_threshold);
+	stored_gc_limit = govern_tighten(stored_gc_limit, base_gc_limit);
+	report(3, "Store threshold %zd nodes.  Stored GC limit %zd nodes", memory_store_threshold, stored_gc_limit);
+	return;
+    }
+    govern_tight = false;
+    if (load < GOVERN_LOW) {
+	if (memory_store_threshold < base_store_threshold) {
+	    memory_store_threshold *= 2;
+	    if (memory_store_threshold > base_store_threshold)
+		memory_store_threshold = base_store_threshold;
+	}
+	if (stored_gc_limit < base_gc_limit) {
+	    stored_gc_limit *= 2;
+	    if (stored_gc_limit > base_gc_limit)
+		stored_gc_limit = base_gc_limit;
+	}
+    }
+}
+
+static void memory_report(int level) {
+    size_t cudd_bytes = shadow_memory_in_use(smgr);
+    size_t budget = memory_budget();
+    if (budget == 0) {
+	report(level, "Memory: CUDD %.2f MB.  Other %.2f MB.  No budget",
+	       (double) cudd_bytes / 1e6, (double) current_bytes / 1e6);
+	return;
+    }
+    double headroom = (double) budget - (double) (cudd_bytes + current_bytes);
+    report(level, "Memory: CUDD %.2f MB.  Other %.2f MB.  Budget %.2f MB.  Headroom %.2f MB (%.1f%%)",
+	   (double) cudd_bytes / 1e6, (double) current_bytes / 1e6, (double) budget / 1e6,
+	   headroom / 1e6, 100.0 * headroom / budget);
+    if (memory_governor)
+	report(level, "Governor: Live nodes %.2f MB.  Store threshold %zd nodes.  Stored GC limit %zd nodes.  %zd forced collections",
+	       (double) shadow_live_bytes(smgr) / 1e6,
+	       memory_store_threshold, stored_gc_limit, govern_collections);
+}
+
 bool do_status(int argc, char *argv[]) {
     shadow_status(smgr);
+    memory_report(0);
     return true;
 }
 
@@ -1379,13 +2112,11 @@ bool do_load(int argc, char *argv[]) {
 	report(0, "load requires two arguments");
 	return false;
     }
-    FILE *infile = fopen(argv[2], "r");
-    if (infile == NULL) {
+    if (access(argv[2], R_OK) != 0) {
 	report(0, "Couldn't open DD file '%s'", argv[2]);
 	return false;
     }
-    ref_t r = shadow_load(smgr, infile);
-    fclose(infile);
+    ref_t r = shadow_load_file(smgr, argv[2]);
     if (REF_IS_INVALID(r)) {
 	report(0, "Load failed");
 	return false;
@@ -1401,6 +2132,422 @@ bool do_load(int argc, char *argv[]) {
     return true;
 }
 
+/*** Variable ordering ***/
+
+static void set_reorder_limits(int oldval) {
+    shadow_reorder_limits(smgr, reorder_threshold > 0 ? (size_t) reorder_threshold : 0,
+			  0.01 * reorder_growth_scaled, reorder_sift_vars);
+}
+
+/* Get method from command argument.  Returns -1 if invalid */
+static int get_reorder_method(char *name) {
+    int method = shadow_reorder_method(name);
+    if (method < 0) {
+	report_noreturn(0, "Unknown reordering method '%s'.  Methods:", name);
+	int m;
+	for (m = 0; shadow_reorder_method_name(m); m++)
+	    report_noreturn(0, " %s", shadow_reorder_method_name(m));
+	report(0, "");
+    }
+    return method;
+}
+
+bool do_reorder(int argc, char *argv[]) {
+    int method = argc > 1 ? get_reorder_method(argv[1]) : shadow_reorder_method("sift");
+    if (method < 0)
+	return false;
+    set_reorder_limits(0);
+    return shadow_reorder(smgr, method);
+}
+
+bool do_autoreorder(int argc, char *argv[]) {
+    if (argc != 2) {
+	report(0, "autoreorder requires method");
+	return false;
+    }
+    int method = get_reorder_method(argv[1]);
+    if (method < 0)
+	return false;
+    set_reorder_limits(0);
+    if (!shadow_autoreorder(smgr, method))
+	return false;
+    if (autoreorder_name)
+	free_string(autoreorder_name);
+    autoreorder_name = strsave_or_fail(argv[1], "do_autoreorder");
+    return true;
+}
+
+/* Build table mapping variable names to indices */
+static keyvalue_table_ptr variable_index_table() {
+    keyvalue_table_ptr vtable = keyvalue_new(string_hash, string_equal);
+    size_t idx;
+    for (idx = 0; idx < smgr->nvars; idx++) {
+	ref_t r = shadow_get_variable(smgr, idx);
+	word_t ws;
+	if (keyvalue_find(inverse_varnametable, (word_t) r, &ws))
+	    keyvalue_insert(vtable, ws, (word_t) idx);
+	shadow_deref(smgr, r);
+    }
+    return vtable;
+}
+
+bool do_group(int argc, char *argv[]) {
+    int first = 1;
+    bool fixed = argc > 1 && strcmp(argv[1], "-f") == 0;
+    if (fixed)
+	first++;
+    int count = argc - first;
+    if (count < 2) {
+	report(0, "group requires at least two variables");
+	return false;
+    }
+    keyvalue_table_ptr vtable = variable_index_table();
+    int low_level = -1;
+    int high_level = -1;
+    int i;
+    bool ok = true;
+    for (i = first; ok && i < argc; i++) {
+	word_t wv;
+	if (!keyvalue_find(vtable, (word_t) argv[i], &wv)) {
+	    report(0, "'%s' is not a variable", argv[i]);
+	    ok = false;
+	    break;
+	}
+	int level = shadow_index_level(smgr, (int) wv);
+	if (low_level < 0 || level < low_level)
+	    low_level = level;
+	if (level > high_level)
+	    high_level = level;
+    }
+    keyvalue_free(vtable);
+    if (!ok)
+	return false;
+    if (high_level - low_level + 1 != count) {
+	report(0, "Variables in group must be distinct and adjacent in the current order");
+	return false;
+    }
+    return shadow_group_variables(smgr, shadow_level_index(smgr, low_level), count, fixed);
+}
+
+/* Order file has one variable name per line, from top of order to bottom */
+bool do_order_store(int argc, char *argv[]) {
+    if (argc != 2) {
+	report(0, "orderstore requires file name");
+	return false;
+    }
+    FILE *outfile = fopen(argv[1], "w");
+    if (outfile == NULL) {
+	report(0, "Couldn't open order file '%s'", argv[1]);
+	return false;
+    }
+    int level;
+    for (level = 0; level < smgr->nvars; level++) {
+	ref_t r = shadow_get_variable(smgr, shadow_level_index(smgr, level));
+	word_t ws;
+	if (keyvalue_find(inverse_varnametable, (word_t) r, &ws))
+	    fprintf(outfile, "%s\n", (char *) ws);
+	else
+	    fprintf(outfile, "#%d\n", shadow_level_index(smgr, level));
+	shadow_deref(smgr, r);
+    }
+    fclose(outfile);
+    return true;
+}
+
+/* Variables not listed in file follow those that are, in their current relative order */
+bool do_order_load(int argc, char *argv[]) {
+    if (argc != 2) {
+	report(0, "orderload requires file name");
+	return false;
+    }
+    FILE *infile = fopen(argv[1], "r");
+    if (infile == NULL) {
+	report(0, "Couldn't open order file '%s'", argv[1]);
+	return false;
+    }
+    size_t nvars = smgr->nvars;
+    int *order = calloc_or_fail(nvars, sizeof(int), "do_order_load");
+    bool *placed = calloc_or_fail(nvars, sizeof(bool), "do_order_load");
+    keyvalue_table_ptr vtable = variable_index_table();
+    size_t count = 0;
+    size_t unknown = 0;
+    char buf[MAX_CHAR];
+    while (fgets(buf, MAX_CHAR, infile)) {
+	char name[MAX_CHAR];
+	if (sscanf(buf, "%s", name) != 1)
+	    continue;
+	word_t wv;
+	int idx = -1;
+	if (name[0] == '#')
+	    idx = atoi(name+1);
+	else if (keyvalue_find(vtable, (word_t) name, &wv))
+	    idx = (int) wv;
+	if (idx < 0 || idx >= nvars || placed[idx]) {
+	    unknown++;
+	    continue;
+	}
+	order[count++] = idx;
+	placed[idx] = true;
+    }
+    fclose(infile);
+    keyvalue_free(vtable);
+    if (unknown > 0)
+	report(1, "Ignored %zd unknown or repeated names in order file '%s'", unknown, argv[1]);
+    int level;
+    for (level = 0; level < nvars; level++) {
+	int idx = shadow_level_index(smgr, level);
+	if (!placed[idx])
+	    order[count++] = idx;
+    }
+    bool ok = shadow_set_order(smgr, order);
+    free_array(order, nvars, sizeof(int));
+    free_array(placed, nvars, sizeof(bool));
+    return ok;
+}
+
+/*** Checkpointing ***/
+
+/*
+  A checkpoint directory holds all named functions in a single shared-node file,
+  the variable order, and a manifest giving the number of commands
+  of the primary command input that had completed, the variable names,
+  and the settings of all options.  The manifest is written last and
+  renamed into place, so that an interrupted checkpoint leaves the
+  previous one intact.
+  The dynamic reordering method is also saved.  Variable groups,
+  traces, and conjunction schedules are not kept, and so
+  must be set up again after resuming.
+  When chaining is enabled, the variable order cannot change, and so
+  it is not restored.
+*/
+#define CHECKPOINT_MANIFEST "manifest"
+
+static void checkpoint_file(char *dest, char *dir, char *base, int seq) {
+    snprintf(dest, MAX_CHAR, "%s/%s-%d", dir, base, seq);
+}
+
+static bool write_checkpoint(char *dir) {
+    char fpath[MAX_CHAR], opath[MAX_CHAR], mpath[MAX_CHAR], tpath[MAX_CHAR];
+    if (mkdir(dir, 0777) != 0 && errno != EEXIST) {
+	report(0, "Couldn't create checkpoint directory '%s'", dir);
+	return false;
+    }
+    size_t offset = cmd_offset();
+    int seq = checkpoint_seq;
+    checkpoint_file(fpath, dir, "functions", seq);
+    checkpoint_file(opath, dir, "order", seq);
+    snprintf(mpath, MAX_CHAR, "%s/%s", dir, CHECKPOINT_MANIFEST);
+    snprintf(tpath, MAX_CHAR, "%s/%s.tmp", dir, CHECKPOINT_MANIFEST);
+
+    /* Collect named functions, other than variables, constants, and negations */
+    size_t alloc = nametable->nelements;
+    ref_t *roots = calloc_or_fail(alloc, sizeof(ref_t), "write_checkpoint");
+    char **names = calloc_or_fail(alloc, sizeof(char *), "write_checkpoint");
+    int nroots = 0;
+    word_t wk, wv, ws;
+    keyvalue_iterstart(nametable);
+    while (keyvalue_iternext(nametable, &wk, &wv)) {
+	char *name = (char *) wk;
+	if (name[0] == '!' || strcmp(name, "zero") == 0 || strcmp(name, "one") == 0)
+	    continue;
+	if (keyvalue_find(inverse_varnametable, wv, &ws) && strcmp((char *) ws, name) == 0)
+	    continue;
+	roots[nroots] = (ref_t) wv;
+	names[nroots] = name;
+	nroots++;
+    }
+    FILE *outfile = fopen(fpath, "w");
+    bool ok = outfile != NULL && shadow_store_roots(smgr, nroots, roots, names, outfile);
+    if (outfile)
+	fclose(outfile);
+    free_array(roots, alloc, sizeof(ref_t));
+    free_array(names, alloc, sizeof(char *));
+
+    if (ok) {
+	char *oargv[2] = {"orderstore", opath};
+	ok = do_order_store(2, oargv);
+    }
+
+    if (ok) {
+	outfile = fopen(tpath, "w");
+	ok = outfile != NULL;
+    }
+    if (ok) {
+	fprintf(outfile, "# runbdd checkpoint\n");
+	fprintf(outfile, "offset %zd\n", offset);
+	fprintf(outfile, "seq %d\n", seq);
+	fprintf(outfile, "chaining %d\n", (int) chaining_type);
+	fprintf(outfile, "nvars %zd\n", (size_t) smgr->nvars);
+	size_t idx;
+	for (idx = 0; idx < smgr->nvars; idx++) {
+	    ref_t r = shadow_get_variable(smgr, idx);
+	    if (keyvalue_find(inverse_varnametable, (word_t) r, &ws))
+		fprintf(outfile, "var %zd %s\n", idx, (char *) ws);
+	    shadow_deref(smgr, r);
+	}
+	if (checkpoint_dir && checkpoint_interval > 0)
+	    fprintf(outfile, "auto %d %s\n", checkpoint_interval, checkpoint_dir);
+	fprintf(outfile, "functions functions-%d\n", seq);
+	fprintf(outfile, "order order-%d\n", seq);
+	if (autoreorder_name)
+	    fprintf(outfile, "autoreorder %s\n", autoreorder_name);
+	write_options(outfile);
+	ok = fclose(outfile) == 0 && rename(tpath, mpath) == 0;
+    }
+    if (!ok) {
+	report(0, "Checkpoint to '%s' failed", dir);
+	unlink(fpath);
+	unlink(opath);
+	unlink(tpath);
+	return false;
+    }
+    /* Remove files from previous checkpoint */
+    if (seq > 0) {
+	checkpoint_file(fpath, dir, "functions", seq-1);
+	checkpoint_file(opath, dir, "order", seq-1);
+	unlink(fpath);
+	unlink(opath);
+    }
+    checkpoint_seq++;
+    checkpoint_last = elapsed_time();
+    report(1, "Checkpoint of %d functions written to '%s' after %zd commands", nroots, dir, offset);
+    return true;
+}
+
+/* Called after each command to govern memory and perform periodic checkpoints */
+static void after_command() {
+    memory_govern();
+    if (checkpoint_dir && checkpoint_interval > 0 &&
+	elapsed_time() - checkpoint_last >= checkpoint_interval)
+	write_checkpoint(checkpoint_dir);
+}
+
+bool do_checkpoint(int argc, char *argv[]) {
+    if (argc == 4 && strcmp(argv[1], "-a") == 0) {
+	int interval;
+	if (!get_int(argv[2], &interval) || interval < 0) {
+	    report(0, "Invalid checkpoint interval '%s'", argv[2]);
+	    return false;
+	}
+	if (checkpoint_dir)
+	    free_string(checkpoint_dir);
+	checkpoint_dir = strsave_or_fail(argv[3], "do_checkpoint");
+	checkpoint_interval = interval;
+	checkpoint_last = elapsed_time();
+	return true;
+    }
+    if (argc != 2) {
+	report(0, "checkpoint requires directory name");
+	return false;
+    }
+    return write_checkpoint(argv[1]);
+}
+
+/* Restore state from checkpoint and arrange to skip completed commands */
+static bool resume_checkpoint(char *dir) {
+    char path[MAX_CHAR];
+    snprintf(path, MAX_CHAR, "%s/%s", dir, CHECKPOINT_MANIFEST);
+    FILE *infile = fopen(path, "r");
+    if (infile == NULL) {
+	report(0, "Couldn't open checkpoint manifest '%s'", path);
+	return false;
+    }
+    char buf[MAX_CHAR];
+    char fname[MAX_CHAR] = "";
+    char oname[MAX_CHAR] = "";
+    char rname[MAX_CHAR] = "";
+    size_t offset = 0;
+    size_t nvars = 0;
+    char **vnames = NULL;
+    bool ok = true;
+    while (fgets(buf, MAX_CHAR, infile)) {
+	char key[MAX_CHAR], arg1[MAX_CHAR], arg2[MAX_CHAR];
+	int n = sscanf(buf, "%s %s %s", key, arg1, arg2);
+	if (n < 2 || key[0] == '#')
+	    continue;
+	if (strcmp(key, "offset") == 0)
+	    offset = strtoul(arg1, NULL, 10);
+	else if (strcmp(key, "seq") == 0)
+	    checkpoint_seq = atoi(arg1) + 1;
+	else if (strcmp(key, "chaining") == 0) {
+	    if (atoi(arg1) != (int) chaining_type)
+		err(false, "Checkpoint was made with different chaining type");
+	} else if (strcmp(key, "nvars") == 0 && vnames == NULL) {
+	    nvars = strtoul(arg1, NULL, 10);
+	    vnames = calloc_or_fail(nvars, sizeof(char *), "resume_checkpoint");
+	} else if (strcmp(key, "var") == 0 && n == 3) {
+	    size_t idx = strtoul(arg1, NULL, 10);
+	    if (vnames && idx < nvars && !vnames[idx])
+		vnames[idx] = strsave_or_fail(arg2, "resume_checkpoint");
+	} else if (strcmp(key, "option") == 0 && n == 3) {
+	    /* Time limit comes from current run */
+	    if (strcmp(arg1, "seconds") != 0) {
+		char cmdline[MAX_CHAR];
+		snprintf(cmdline, MAX_CHAR, "option %s %s", arg1, arg2);
+		interpret_cmd(cmdline);
+	    }
+	} else if (strcmp(key, "auto") == 0 && n == 3) {
+	    checkpoint_interval = atoi(arg1);
+	    checkpoint_dir = strsave_or_fail(arg2, "resume_checkpoint");
+	} else if (strcmp(key, "functions") == 0)
+	    snprintf(fname, MAX_CHAR, "%s/%s", dir, arg1);
+	else if (strcmp(key, "order") == 0)
+	    snprintf(oname, MAX_CHAR, "%s/%s", dir, arg1);
+	else if (strcmp(key, "autoreorder") == 0)
+	    snprintf(rname, MAX_CHAR, "%s", arg1);
+    }
+    fclose(infile);
+    /* Recreate variables */
+    size_t idx;
+    for (idx = smgr->nvars; idx < nvars; idx++) {
+	ref_t rv = shadow_new_variable(smgr);
+	if (REF_IS_INVALID(rv)) {
+	    ok = false;
+	    break;
+	}
+	if (vnames[idx])
+	    assign_ref(vnames[idx], rv, true, true);
+	else
+	    shadow_deref(smgr, rv);
+    }
+    for (idx = 0; idx < nvars; idx++)
+	if (vnames[idx])
+	    free_string(vnames[idx]);
+    if (vnames)
+	free_array(vnames, nvars, sizeof(char *));
+    /* Order can only have changed when chaining is disabled */
+    if (ok && strlen(oname) > 0 && chaining_type == CHAIN_NONE) {
+	char *oargv[2] = {"orderload", oname};
+	ok = do_order_load(2, oargv);
+    }
+    if (ok && strlen(rname) > 0) {
+	char *rargv[2] = {"autoreorder", rname};
+	ok = do_autoreorder(2, rargv);
+    }
+    int nroots = 0;
+    if (ok && strlen(fname) > 0) {
+	ref_t *roots;
+	char **names;
+	nroots = shadow_load_roots(smgr, fname, &roots, &names);
+	ok = nroots >= 0;
+	int i;
+	for (i = 0; i < nroots; i++) {
+	    assign_ref(names[i], roots[i], true, false);
+	    free_string(names[i]);
+	}
+	if (nroots >= 0) {
+	    free_array(roots, nroots, sizeof(ref_t));
+	    free_array(names, nroots, sizeof(char *));
+	}
+    }
+    if (!ok)
+	return false;
+    set_cmd_skip(offset);
+    checkpoint_last = elapsed_time();
+    report(1, "Resumed from checkpoint '%s' with %d functions.  Skipping %zd commands", dir, nroots, offset);
+    return true;
+}
+
 bool do_store(int argc, char *argv[]) {
     bool ok = true;
     if (argc != 3) {
@@ -1424,3 +2571,351 @@ bool do_store(int argc, char *argv[]) {
     return ok;
 }
 
+bool do_store_roots(int argc, char *argv[]) {
+    if (argc < 3) {
+	report(0, "mstore requires file and at least one function");
+	return false;
+    }
+    int nroots = argc - 2;
+    ref_t *roots = calloc_or_fail(nroots, sizeof(ref_t), "do_store_roots");
+    bool ok = true;
+    int i;
+    for (i = 0; ok && i < nroots; i++) {
+	roots[i] = get_ref(argv[i+2]);
+	ok = !REF_IS_INVALID(roots[i]);
+    }
+    FILE *outfile = NULL;
+    if (ok) {
+	outfile = fopen(argv[1], "w");
+	if (outfile == NULL) {
+	    report(0, "Couldn't open DD file '%s'", argv[1]);
+	    ok = false;
+	}
+    }
+    if (ok && !shadow_store_roots(smgr, nroots, roots, argv+2, outfile)) {
+	report(0, "Store failed");
+	ok = false;
+    }
+    if (outfile)
+	fclose(outfile);
+    free_array(roots, nroots, sizeof(ref_t));
+    return ok;
+}
+
+bool do_load_roots(int argc, char *argv[]) {
+    if (argc < 2) {
+	report(0, "mload requires file name");
+	return false;
+    }
+    if (access(argv[1], R_OK) != 0) {
+	report(0, "Couldn't open DD file '%s'", argv[1]);
+	return false;
+    }
+    ref_t *roots;
+    char **names;
+    int nroots = shadow_load_roots(smgr, argv[1], &roots, &names);
+    if (nroots < 0) {
+	report(0, "Load failed");
+	return false;
+    }
+    bool ok = true;
+    int i, j;
+    /* Make sure all requested functions are present */
+    for (j = 2; j < argc; j++) {
+	for (i = 0; i < nroots; i++)
+	    if (strcmp(names[i], argv[j]) == 0)
+		break;
+	if (i == nroots) {
+	    report(0, "Function '%s' not found in file '%s'", argv[j], argv[1]);
+	    ok = false;
+	}
+    }
+    for (i = 0; i < nroots; i++) {
+	bool want = argc == 2;
+	for (j = 2; !want && j < argc; j++)
+	    want = strcmp(names[i], argv[j]) == 0;
+	if (ok && want) {
+	    assign_ref(names[i], roots[i], true, false);
+#if RPT >= 1
+	    char buf[24];
+	    shadow_show(smgr, roots[i], buf);
+	    report(2, "RESULT.  %s = %s", names[i], buf);
+#endif
+	} else
+	    shadow_deref(smgr, roots[i]);
+	free_string(names[i]);
+    }
+    free_array(roots, nroots, sizeof(ref_t));
+    free_array(names, nroots, sizeof(char *));
+    return ok;
+}
+
+/*** Command profiling ***/
+
+/* Accumulated costs for a group of commands */
+typedef struct {
+    char *name;
+    size_t count;
+    double wall_secs;
+    double cpu_secs;
+    long long node_delta;
+    size_t peak_growth;
+    size_t lookups;
+    size_t hits;
+    size_t gcs;
+    double reorder_secs;
+} profile_cost;
+
+/* Most expensive command lines */
+#define PROFILE_TOP 10
+typedef struct {
+    size_t line;
+    char *cmd;
+    double wall_secs;
+} profile_line;
+
+static bool profile_enabled = false;
+/* Is the current command being profiled? */
+static bool profile_active = false;
+/* Current tag.  NULL if none */
+static char *profile_tag = NULL;
+/* Optional file for per-command records */
+static FILE *profile_file = NULL;
+/* Mapping from command names and tags to their costs */
+static keyvalue_table_ptr profile_by_command = NULL;
+static keyvalue_table_ptr profile_by_tag = NULL;
+static profile_line profile_top[PROFILE_TOP];
+static int profile_top_count = 0;
+static profile_cost profile_total;
+
+/* Values at start of current command */
+static double profile_start_wall;
+static double profile_start_cpu;
+static shadow_stats profile_start_stats;
+
+static double cpu_time() {
+    return (double) clock() / CLOCKS_PER_SEC;
+}
+
+static void profile_add(profile_cost *acc, profile_cost *c) {
+    acc->count += c->count;
+    acc->wall_secs += c->wall_secs;
+    acc->cpu_secs += c->cpu_secs;
+    acc->node_delta += c->node_delta;
+    acc->peak_growth += c->peak_growth;
+    acc->lookups += c->lookups;
+    acc->hits += c->hits;
+    acc->gcs += c->gcs;
+    acc->reorder_secs += c->reorder_secs;
+}
+
+/* Add costs to entry for name, creating it if needed */
+static void profile_record(keyvalue_table_ptr table, char *name, profile_cost *c) {
+    word_t wv;
+    profile_cost *acc;
+    if (keyvalue_find(table, (word_t) name, &wv))
+	acc = (profile_cost *) wv;
+    else {
+	acc = calloc_or_fail(1, sizeof(profile_cost), "profile_record");
+	acc->name = strsave_or_fail(name, "profile_record");
+	keyvalue_insert(table, (word_t) acc->name, (word_t) acc);
+    }
+    profile_add(acc, c);
+}
+
+/* Keep list of most expensive lines, in descending order of wall time */
+static void profile_rank(char *cmd, double wall_secs) {
+    int pos = profile_top_count;
+    if (pos == PROFILE_TOP) {
+	if (profile_top[PROFILE_TOP-1].wall_secs >= wall_secs)
+	    return;
+	free_string(profile_top[PROFILE_TOP-1].cmd);
+	pos--;
+    } else
+	profile_top_count++;
+    while (pos > 0 && profile_top[pos-1].wall_secs < wall_secs) {
+	profile_top[pos] = profile_top[pos-1];
+	pos--;
+    }
+    profile_top[pos].line = cmd_line_number();
+    profile_top[pos].cmd = strsave_or_fail(cmd, "profile_rank");
+    profile_top[pos].wall_secs = wall_secs;
+}
+
+static void profile_command(int argc, char *argv[], bool done) {
+    if (!done) {
+	profile_active = profile_enabled;
+	if (!profile_active)
+	    return;
+	shadow_read_stats(smgr, &profile_start_stats);
+	profile_start_cpu = cpu_time();
+	profile_start_wall = elapsed_time();
+	return;
+    }
+    if (!profile_active)
+	return;
+    profile_active = false;
+    profile_cost c;
+    shadow_stats stats;
+    c.wall_secs = elapsed_time() - profile_start_wall;
+    c.cpu_secs = cpu_time() - profile_start_cpu;
+    shadow_read_stats(smgr, &stats);
+    c.name = argv[0];
+    c.count = 1;
+    c.node_delta = (long long) stats.nodes - (long long) profile_start_stats.nodes;
+    c.peak_growth = stats.peak_nodes - profile_start_stats.peak_nodes;
+    c.lookups = stats.lookups - profile_start_stats.lookups;
+    c.hits = stats.hits - profile_start_stats.hits;
+    c.gcs = stats.gcs - profile_start_stats.gcs;
+    c.reorder_secs = stats.reorder_secs - profile_start_stats.reorder_secs;
+    profile_record(profile_by_command, argv[0], &c);
+    profile_record(profile_by_tag, profile_tag ? profile_tag : "-", &c);
+    profile_add(&profile_total, &c);
+    profile_rank(argv[0], c.wall_secs);
+    if (profile_file)
+	fprintf(profile_file, "%zd,%s,%s,%.6f,%.6f,%lld,%zd,%zd,%zd,%zd,%.3f\n",
+		cmd_line_number(), argv[0], profile_tag ? profile_tag : "",
+		c.wall_secs, c.cpu_secs, c.node_delta, c.peak_growth,
+		c.lookups, c.hits, c.gcs, c.reorder_secs);
+}
+
+static void profile_clear_table(keyvalue_table_ptr table) {
+    word_t wk, wv;
+    while (keyvalue_removenext(table, &wk, &wv)) {
+	profile_cost *acc = (profile_cost *) wv;
+	free_string(acc->name);
+	free_block(acc, sizeof(profile_cost));
+    }
+}
+
+static void profile_reset() {
+    if (profile_by_command == NULL) {
+	profile_by_command = keyvalue_new(string_hash, string_equal);
+	profile_by_tag = keyvalue_new(string_hash, string_equal);
+    }
+    profile_clear_table(profile_by_command);
+    profile_clear_table(profile_by_tag);
+    int i;
+    for (i = 0; i < profile_top_count; i++)
+	free_string(profile_top[i].cmd);
+    profile_top_count = 0;
+    memset(&profile_total, 0, sizeof(profile_cost));
+}
+
+static void profile_close_file() {
+    if (profile_file) {
+	fclose(profile_file);
+	profile_file = NULL;
+    }
+}
+
+static void profile_free() {
+    profile_enabled = false;
+    profile_active = false;
+    if (profile_by_command) {
+	profile_reset();
+	keyvalue_free(profile_by_command);
+	keyvalue_free(profile_by_tag);
+	profile_by_command = NULL;
+	profile_by_tag = NULL;
+    }
+    if (profile_tag) {
+	free_string(profile_tag);
+	profile_tag = NULL;
+    }
+    profile_close_file();
+}
+
+static int profile_compare(const void *p1, const void *p2) {
+    double w1 = (*(profile_cost **) p1)->wall_secs;
+    double w2 = (*(profile_cost **) p2)->wall_secs;
+    return w1 < w2 ? 1 : w1 > w2 ? -1 : 0;
+}
+
+/* Print table of costs, in descending order of wall time */
+static void profile_show_table(FILE *outfile, char *title, keyvalue_table_ptr table) {
+    size_t n = table->nelements;
+    profile_cost **entries = calloc_or_fail(n+1, sizeof(profile_cost *), "profile_show_table");
+    word_t wk, wv;
+    size_t i = 0;
+    keyvalue_iterstart(table);
+    while (keyvalue_iternext(table, &wk, &wv))
+	entries[i++] = (profile_cost *) wv;
+    qsort(entries, n, sizeof(profile_cost *), profile_compare);
+    entries[n] = &profile_total;
+    fprintf(outfile, "%-16s %8s %10s %10s %6s %12s %12s %12s %6s %6s %8s\n",
+	    title, "Count", "Wall", "CPU", "%Wall", "Node delta", "Peak growth",
+	    "Lookups", "%Hit", "GCs", "Reorder");
+    for (i = 0; i <= n; i++) {
+	profile_cost *c = entries[i];
+	double wpct = profile_total.wall_secs > 0 ? 100.0 * c->wall_secs / profile_total.wall_secs : 0.0;
+	double hpct = c->lookups > 0 ? 100.0 * c->hits / c->lookups : 0.0;
+	fprintf(outfile, "%-16s %8zd %10.3f %10.3f %6.1f %12lld %12zd %12zd %6.1f %6zd %8.3f\n",
+		i < n ? c->name : "TOTAL", c->count, c->wall_secs, c->cpu_secs, wpct,
+		c->node_delta, c->peak_growth, c->lookups, hpct, c->gcs, c->reorder_secs);
+    }
+    fprintf(outfile, "\n");
+    free_array(entries, n+1, sizeof(profile_cost *));
+}
+
+static void profile_show(FILE *outfile) {
+    profile_show_table(outfile, "Command", profile_by_command);
+    profile_show_table(outfile, "Tag", profile_by_tag);
+    fprintf(outfile, "Most expensive command lines:\n");
+    int i;
+    for (i = 0; i < profile_top_count; i++)
+	fprintf(outfile, "  line %8zd  %-16s %10.3f\n",
+		profile_top[i].line, profile_top[i].cmd, profile_top[i].wall_secs);
+}
+
+bool do_profile(int argc, char *argv[]) {
+    if (argc < 2) {
+	report(0, "profile requires subcommand");
+	return false;
+    }
+    char *sub = argv[1];
+    if (profile_by_command == NULL)
+	profile_reset();
+    if (strcmp(sub, "on") == 0 && argc <= 3) {
+	if (argc == 3) {
+	    profile_close_file();
+	    profile_file = fopen(argv[2], "w");
+	    if (profile_file == NULL) {
+		report(0, "Couldn't open profile file '%s'", argv[2]);
+		return false;
+	    }
+	    fprintf(profile_file, "line,command,tag,wall,cpu,node_delta,peak_growth,lookups,hits,gcs,reorder\n");
+	}
+	profile_enabled = true;
+    } else if (strcmp(sub, "off") == 0 && argc == 2) {
+	profile_enabled = false;
+	profile_close_file();
+    } else if (strcmp(sub, "reset") == 0 && argc == 2) {
+	profile_reset();
+    } else if (strcmp(sub, "tag") == 0 && argc <= 3) {
+	if (profile_tag)
+	    free_string(profile_tag);
+	profile_tag = argc == 3 ? strsave_or_fail(argv[2], "do_profile") : NULL;
+    } else if (strcmp(sub, "show") == 0 && argc <= 3) {
+	FILE *outfile = stdout;
+	if (argc == 3) {
+	    outfile = fopen(argv[2], "w");
+	    if (outfile == NULL) {
+		report(0, "Couldn't open profile summary file '%s'", argv[2]);
+		return false;
+	    }
+	}
+	profile_show(outfile);
+	if (outfile != stdout)
+	    fclose(outfile);
+	else {
+	    FILE *logfile = get_logfile();
+	    if (logfile)
+		profile_show(logfile);
+	}
+    } else {
+	report(0, "Invalid profile subcommand '%s'", sub);
+	return false;
+    }
+    return true;
+}
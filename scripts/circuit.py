@@ -141,6 +141,9 @@ class Vec:
 # Framework for creating expressions
 class Circuit:
     outfile = None
+    # Should vector operations be performed by single "vector" commands?
+    # Off by default, so that generated scripts are unchanged
+    batchVectors = False
     # Set of (nonvector) nodes
     nodes = None
     # Set of vectors
@@ -238,18 +241,45 @@ class Circuit:
     def status(self):
         self.write("status")
 
-    def count(self, fv):
-        self.cmdLine("count", fv)
+    # Count solutions of functions in a single pass.
+    # projectVars: optional list of variables onto which to project
+    # fast: use floating-point counts
+    def count(self, fv, projectVars = None, fast = False):
+        opts = []
+        if fast:
+            opts.append("-f")
+        if projectVars is not None:
+            opts += ["-p", ",".join(map(str, projectVars))]
+        if len(opts) == 0:
+            self.cmdLine("count", fv)
+        else:
+            self.cmdLine("count " + " ".join(opts), fv)
 
     def satisfy(self, fv):
         self.cmdLine("satisfy", fv)
 
+    # Format list of names as argument to "vector" command:
+    # Prefix form when names are root0, root1, ..., single name when all the same,
+    # and bracketed list otherwise
+    def vectorArg(self, names):
+        if len(set(names)) == 1:
+            return names[0]
+        if names[0][-1:] == '0':
+            root = names[0][:-1]
+            if names == [root + str(i) for i in range(len(names))]:
+                return root + '*'
+        return '[' + ','.join(names) + ']'
+
     # Generate sequence of commands
     # argList should be list of vectors
     def cmdSequence(self, cmd, argList):
         n = max([len(v) for v in argList])
         nargList = [v.extend(n) for v in argList]
         lists = [v.nodes for v in nargList]
+        if self.batchVectors and n > 1:
+            args = ["-n", n, cmd] + [self.vectorArg(ls) for ls in lists]
+            self.cmdLine("vector", args)
+            return
         for i in range(n):
             args = [ele[i] for ele in lists]
             self.cmdLine(cmd, args)
@@ -288,15 +318,30 @@ class Circuit:
             self.comment("Couldn't assign value %s to node %s" % (val, dest)) 
 
     def checkConstant(self, dest, val):
+        self.checkConstants(dest, val)
+
+    # Check that every node in dests (node, list, or vector) equals constant val
+    # with a single assert command.  Only failures are reported.
+    # With stopOnFail, checking stops at the first failure, which counts as a command error
+    def checkConstants(self, dests, val, stopOnFail = False):
         cnode = None
         if val == 1:
             cnode = self.one
         elif val == 0:
             cnode = self.zero
         if cnode is None:
-            self.comment("Couldn't check that node %s = %d" % (dest, val))
+            self.comment("Couldn't check that nodes %s = %d" % (dests, val))
             return
-        self.cmdLine("equal", [dest, cnode])
+        opts = "-s " if stopOnFail else ""
+        self.cmdLine("assert " + opts + "-c " + str(cnode), dests)
+
+    # Check that each pair (a, b) in pairs has a == b with a single assert command
+    def checkEqual(self, pairs, stopOnFail = False):
+        ls = []
+        for (a, b) in pairs:
+            ls += [a, b]
+        opts = " -s" if stopOnFail else ""
+        self.cmdLine("assert" + opts, ls)
 
 
     def notV(self, dest, v):
@@ -718,7 +763,7 @@ def Multiplier(n, f = sys.stdout, zdd = Z.none, reverseA = False, reverseB = Fal
     if check:
         checkvec = ckt.nameVec("cout", n+n)
         ckt.multblast(checkvec, avec, bvec)
-        ckt.cmdSequence("equal", [outvec, checkvec])
+        ckt.checkEqual(zip(outvec.nodes, checkvec.nodes))
     ckt.status()
     ckt.comment("Flush state")
     ckt.write("flush")
@@ -0,0 +1,377 @@
+#!/usr/bin/python
+
+import sys
+import getopt
+import random
+
+'''
+Bit-parallel simulator for runbdd command files.
+
+Rather than building BDDs, each function is represented by its values
+over a set of random input patterns, packed into an integer with one
+bit per pattern (64 patterns per word).  The Boolean operations then
+become word operations.  Checks (equal and assert) that differ on some
+pattern are definite mismatches.  Checks that agree on all patterns
+are only probably correct.
+
+Operations that cannot be simulated from the input patterns
+(quantification, shifting, loading from files, etc.) produce an unknown
+value.  Anything computed from an unknown value is also unknown, and
+checks involving unknown values are counted as unchecked.
+
+The simulator can be used in two ways:
+
+1. Standalone, to interpret command files:
+
+    cmdsim.py [-h] [-v VERB] [-w WORDS] [-s SEED] [-p FILE] FILE.cmd ...
+
+2. As an output file for the circuit module, so that a generator
+   can be checked without writing a command file:
+
+    sim = cmdsim.Simulator()
+    ckt = circuit.Circuit(outfile = sim)
+    ...
+    sim.finish()
+
+The fraction of patterns for which a function is 1 estimates its signal
+probability, which can be used by ordering heuristics.
+'''
+
+# Commands that operate on functions
+evalCommands = ['and', 'conjunct', 'or', 'xor', 'not', 'ite', 'aconvert', 'zconvert']
+
+# Commands that define new functions, but whose values cannot be simulated
+unknownCommands = ['equant', 'uquant', 'shift', 'cofactor', 'restrict', 'softand', 'load']
+
+# Commands with no effect on the simulation
+ignoreCommands = ['collect', 'count', 'info', 'status', 'satisfy', 'store', 'mstore',
+                  'time', 'option', 'profile', 'checkpoint', 'flush', 'group',
+                  'schedule', 'orderstore', 'orderload', 'reorder', 'autoreorder',
+                  'size', 'log', 'help', 'trace', 'similar', 'cover']
+
+class SimulatorException(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return "Simulator Exception: " + str(self.value)
+
+class Simulator:
+    width = 64
+    mask = (1 << 64) - 1
+    # Mapping from function name to bit vector (None when unknown)
+    values = {}
+    # Mapping from variable name to signal probability, for variables and defined functions
+    probabilities = {}
+    trackProbabilities = False
+    verbosity = 1
+    lineNumber = 0
+    fileName = "<circuit>"
+    commandCount = 0
+    checkCount = 0
+    mismatchCount = 0
+    uncheckedCount = 0
+    varCount = 0
+    done = False
+    # Set when mload has loaded roots whose names are not known.
+    # Undefined names are then treated as unknown values
+    loadedUnnamed = False
+    # Partial line from write
+    pending = ""
+
+    def __init__(self, words = 1, seed = None, verbosity = 1, trackProbabilities = False):
+        self.width = 64 * words
+        self.mask = (1 << self.width) - 1
+        self.rng = random.Random(seed)
+        self.verbosity = verbosity
+        self.trackProbabilities = trackProbabilities
+        self.values = { 'one' : self.mask, 'zero' : 0 }
+        self.probabilities = {}
+        self.pending = ""
+
+    # Interface for use as output file by circuit module
+    def write(self, text):
+        text = self.pending + text
+        lines = text.split('\n')
+        self.pending = lines[-1]
+        for line in lines[:-1]:
+            self.lineNumber += 1
+            self.command(line)
+
+    def flush(self):
+        pass
+
+    def report(self, level, s):
+        if self.verbosity >= level:
+            print(s)
+
+    def location(self):
+        return "%s:%d" % (self.fileName, self.lineNumber)
+
+    def probability(self, val):
+        if val is None:
+            return None
+        return float(bin(val).count('1')) / self.width
+
+    def lookup(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name[0] == '!' and name[1:] in self.values:
+            val = self.values[name[1:]]
+            return None if val is None else val ^ self.mask
+        if self.loadedUnnamed:
+            return None
+        raise SimulatorException("%s: Function '%s' undefined" % (self.location(), name))
+
+    def assign(self, name, val):
+        self.values[name] = val
+        if self.trackProbabilities and val is not None:
+            self.probabilities[name] = self.probability(val)
+
+    def declare(self, names):
+        for name in names:
+            self.varCount += 1
+            self.assign(name, self.rng.getrandbits(self.width))
+
+    def evaluate(self, cmd, dest, args):
+        vals = [self.lookup(a) for a in args]
+        if None in vals:
+            result = None
+        elif cmd in ['and', 'conjunct']:
+            result = self.mask
+            for v in vals:
+                result &= v
+        elif cmd == 'or':
+            result = 0
+            for v in vals:
+                result |= v
+        elif cmd == 'xor':
+            result = 0
+            for v in vals:
+                result ^= v
+        elif cmd == 'not':
+            if len(vals) != 1:
+                raise SimulatorException("%s: not requires one argument" % self.location())
+            result = vals[0] ^ self.mask
+        elif cmd == 'ite':
+            if len(vals) != 3:
+                raise SimulatorException("%s: ite requires three arguments" % self.location())
+            (i, t, e) = vals
+            result = (i & t) | (~i & e & self.mask)
+        else:
+            # Conversions to ADD or ZDD do not change the function
+            if len(vals) != 1:
+                raise SimulatorException("%s: %s requires two arguments" % (self.location(), cmd))
+            result = vals[0]
+        self.assign(dest, result)
+
+    # Compare two functions.  Returns True unless known to differ
+    def check(self, aname, bname):
+        self.checkCount += 1
+        aval = self.lookup(aname)
+        bval = self.lookup(bname)
+        if aval is None or bval is None:
+            self.uncheckedCount += 1
+            self.report(2, "%s: Cannot check %s = %s" % (self.location(), aname, bname))
+            return True
+        diff = aval ^ bval
+        if diff == 0:
+            self.report(3, "%s: %s = %s" % (self.location(), aname, bname))
+            return True
+        self.mismatchCount += 1
+        self.report(1, "%s: MISMATCH %s != %s (differ on %d of %d patterns)" %
+                    (self.location(), aname, bname, bin(diff).count('1'), self.width))
+        return False
+
+    def doAssert(self, args):
+        stop = False
+        cname = None
+        while len(args) > 0 and args[0][0] == '-':
+            if args[0] == '-s':
+                stop = True
+                args = args[1:]
+            elif args[0] == '-c' and len(args) > 1:
+                cname = args[1]
+                args = args[2:]
+            else:
+                raise SimulatorException("%s: Unknown assert option '%s'" % (self.location(), args[0]))
+        if cname is not None:
+            pairs = [(a, cname) for a in args]
+        else:
+            if len(args) % 2 != 0:
+                raise SimulatorException("%s: assert requires pairs of arguments" % self.location())
+            pairs = [(args[i], args[i+1]) for i in range(0, len(args), 2)]
+        for (a, b) in pairs:
+            if not self.check(a, b) and stop:
+                break
+
+    # Expand vector argument into list of n names
+    def vectorElements(self, arg, n):
+        if arg[-1:] == '*':
+            return [arg[:-1] + str(i) for i in range(n)]
+        if arg[0] == '[':
+            return [e for e in arg[1:-1].replace(' ', ',').split(',') if e != '']
+        return [arg for i in range(n)]
+
+    def doVector(self, args):
+        n = -1
+        if len(args) > 1 and args[0] == '-n':
+            n = int(args[1])
+            args = args[2:]
+        if len(args) == 0:
+            raise SimulatorException("%s: vector requires command" % self.location())
+        cmd = args[0]
+        # Rejoin bracketed lists that were split at spaces
+        vargs = []
+        for a in args[1:]:
+            if len(vargs) > 0 and vargs[-1][0] == '[' and vargs[-1][-1] != ']':
+                vargs[-1] += ',' + a
+            else:
+                vargs.append(a)
+        for a in vargs:
+            if a[0] == '[':
+                cnt = len(self.vectorElements(a, 0))
+                if n < 0:
+                    n = cnt
+                elif n != cnt:
+                    raise SimulatorException("%s: Vector lengths differ (%d vs. %d)" % (self.location(), n, cnt))
+        if n < 0:
+            raise SimulatorException("%s: Cannot determine vector length" % self.location())
+        elists = [self.vectorElements(a, n) for a in vargs]
+        for i in range(n):
+            self.execute(cmd, [ls[i] for ls in elists])
+
+    def execute(self, cmd, args):
+        self.commandCount += 1
+        if cmd in evalCommands:
+            if len(args) == 0:
+                raise SimulatorException("%s: %s requires destination" % (self.location(), cmd))
+            self.evaluate(cmd, args[0], args[1:])
+        elif cmd == 'var':
+            self.declare(args)
+        elif cmd == 'equal':
+            if len(args) != 2:
+                raise SimulatorException("%s: equal requires two arguments" % self.location())
+            self.check(args[0], args[1])
+        elif cmd == 'assert':
+            self.doAssert(args)
+        elif cmd == 'vector':
+            self.doVector(args)
+        elif cmd == 'delete':
+            for a in args:
+                if a in self.values:
+                    del self.values[a]
+        elif cmd in unknownCommands:
+            if len(args) > 0:
+                self.assign(args[0], None)
+        elif cmd == 'mload':
+            # Without names, all roots in the file are loaded
+            if len(args) == 1:
+                self.loadedUnnamed = True
+            for a in args[1:]:
+                self.assign(a, None)
+        elif cmd == 'source':
+            for a in args:
+                self.source(a)
+        elif cmd == 'quit':
+            self.done = True
+        elif cmd not in ignoreCommands:
+            self.report(1, "%s: Ignoring unknown command '%s'" % (self.location(), cmd))
+
+    # Process single line of command file
+    def command(self, line):
+        if self.done:
+            return
+        pos = line.find('#')
+        if pos >= 0:
+            line = line[:pos]
+        fields = line.split()
+        if len(fields) == 0:
+            return
+        self.execute(fields[0], fields[1:])
+
+    def source(self, fname):
+        try:
+            infile = open(fname, 'r')
+        except IOError:
+            raise SimulatorException("Couldn't open file '%s'" % fname)
+        saveName = self.fileName
+        saveLine = self.lineNumber
+        self.fileName = fname
+        self.lineNumber = 0
+        for line in infile:
+            self.lineNumber += 1
+            self.command(line)
+            if self.done:
+                break
+        infile.close()
+        self.fileName = saveName
+        self.lineNumber = saveLine
+
+    def writeProbabilities(self, fname):
+        outfile = open(fname, 'w')
+        for name in sorted(self.probabilities.keys()):
+            outfile.write("%s %.4f\n" % (name, self.probabilities[name]))
+        outfile.close()
+
+    # Process any partial line and summarize.  Returns True if no mismatches found
+    def finish(self):
+        if self.pending != "":
+            self.lineNumber += 1
+            self.command(self.pending)
+            self.pending = ""
+        self.report(1, "Simulated %d commands over %d variables with %d patterns" %
+                    (self.commandCount, self.varCount, self.width))
+        self.report(1, "Checks: %d performed, %d mismatched, %d unchecked" %
+                    (self.checkCount, self.mismatchCount, self.uncheckedCount))
+        return self.mismatchCount == 0
+
+def usage(name):
+    print("Usage: %s [-h] [-v VERB] [-w WORDS] [-s SEED] [-p FILE] FILE.cmd ..." % name)
+    print("\t-h         Print this information")
+    print("\t-v VERB    Set verbosity level")
+    print("\t-w WORDS   Simulate 64*WORDS random patterns (default 1)")
+    print("\t-s SEED    Set random seed")
+    print("\t-p FILE    Write signal probabilities to FILE")
+    sys.exit(0)
+
+def run(name, args):
+    verbosity = 1
+    words = 1
+    seed = None
+    probFile = None
+    try:
+        (optlist, args) = getopt.getopt(args, 'hv:w:s:p:')
+    except getopt.GetoptError as e:
+        print(str(e))
+        usage(name)
+    for (opt, val) in optlist:
+        if opt == '-h':
+            usage(name)
+        elif opt == '-v':
+            verbosity = int(val)
+        elif opt == '-w':
+            words = int(val)
+        elif opt == '-s':
+            seed = int(val)
+        elif opt == '-p':
+            probFile = val
+    if len(args) == 0:
+        usage(name)
+    sim = Simulator(words, seed, verbosity, probFile is not None)
+    try:
+        for fname in args:
+            sim.source(fname)
+            if sim.done:
+                break
+    except SimulatorException as e:
+        print(str(e))
+        sys.exit(2)
+    ok = sim.finish()
+    if probFile is not None:
+        sim.writeProbabilities(probFile)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    run(sys.argv[0], sys.argv[1:])
@@ -4,10 +4,17 @@
 #include <inttypes.h>
 #include <stdbool.h>
 #include <string.h>
+#include <limits.h>
+#include <math.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+#ifdef HAVE_ZLIB
+#include <zlib.h>
+#endif
 
-#ifdef QUEUE
 #include <pthread.h>
-#endif
 
 #include "dtype.h"
 #include "table.h"
@@ -304,6 +311,23 @@ int post_gc_hook(DdManager *mgr, const char *str, void * ptr) {
     return 1;
 }
 
+static double reorder_start = 0.0;
+static long reorder_start_nodes = 0;
+
+int pre_reorder_hook(DdManager *mgr, const char *str, void * ptr) {
+    reorder_start = elapsed_time();
+    reorder_start_nodes = Cudd_ReadNodeCount(mgr);
+    report(3, "Reordering #%u started with %ld nodes", Cudd_ReadReorderings(mgr) + 1, reorder_start_nodes);
+    return 1;
+}
+
+int post_reorder_hook(DdManager *mgr, const char *str, void * ptr) {
+    report(1, "Reordering #%u completed in %.3f seconds.  %ld --> %ld nodes",
+	   Cudd_ReadReorderings(mgr), elapsed_time() - reorder_start,
+	   reorder_start_nodes, Cudd_ReadNodeCount(mgr));
+    return 1;
+}
+
 
 shadow_mgr new_shadow_mgr(bool do_cudd, bool do_local, bool do_dist, chaining_t chaining) {
     if (!(do_cudd || do_local || do_dist)) {
@@ -314,6 +338,11 @@ shadow_mgr new_shadow_mgr(bool do_cudd, bool do_local, bool do_dist, chaining_t
     mgr->do_cudd = do_cudd;
     mgr->do_local = do_local;
     mgr->do_dist = do_dist;
+#ifdef NO_CHAINING
+    mgr->chaining = CHAIN_NONE;
+#else
+    mgr->chaining = chaining;
+#endif
 
     mgr->c2r_table = word_keyvalue_new();
     mgr->r2c_table = word_keyvalue_new();
@@ -350,6 +379,8 @@ shadow_mgr new_shadow_mgr(bool do_cudd, bool do_local, bool do_dist, chaining_t
 	Cudd_AutodynDisableZdd(mgr->bdd_manager);
 	Cudd_AddHook(mgr->bdd_manager, pre_gc_hook, CUDD_PRE_GC_HOOK);
 	Cudd_AddHook(mgr->bdd_manager, post_gc_hook, CUDD_POST_GC_HOOK);
+	Cudd_AddHook(mgr->bdd_manager, pre_reorder_hook, CUDD_PRE_REORDERING_HOOK);
+	Cudd_AddHook(mgr->bdd_manager, post_reorder_hook, CUDD_POST_REORDERING_HOOK);
 #ifndef NO_CHAINING
 	Cudd_ChainingType ct = CUDD_CHAIN_NONE;
 	switch (chaining) {
@@ -736,6 +767,140 @@ ref_t shadow_and_limit(shadow_mgr mgr, ref_t aref, ref_t bref, size_t nodeLimit,
 ref_t shadow_and(shadow_mgr mgr, ref_t aref, ref_t bref) {
     return shadow_and_limit(mgr, aref, bref, 0, 0);
 }
+
+/* Speculative evaluation of limited conjunctions.
+   Each pair is evaluated on its own thread, using a private CUDD manager.
+   Arguments are transferred into the private managers, and successful results
+   are transferred back.  Once one evaluation succeeds, the others are cancelled
+   via CUDD's termination callback.
+*/
+#define MAX_PARALLEL 64
+
+typedef struct {
+    DdManager *dd;
+    DdNode *an;
+    DdNode *bn;
+    unsigned node_limit;
+    size_t lookup_limit;
+    DdNode *rn;
+    size_t lookups;
+} par_worker;
+
+static par_worker par_workers[MAX_PARALLEL];
+static int par_worker_count = 0;
+static int par_cancel = 0;
+
+static int par_terminate(const void *arg) {
+    return __atomic_load_n(&par_cancel, __ATOMIC_RELAXED);
+}
+
+static void par_init_worker(shadow_mgr mgr, par_worker *w) {
+    w->dd = Cudd_Init(0, 0, CUDD_UNIQUE_SLOTS, CUDD_CACHE_SLOTS, 0);
+    if (w->dd == NULL)
+	err(true, "Couldn't create CUDD manager for parallel conjunction");
+    Cudd_AutodynDisable(w->dd);
+#ifndef NO_CHAINING
+    Cudd_ChainingType ct = CUDD_CHAIN_NONE;
+    if (mgr->chaining == CHAIN_CONSTANT)
+	ct = CUDD_CHAIN_CONSTANT;
+    else if (mgr->chaining == CHAIN_ALL)
+	ct = CUDD_CHAIN_ALL;
+    Cudd_SetChaining(w->dd, ct);
+#endif
+    Cudd_RegisterTerminationCallback(w->dd, par_terminate, NULL);
+}
+
+static void *par_run(void *arg) {
+    par_worker *w = (par_worker *) arg;
+    size_t start_lookups = (size_t) Cudd_ReadCacheLookUps(w->dd);
+    DdNode *rn = w->node_limit == 0 && w->lookup_limit == 0 ?
+	Cudd_bddAnd(w->dd, w->an, w->bn) :
+	Cudd_bddAndLimit2(w->dd, w->an, w->bn, w->node_limit, w->lookup_limit);
+    if (rn) {
+	Cudd_Ref(rn);
+	__atomic_store_n(&par_cancel, 1, __ATOMIC_RELAXED);
+    } else
+	Cudd_ClearErrorCode(w->dd);
+    w->rn = rn;
+    w->lookups = (size_t) Cudd_ReadCacheLookUps(w->dd) - start_lookups;
+    return NULL;
+}
+
+int shadow_and_limit_parallel(shadow_mgr mgr, int count, ref_t *arefs, ref_t *brefs,
+			      size_t nodeLimit, size_t *lookupLimits, ref_t *results, size_t *lookups) {
+    int i;
+    int success = 0;
+    bool parallel = mgr->do_cudd && !do_ref(mgr) && count > 1;
+    for (i = 0; i < count && parallel; i++)
+	parallel = is_bdd(mgr, arefs[i]) && is_bdd(mgr, brefs[i]);
+    if (!parallel) {
+	for (i = 0; i < count; i++) {
+	    shadow_delta_cache_lookups(mgr);
+	    results[i] = shadow_and_limit(mgr, arefs[i], brefs[i], nodeLimit, lookupLimits[i]);
+	    lookups[i] = shadow_delta_cache_lookups(mgr);
+	    if (!REF_IS_INVALID(results[i]))
+		success++;
+	}
+	return success;
+    }
+    for (i = MAX_PARALLEL; i < count; i++) {
+	results[i] = REF_INVALID;
+	lookups[i] = 0;
+    }
+    if (count > MAX_PARALLEL)
+	count = MAX_PARALLEL;
+    while (par_worker_count < count)
+	par_init_worker(mgr, &par_workers[par_worker_count++]);
+
+    /* Transfer arguments */
+    for (i = 0; i < count; i++) {
+	par_worker *w = &par_workers[i];
+	w->an = Cudd_bddTransfer(mgr->bdd_manager, w->dd, ref2dd(mgr, arefs[i]));
+	if (w->an)
+	    Cudd_Ref(w->an);
+	w->bn = Cudd_bddTransfer(mgr->bdd_manager, w->dd, ref2dd(mgr, brefs[i]));
+	if (w->bn)
+	    Cudd_Ref(w->bn);
+	w->node_limit = (unsigned) nodeLimit;
+	w->lookup_limit = lookupLimits[i];
+	w->rn = NULL;
+	w->lookups = 0;
+    }
+    __atomic_store_n(&par_cancel, 0, __ATOMIC_RELAXED);
+    pthread_t threads[MAX_PARALLEL];
+    bool started[MAX_PARALLEL];
+    for (i = 0; i < count; i++) {
+	par_worker *w = &par_workers[i];
+	started[i] = w->an && w->bn && pthread_create(&threads[i], NULL, par_run, (void *) w) == 0;
+    }
+    for (i = 0; i < count; i++) {
+	if (started[i])
+	    pthread_join(threads[i], NULL);
+    }
+
+    /* Transfer results back and clean up */
+    for (i = 0; i < count; i++) {
+	par_worker *w = &par_workers[i];
+	results[i] = REF_INVALID;
+	lookups[i] = w->lookups;
+	if (w->rn) {
+	    DdNode *rn = Cudd_bddTransfer(w->dd, mgr->bdd_manager, w->rn);
+	    if (rn) {
+		reference_dd(mgr, rn);
+		results[i] = dd2ref(rn, IS_BDD);
+		add_ref(mgr, results[i], rn);
+		success++;
+	    }
+	    Cudd_RecursiveDeref(w->dd, w->rn);
+	}
+	if (w->an)
+	    Cudd_RecursiveDeref(w->dd, w->an);
+	if (w->bn)
+	    Cudd_RecursiveDeref(w->dd, w->bn);
+    }
+    report(4, "Parallel conjunction of %d pairs.  %d succeeded", count, success);
+    return success;
+}
 	
 
 ref_t shadow_soft_and(shadow_mgr mgr, ref_t aref, ref_t bref, size_t nodeLimit, size_t lookupLimit) {
@@ -995,6 +1160,209 @@ void shadow_satisfy(shadow_mgr mgr, ref_t r) {
     }
 }
 
+/* Bounded enumeration and sampling of solutions.
+   Cubes are generated in depth-first order, with the 0 branch first.
+   Path counts for each node allow skipping to the cursor without visiting earlier cubes,
+   and satisfying fractions allow choosing solutions uniformly at random */
+static word_t d2w(double d);
+static double w2d(word_t w);
+
+typedef struct {
+    DdManager *dd;
+    DdNode *one;
+    satisfy_options *opts;
+    size_t nvars;
+    char *cube;       // Current cube, as '0', '1', or '-' for each variable
+    keyvalue_table_ptr ptable; // Paths to one from regular node
+    keyvalue_table_ptr ntable; // Paths to zero from regular node
+    keyvalue_table_ptr ftable; // Fraction of assignments satisfying function at regular node
+    size_t seen;      // Number of cubes encountered
+    size_t generated;
+    bool more;        // Stopped before generating all cubes
+} satisfy_state;
+
+/* Number of paths from (possibly complemented) f to one */
+static double satisfy_paths(satisfy_state *st, DdNode *f) {
+    DdNode *n = Cudd_Regular(f);
+    bool neg = Cudd_IsComplement(f);
+    word_t wv;
+    if (Cudd_IsConstant(n))
+	return (f == st->one) ? 1.0 : 0.0;
+    if (keyvalue_find(neg ? st->ntable : st->ptable, (word_t) n, &wv))
+	return w2d(wv);
+    DdNode *t = Cudd_T(n);
+    DdNode *e = Cudd_E(n);
+    double pcount = satisfy_paths(st, t) + satisfy_paths(st, e);
+    double ncount = satisfy_paths(st, Cudd_Not(t)) + satisfy_paths(st, Cudd_Not(e));
+    keyvalue_insert(st->ptable, (word_t) n, d2w(pcount));
+    keyvalue_insert(st->ntable, (word_t) n, d2w(ncount));
+    return neg ? ncount : pcount;
+}
+
+/* Fraction of all assignments satisfying (possibly complemented) f */
+static double satisfy_fraction(satisfy_state *st, DdNode *f) {
+    DdNode *n = Cudd_Regular(f);
+    bool neg = Cudd_IsComplement(f);
+    word_t wv;
+    double frac;
+    if (Cudd_IsConstant(n))
+	frac = 1.0;
+    else if (keyvalue_find(st->ftable, (word_t) n, &wv))
+	frac = w2d(wv);
+    else {
+	frac = 0.5 * (satisfy_fraction(st, Cudd_T(n)) + satisfy_fraction(st, Cudd_E(n)));
+	keyvalue_insert(st->ftable, (word_t) n, d2w(frac));
+    }
+    return neg ? 1.0 - frac : frac;
+}
+
+/* Write cube.  Packed form gives value, followed by mask of assigned variables when cube has don't cares */
+static void satisfy_emit(satisfy_state *st) {
+    FILE *out = st->opts->outfile;
+    if (!st->opts->packed) {
+	fprintf(out, "%s 1\n", st->cube);
+	return;
+    }
+    int ndigits = (st->nvars + 3) / 4;
+    int d, b;
+    bool partial = false;
+    for (d = ndigits-1; d >= 0; d--) {
+	int digit = 0;
+	for (b = 3; b >= 0; b--) {
+	    size_t v = 4*d + b;
+	    digit = digit << 1;
+	    if (v < st->nvars) {
+		if (st->cube[v] == '1')
+		    digit |= 1;
+		else if (st->cube[v] == '-')
+		    partial = true;
+	    }
+	}
+	fputc("0123456789abcdef"[digit], out);
+    }
+    if (partial) {
+	fputc('/', out);
+	for (d = ndigits-1; d >= 0; d--) {
+	    int digit = 0;
+	    for (b = 3; b >= 0; b--) {
+		size_t v = 4*d + b;
+		digit = (digit << 1) | ((v < st->nvars && st->cube[v] != '-') ? 1 : 0);
+	    }
+	    fputc("0123456789abcdef"[digit], out);
+	}
+    }
+    fputc('\n', out);
+}
+
+static void satisfy_enumerate(satisfy_state *st, DdNode *f) {
+    if (st->more)
+	return;
+    DdNode *n = Cudd_Regular(f);
+    if (Cudd_IsConstant(n)) {
+	if (f != st->one)
+	    return;
+	/* Cube precedes the cursor */
+	if (st->seen < st->opts->cursor) {
+	    st->seen++;
+	    return;
+	}
+	if (st->opts->limit > 0 && st->generated >= st->opts->limit) {
+	    st->more = true;
+	    return;
+	}
+	satisfy_emit(st);
+	st->seen++;
+	st->generated++;
+	return;
+    }
+    /* Skip subgraph if all of its cubes precede the cursor */
+    if (st->seen < st->opts->cursor) {
+	double paths = satisfy_paths(st, f);
+	if ((double) st->seen + paths <= (double) st->opts->cursor) {
+	    st->seen += (size_t) paths;
+	    return;
+	}
+    }
+    int idx = Cudd_NodeReadIndex(n);
+    DdNode *t = Cudd_T(n);
+    DdNode *e = Cudd_E(n);
+    if (Cudd_IsComplement(f)) {
+	t = Cudd_Not(t);
+	e = Cudd_Not(e);
+    }
+    st->cube[idx] = '0';
+    satisfy_enumerate(st, e);
+    st->cube[idx] = '1';
+    satisfy_enumerate(st, t);
+    st->cube[idx] = '-';
+}
+
+/* Choose solution at random, with all solutions equally likely */
+static void satisfy_sample(satisfy_state *st, DdNode *f) {
+    size_t v;
+    /* Variables not on path are unconstrained */
+    for (v = 0; v < st->nvars; v++)
+	st->cube[v] = (random() & 0x1) ? '1' : '0';
+    while (!Cudd_IsConstant(Cudd_Regular(f))) {
+	DdNode *n = Cudd_Regular(f);
+	DdNode *t = Cudd_T(n);
+	DdNode *e = Cudd_E(n);
+	if (Cudd_IsComplement(f)) {
+	    t = Cudd_Not(t);
+	    e = Cudd_Not(e);
+	}
+	double tfrac = satisfy_fraction(st, t);
+	double efrac = satisfy_fraction(st, e);
+	double x = (double) random() / ((double) RAND_MAX + 1.0);
+	bool take_t = x * (tfrac + efrac) < tfrac;
+	st->cube[Cudd_NodeReadIndex(n)] = take_t ? '1' : '0';
+	f = take_t ? t : e;
+    }
+    satisfy_emit(st);
+    st->generated++;
+}
+
+long shadow_satisfy_bounded(shadow_mgr mgr, ref_t r, satisfy_options *opts, size_t *next_cursor) {
+    if (!mgr->do_cudd) {
+	err(false, "Bounded satisfy requires CUDD");
+	return -1;
+    }
+    if (!is_bdd(mgr, r)) {
+	err(false, "Bounded satisfy only works for BDDs");
+	return -1;
+    }
+    satisfy_state st;
+    st.dd = mgr->bdd_manager;
+    st.one = Cudd_ReadOne(st.dd);
+    st.opts = opts;
+    st.nvars = Cudd_ReadSize(st.dd);
+    st.cube = calloc_or_fail(st.nvars+1, sizeof(char), "shadow_satisfy_bounded");
+    memset(st.cube, '-', st.nvars);
+    st.ptable = word_keyvalue_new();
+    st.ntable = word_keyvalue_new();
+    st.ftable = word_keyvalue_new();
+    st.seen = 0;
+    st.generated = 0;
+    st.more = false;
+    DdNode *f = get_ddnode(mgr, r);
+    if (opts->samples > 0) {
+	if (f != Cudd_Not(st.one)) {
+	    size_t i;
+	    for (i = 0; i < opts->samples; i++)
+		satisfy_sample(&st, f);
+	}
+	*next_cursor = 0;
+    } else {
+	satisfy_enumerate(&st, f);
+	*next_cursor = st.more ? st.seen : 0;
+    }
+    keyvalue_free(st.ptable);
+    keyvalue_free(st.ntable);
+    keyvalue_free(st.ftable);
+    free_array(st.cube, st.nvars+1, sizeof(char));
+    return (long) st.generated;
+}
+
 
 
 /*** Unary Operations ***/
@@ -1128,6 +1496,282 @@ double cudd_single_count(shadow_mgr mgr, ref_t r) {
     return fv;
 }
 
+/*
+  Multi-root counting.
+  For regular node n, memoize the number of solutions over the counted variables
+  from the rank of n's variable downward, where rank is position in the variable
+  order among counted variables.  A complemented edge to n has 2^(P-rank(n))
+  minus that many solutions, where P is the number of counted variables.
+  Exact counts are unsigned integers held as arrays of 32-bit limbs (least significant first),
+  built using only shifted additions and subtractions.
+*/
+static index_set *index_set_new();
+static DdNode *index_cube(shadow_mgr mgr, index_set *iset);
+
+typedef struct {
+    DdManager *dd;
+    int ncounted;              // Number of counted variables
+    int *rank;                 // Rank of each counted variable index
+    int nlimbs;                // Limbs per exact count
+    keyvalue_table_ptr memo;   // Regular node --> count (double or pointer to limbs)
+} count_state;
+
+/* dst += src << shift */
+static void limbs_add_shifted(uint32_t *dst, uint32_t *src, int nlimbs, int shift) {
+    int wshift = shift / 32;
+    int bshift = shift % 32;
+    uint64_t carry = 0;
+    uint32_t prev = 0;
+    int i;
+    for (i = wshift; i < nlimbs; i++) {
+	uint32_t cur = i - wshift < nlimbs ? src[i - wshift] : 0;
+	uint32_t s = bshift == 0 ? cur : (cur << bshift) | (prev >> (32 - bshift));
+	prev = cur;
+	uint64_t sum = (uint64_t) dst[i] + s + carry;
+	dst[i] = (uint32_t) sum;
+	carry = sum >> 32;
+    }
+}
+
+/* dst -= src << shift.  Result must be nonnegative */
+static void limbs_sub_shifted(uint32_t *dst, uint32_t *src, int nlimbs, int shift) {
+    int wshift = shift / 32;
+    int bshift = shift % 32;
+    int64_t borrow = 0;
+    uint32_t prev = 0;
+    int i;
+    for (i = wshift; i < nlimbs; i++) {
+	uint32_t cur = src[i - wshift];
+	uint32_t s = bshift == 0 ? cur : (cur << bshift) | (prev >> (32 - bshift));
+	prev = cur;
+	int64_t diff = (int64_t) dst[i] - s - borrow;
+	borrow = diff < 0 ? 1 : 0;
+	dst[i] = (uint32_t) (diff + (borrow << 32));
+    }
+}
+
+/* dst += 1 << shift */
+static void limbs_add_power(uint32_t *dst, int nlimbs, int shift) {
+    int i = shift / 32;
+    uint64_t carry = (uint64_t) 1 << (shift % 32);
+    for (; carry && i < nlimbs; i++) {
+	uint64_t sum = (uint64_t) dst[i] + carry;
+	dst[i] = (uint32_t) sum;
+	carry = sum >> 32;
+    }
+}
+
+/* Convert to decimal string.  Destroys value */
+static char *limbs_to_decimal(uint32_t *val, int nlimbs) {
+    /* Each limb needs at most 10 decimal digits */
+    int maxdigits = 10 * nlimbs + 1;
+    char *buf = calloc_or_fail(maxdigits + 1, sizeof(char), "limbs_to_decimal");
+    int pos = maxdigits;
+    int top = nlimbs - 1;
+    while (top >= 0 && val[top] == 0)
+	top--;
+    if (top < 0)
+	buf[--pos] = '0';
+    while (top >= 0) {
+	/* Divide by 10^9 */
+	uint64_t rem = 0;
+	int i;
+	for (i = top; i >= 0; i--) {
+	    uint64_t cur = (rem << 32) | val[i];
+	    val[i] = (uint32_t) (cur / 1000000000);
+	    rem = cur % 1000000000;
+	}
+	while (top >= 0 && val[top] == 0)
+	    top--;
+	int d;
+	for (d = 0; d < 9 && (top >= 0 || rem > 0); d++) {
+	    buf[--pos] = '0' + (char) (rem % 10);
+	    rem /= 10;
+	}
+    }
+    char *result = strsave_or_fail(buf + pos, "limbs_to_decimal");
+    free_array(buf, maxdigits + 1, sizeof(char));
+    return result;
+}
+
+static int count_rank(count_state *st, DdNode *n) {
+    return Cudd_IsConstant(n) ? st->ncounted : st->rank[Cudd_NodeReadIndex(n)];
+}
+
+/* Floating-point count over counted variables from rank r downward for edge e */
+static double count_edge_float(count_state *st, DdNode *e, int r) {
+    DdNode *n = Cudd_Regular(e);
+    int nr = count_rank(st, n);
+    double c;
+    word_t wv;
+    if (Cudd_IsConstant(n))
+	c = 1.0;
+    else if (keyvalue_find(st->memo, (word_t) n, &wv))
+	c = w2d(wv);
+    else {
+	c = count_edge_float(st, Cudd_T(n), nr+1) + count_edge_float(st, Cudd_E(n), nr+1);
+	keyvalue_insert(st->memo, (word_t) n, d2w(c));
+    }
+    if (Cudd_IsComplement(e))
+	c = ldexp(1.0, st->ncounted - nr) - c;
+    return ldexp(c, nr - r);
+}
+
+static uint32_t *count_node_exact(count_state *st, DdNode *n);
+
+/* acc += exact count over counted variables from rank r downward for edge e */
+static void count_edge_exact(count_state *st, uint32_t *acc, DdNode *e, int r) {
+    DdNode *n = Cudd_Regular(e);
+    int nr = count_rank(st, n);
+    int shift = nr - r;
+    if (Cudd_IsConstant(n)) {
+	/* Complemented edge to constant one has no solutions */
+	if (!Cudd_IsComplement(e))
+	    limbs_add_power(acc, st->nlimbs, shift);
+	return;
+    }
+    if (Cudd_IsComplement(e))
+	limbs_add_power(acc, st->nlimbs, st->ncounted - nr + shift);
+    uint32_t *c = count_node_exact(st, n);
+    if (Cudd_IsComplement(e))
+	limbs_sub_shifted(acc, c, st->nlimbs, shift);
+    else
+	limbs_add_shifted(acc, c, st->nlimbs, shift);
+}
+
+static uint32_t *count_node_exact(count_state *st, DdNode *n) {
+    word_t wv;
+    if (keyvalue_find(st->memo, (word_t) n, &wv))
+	return (uint32_t *) wv;
+    int nr = count_rank(st, n);
+    uint32_t *c = calloc_or_fail(st->nlimbs, sizeof(uint32_t), "count_node_exact");
+    count_edge_exact(st, c, Cudd_T(n), nr+1);
+    count_edge_exact(st, c, Cudd_E(n), nr+1);
+    keyvalue_insert(st->memo, (word_t) n, (word_t) c);
+    return c;
+}
+
+bool shadow_count_roots(shadow_mgr mgr, int nroots, ref_t *roots, int nproj, int *proj,
+			double *fcounts, char **exact) {
+    if (!mgr->do_cudd) {
+	err(false, "Multi-root counting requires CUDD");
+	return false;
+    }
+    DdManager *dd = mgr->bdd_manager;
+    int nvars = (int) mgr->nvars;
+    int i;
+    for (i = 0; proj && i < nroots; i++) {
+	if (!is_bdd(mgr, roots[i])) {
+	    err(false, "Projected counting only works for BDDs");
+	    return false;
+	}
+    }
+    /* Determine counted variables */
+    bool *counted = calloc_or_fail(nvars > 0 ? nvars : 1, sizeof(bool), "shadow_count_roots");
+    int ncounted = 0;
+    for (i = 0; i < nvars; i++)
+	counted[i] = proj == NULL;
+    if (proj) {
+	for (i = 0; i < nproj; i++)
+	    if (proj[i] >= 0 && proj[i] < nvars)
+		counted[proj[i]] = true;
+    }
+    index_set *qset = index_set_new();
+    for (i = 0; i < nvars; i++) {
+	if (counted[i])
+	    ncounted++;
+	else
+	    qset->count++;
+    }
+    if (qset->count > 0) {
+	qset->indices = calloc_or_fail(qset->count, sizeof(int), "shadow_count_roots");
+	int q = 0;
+	for (i = 0; i < nvars; i++)
+	    if (!counted[i])
+		qset->indices[q++] = i;
+    }
+    /* Project onto counted variables */
+    DdNode **nodes = calloc_or_fail(nroots, sizeof(DdNode *), "shadow_count_roots");
+    DdNode *cube = qset->count > 0 ? index_cube(mgr, qset) : Cudd_ReadOne(dd);
+    for (i = 0; i < nroots; i++) {
+	if (is_bdd(mgr, roots[i])) {
+	    nodes[i] = Cudd_bddExistAbstract(dd, ref2dd(mgr, roots[i]), cube);
+	    reference_dd(mgr, nodes[i]);
+	} else {
+	    /* ADDs and ZDDs are counted individually */
+	    nodes[i] = NULL;
+	    fcounts[i] = cudd_single_count(mgr, roots[i]);
+	    if (exact) {
+		char buf[64];
+		sprintf(buf, "%.0f", fcounts[i]);
+		exact[i] = strsave_or_fail(buf, "shadow_count_roots");
+	    }
+	}
+    }
+    if (qset->count > 0)
+	unreference_dd(mgr, cube, IS_BDD);
+    count_state st;
+    st.dd = dd;
+    st.ncounted = ncounted;
+    st.rank = calloc_or_fail(nvars > 0 ? nvars : 1, sizeof(int), "shadow_count_roots");
+    int level, r = 0;
+    for (level = 0; level < nvars; level++) {
+	int idx = Cudd_ReadInvPerm(dd, level);
+	if (counted[idx])
+	    st.rank[idx] = r++;
+    }
+    bool plain = mgr->chaining == CHAIN_NONE;
+    if (!plain) {
+	/* Chained nodes skip variables.  Use CUDD's counting, scaled to counted variables */
+	for (i = 0; i < nroots; i++) {
+	    if (!nodes[i])
+		continue;
+	    fcounts[i] = ldexp(Cudd_CountMinterm(dd, nodes[i], nvars), ncounted - nvars);
+	    if (exact) {
+		char buf[64];
+		sprintf(buf, "%.0f", fcounts[i]);
+		exact[i] = strsave_or_fail(buf, "shadow_count_roots");
+	    }
+	}
+	if (exact)
+	    report(3, "Exact counting not supported with chaining.  Using floating point");
+    } else {
+	/* Floating point counts */
+	st.memo = word_keyvalue_new();
+	for (i = 0; i < nroots; i++) {
+	    if (nodes[i])
+		fcounts[i] = count_edge_float(&st, nodes[i], 0);
+	}
+	report(3, "Counted %d functions with %zd shared nodes", nroots, st.memo->nelements);
+	keyvalue_free(st.memo);
+	if (exact) {
+	    st.nlimbs = ncounted / 32 + 2;
+	    st.memo = word_keyvalue_new();
+	    for (i = 0; i < nroots; i++) {
+		if (!nodes[i])
+		    continue;
+		uint32_t *acc = calloc_or_fail(st.nlimbs, sizeof(uint32_t), "shadow_count_roots");
+		count_edge_exact(&st, acc, nodes[i], 0);
+		exact[i] = limbs_to_decimal(acc, st.nlimbs);
+		free_array(acc, st.nlimbs, sizeof(uint32_t));
+	    }
+	    word_t wk, wv;
+	    while (keyvalue_removenext(st.memo, &wk, &wv))
+		free_array((void *) wv, st.nlimbs, sizeof(uint32_t));
+	    keyvalue_free(st.memo);
+	}
+    }
+    for (i = 0; i < nroots; i++) {
+	if (nodes[i])
+	    unreference_dd(mgr, nodes[i], IS_BDD);
+    }
+    free_array(nodes, nroots, sizeof(DdNode *));
+    free_array(st.rank, nvars > 0 ? nvars : 1, sizeof(int));
+    free_array(counted, nvars > 0 ? nvars : 1, sizeof(bool));
+    index_set_free(qset);
+    return true;
+}
+
 static keyvalue_table_ptr cudd_count(shadow_mgr mgr, set_ptr roots) {
     word_t wk, wv;
     keyvalue_table_ptr result = word_keyvalue_new();
@@ -1332,6 +1976,67 @@ size_t shadow_peak_nodes(shadow_mgr mgr) {
     return Cudd_ReadPeakLiveNodeCount(mgr->bdd_manager);
 }
 
+void shadow_read_stats(shadow_mgr mgr, shadow_stats *stats) {
+    memset(stats, 0, sizeof(shadow_stats));
+    if (!mgr->do_cudd)
+	return;
+    DdManager *dd = mgr->bdd_manager;
+    stats->nodes = (size_t) Cudd_ReadNodeCount(dd);
+    stats->peak_nodes = (size_t) Cudd_ReadPeakLiveNodeCount(dd);
+    stats->lookups = (size_t) Cudd_ReadCacheLookUps(dd);
+    stats->hits = (size_t) Cudd_ReadCacheHits(dd);
+    stats->gcs = (size_t) Cudd_ReadGarbageCollections(dd);
+    stats->reorder_secs = 0.001 * Cudd_ReadReorderingTime(dd);
+}
+
+/*
+  Division of memory budget.
+  CUDD gets most of it, with the rest left for runbdd's own tables and I/O buffers.
+  Within CUDD's share, the computed table is limited to a fraction,
+  and the unique table grows without collecting garbage only while small
+  compared to what the rest can hold.
+  Byte counts per node and cache entry are estimates for 64-bit machines,
+  including the unique table slots.
+  The limits are soft: CUDD's total memory and live node count are not capped,
+  since operations would then fail rather than letting the governor ease off.
+*/
+#define BUDGET_CUDD_FRACTION 0.9
+#define BUDGET_CACHE_FRACTION 0.125
+#define BUDGET_NODE_FRACTION 0.7
+#define NODE_BYTES 48
+#define CACHE_ENTRY_BYTES 40
+
+void shadow_set_memory_budget(shadow_mgr mgr, size_t budget_bytes) {
+    if (!mgr->do_cudd || budget_bytes == 0)
+	return;
+    DdManager *dd = mgr->bdd_manager;
+    size_t cudd_bytes = (size_t) (BUDGET_CUDD_FRACTION * budget_bytes);
+    size_t cache_slots = (size_t) (BUDGET_CACHE_FRACTION * cudd_bytes) / CACHE_ENTRY_BYTES;
+    size_t max_live = (size_t) (BUDGET_NODE_FRACTION * cudd_bytes) / NODE_BYTES;
+    if (cache_slots > UINT_MAX)
+	cache_slots = UINT_MAX;
+    if (max_live > UINT_MAX)
+	max_live = UINT_MAX;
+    Cudd_SetMaxCacheHard(dd, (unsigned) cache_slots);
+    /* Grow unique table without garbage collection only while it is small */
+    Cudd_SetLooseUpTo(dd, (unsigned) (max_live / 4));
+    report(1, "Memory budget %.2f MB.  CUDD share %.2f MB.  Max cache %zd entries.  Target live nodes %zd",
+	   (double) budget_bytes / 1e6, (double) cudd_bytes / 1e6, cache_slots, max_live);
+}
+
+size_t shadow_memory_in_use(shadow_mgr mgr) {
+    if (!mgr->do_cudd)
+	return 0;
+    return (size_t) Cudd_ReadMemoryInUse(mgr->bdd_manager);
+}
+
+/* Unlike memory in use, this drops when garbage is collected */
+size_t shadow_live_bytes(shadow_mgr mgr) {
+    if (!mgr->do_cudd)
+	return 0;
+    return (size_t) Cudd_ReadNodeCount(mgr->bdd_manager) * NODE_BYTES;
+}
+
 /* Have CUDD perform garbage collection.  Return number of nodes collected */
 int cudd_collect(shadow_mgr mgr) {
     if (!mgr->do_cudd)
@@ -1595,13 +2300,64 @@ static index_set *index_set_new() {
     index_set *iset = malloc_or_fail(sizeof(index_set), "index_set_new");
     iset->count = 0;
     iset->indices = NULL;
+    iset->nwords = 0;
+    iset->bits = NULL;
     return iset;
 }
 
+static void index_set_clear_bits(index_set *iset) {
+    if (iset->bits)
+	free_array(iset->bits, iset->nwords, sizeof(uint64_t));
+    iset->bits = NULL;
+    iset->nwords = 0;
+}
+
+/* Build bitmap form of set, with one bit per variable up to the largest index */
+static void index_set_bits(index_set *iset) {
+    if (iset->bits || iset->count == 0)
+	return;
+    int i;
+    int max_index = 0;
+    for (i = 0; i < iset->count; i++) {
+	if (iset->indices[i] > max_index)
+	    max_index = iset->indices[i];
+    }
+    iset->nwords = max_index/64 + 1;
+    iset->bits = calloc_or_fail(iset->nwords, sizeof(uint64_t), "index_set_bits");
+    for (i = 0; i < iset->count; i++) {
+	int v = iset->indices[i];
+	iset->bits[v/64] |= (uint64_t) 1 << (v%64);
+    }
+}
+
+/* Number of indices in both sets */
+static int index_intersection_count(index_set *iset1, index_set *iset2) {
+    if (iset1->count == 0 || iset2->count == 0)
+	return 0;
+    index_set_bits(iset1);
+    index_set_bits(iset2);
+    int nwords = iset1->nwords < iset2->nwords ? iset1->nwords : iset2->nwords;
+    int count = 0;
+    int w;
+    for (w = 0; w < nwords; w++)
+	count += __builtin_popcountll(iset1->bits[w] & iset2->bits[w]);
+    return count;
+}
+
+bool index_set_member(index_set *iset, int v) {
+    if (iset->count == 0 || v < 0)
+	return false;
+    index_set_bits(iset);
+    if (v/64 >= iset->nwords)
+	return false;
+    return (iset->bits[v/64] >> (v%64)) & 0x1;
+}
+
 void index_set_free(index_set *iset) {
     if (iset->indices)
 	free(iset->indices);
     iset->indices = NULL;
+    index_set_clear_bits(iset);
     free_block(iset, sizeof(index_set));
 }
 
@@ -1617,6 +2373,37 @@ index_set *index_set_duplicate(index_set *iset) {
     return nset;
 }
 
+index_set *index_set_union(index_set *iset1, index_set *iset2) {
+    index_set *nset = index_set_new();
+    int count = iset1->count + iset2->count;
+    if (count == 0)
+	return nset;
+    nset->indices = calloc_or_fail(count, sizeof(int), "index_set_union");
+    int idx1 = 0;
+    int idx2 = 0;
+    int ncount = 0;
+    while (idx1 < iset1->count && idx2 < iset2->count) {
+	int next1 = iset1->indices[idx1];
+	int next2 = iset2->indices[idx2];
+	if (next1 == next2) {
+	    nset->indices[ncount++] = next1;
+	    idx1++;
+	    idx2++;
+	} else if (next1 < next2) {
+	    nset->indices[ncount++] = next1;
+	    idx1++;
+	} else {
+	    nset->indices[ncount++] = next2;
+	    idx2++;
+	}
+    }
+    while (idx1 < iset1->count)
+	nset->indices[ncount++] = iset1->indices[idx1++];
+    while (idx2 < iset2->count)
+	nset->indices[ncount++] = iset2->indices[idx2++];
+    nset->count = ncount;
+    return nset;
+}
 
 void index_set_remove(index_set *set, index_set *rset) {
     if (rset->count == 0)
@@ -1647,22 +2434,18 @@ void index_set_remove(index_set *set, index_set *rset) {
     }
     if (ncount == 0) {
 	free(set->indices);
+	set->indices = NULL;
     }
     set->count = ncount;
+    index_set_clear_bits(set);
 }
 
 /* Existential quantification over variables in index set */
-ref_t index_equant(shadow_mgr mgr, ref_t r, index_set *iset) {
-    if (!mgr->do_cudd)
-	return r;
+/* Build cube of variables in index set */
+static DdNode *index_cube(shadow_mgr mgr, index_set *iset) {
     size_t nele = iset->count;
-    if (!is_bdd(mgr, r)) {
-	err(false, "Cannot quantify non-BDD");
-	return r;
-    }
-    DdNode *n = ref2dd(mgr, r);
-    DdNode **vars = calloc_or_fail(nele, sizeof(DdNode *), "index_equant");
-    int *phase = calloc_or_fail(nele, sizeof(int), "index_equant");
+    DdNode **vars = calloc_or_fail(nele, sizeof(DdNode *), "index_cube");
+    int *phase = calloc_or_fail(nele, sizeof(int), "index_cube");
     int i;
     for (i = 0; i < nele; i++) {
 	vars[i] = ref2dd(mgr, shadow_get_variable(mgr, iset->indices[i]));
@@ -1672,6 +2455,18 @@ ref_t index_equant(shadow_mgr mgr, ref_t r, index_set *iset) {
     reference_dd(mgr, cube);
     free_array(vars, nele, sizeof(DdNode *));
     free_array(phase, nele, sizeof(int));
+    return cube;
+}
+
+ref_t index_equant(shadow_mgr mgr, ref_t r, index_set *iset) {
+    if (!mgr->do_cudd)
+	return r;
+    if (!is_bdd(mgr, r)) {
+	err(false, "Cannot quantify non-BDD");
+	return r;
+    }
+    DdNode *n = ref2dd(mgr, r);
+    DdNode *cube = index_cube(mgr, iset);
 
     DdNode *nq = Cudd_bddExistAbstract(mgr->bdd_manager, n, cube);
     reference_dd(mgr, nq);
@@ -1680,43 +2475,42 @@ ref_t index_equant(shadow_mgr mgr, ref_t r, index_set *iset) {
     return dd2ref(nq, IS_BDD);
 }
 
+ref_t index_and_equant(shadow_mgr mgr, ref_t aref, ref_t bref, index_set *iset, size_t nodeLimit) {
+    if (!mgr->do_cudd || iset->count == 0 || !is_bdd(mgr, aref) || !is_bdd(mgr, bref))
+	return shadow_and_limit(mgr, aref, bref, nodeLimit, 0);
+    DdNode *an = ref2dd(mgr, aref);
+    DdNode *bn = ref2dd(mgr, bref);
+    DdNode *cube = index_cube(mgr, iset);
+    DdNode *rn = nodeLimit == 0 ?
+	dd_check(Cudd_bddAndAbstract(mgr->bdd_manager, an, bn, cube)) :
+	dd_check(Cudd_bddAndAbstractLimit(mgr->bdd_manager, an, bn, cube, (unsigned) nodeLimit));
+    unreference_dd(mgr, cube, IS_BDD);
+    ref_t r = dd2ref(rn, IS_BDD);
+    if (!REF_IS_INVALID(r)) {
+	reference_dd(mgr, rn);
+	add_ref(mgr, r, rn);
+    }
+#if RPT >= 4
+    char buf1[24], buf2[24], buf3[24];
+    shadow_show(mgr, aref, buf1);
+    shadow_show(mgr, bref, buf2);
+    shadow_show(mgr, r, buf3);
+    report(4, "%s AND-EXISTS(%d vars) %s --> %s", buf1, iset->count, buf2, buf3);
+#endif
+    return r;
+}
 
 
 /* Compute similarity metric for support sets of two functions */
 /* Modified 09/17/2019 with revised similarity count */
 
-double index_similarity(index_set *iset1, index_set *iset2) {
-    int *indices1 = iset1->indices;
-    int *indices2 = iset2->indices;
-    int support_count1 = iset1->count;
-    int support_count2 = iset2->count;
+/* Modified to count intersection over bitmaps */
 
+double index_similarity(index_set *iset1, index_set *iset2) {
     double score = 0.0;
-    int intersection_count = 0;
-    int r1_count = 0;
-    int r2_count = 0;
-    int idx1 = 0;
-    int idx2 = 0;
-
-    while (idx1 < support_count1 && idx2 < support_count2) {
-	int next1 = indices1[idx1];
-	int next2 = indices2[idx2];
-	if (next1 == next2) {
-	    intersection_count++;
-	    r1_count++;
-	    r2_count++;
-	    idx1++;
-	    idx2++;
-	} else if (next1 < next2) {
-	    r1_count++;
-	    idx1++;
-	} else {
-	    r2_count++;
-	    idx2++;
-	}
-    }
-    r1_count += (support_count1-idx1);
-    r2_count += (support_count2-idx2);
+    int intersection_count = index_intersection_count(iset1, iset2);
+    int r1_count = iset1->count;
+    int r2_count = iset2->count;
     int min_count = r1_count < r2_count ? r1_count : r2_count;
     double cov = min_count == 0 ? 1.0 : (double) intersection_count / min_count;
     int sum_count = r1_count + r2_count + intersection_count;
@@ -1726,31 +2520,8 @@ double index_similarity(index_set *iset1, index_set *iset2) {
 }
 
 double index_coverage(index_set *iset1, index_set *iset2) {
-    int *indices1 = iset1->indices;
-    int *indices2 = iset2->indices;
-    int support_count1 = iset1->count;
-    int support_count2 = iset2->count;
-    int intersection_count = 0;
-    int r1_count = 0;
-    int idx1 = 0;
-    int idx2 = 0;
-
-    while (idx1 < support_count1 && idx2 < support_count2) {
-	int next1 = indices1[idx1];
-	int next2 = indices2[idx2];
-	if (next1 == next2) {
-	    intersection_count++;
-	    r1_count++;
-	    idx1++;
-	    idx2++;
-	} else if (next1 < next2) {
-	    r1_count++;
-	    idx1++;
-	} else {
-	    idx2++;
-	}
-    }
-    r1_count += (support_count1-idx1);
+    int intersection_count = index_intersection_count(iset1, iset2);
+    int r1_count = iset1->count;
     double cov = r1_count == 0 ? 1.0 : (double) intersection_count / r1_count;
     return cov;
 }
@@ -1765,6 +2536,117 @@ index_set *shadow_support_indices(shadow_mgr mgr, ref_t r) {
     return iset;
 }
 
+int shadow_index_level(shadow_mgr mgr, int index) {
+    if (mgr->do_cudd)
+	return Cudd_ReadPerm(mgr->bdd_manager, index);
+    return index;
+}
+
+int shadow_level_index(shadow_mgr mgr, int level) {
+    if (mgr->do_cudd)
+	return Cudd_ReadInvPerm(mgr->bdd_manager, level);
+    return level;
+}
+
+/* Variable ordering.  Only supported by CUDD, without chaining */
+/* Group flags, as defined in mtr.h */
+#ifndef MTR_DEFAULT
+#define MTR_DEFAULT 0x00000000
+#define MTR_FIXED   0x00000004
+#endif
+
+static struct {
+    char *name;
+    Cudd_ReorderingType method;
+} reorder_methods[] = {
+    { "none",      CUDD_REORDER_NONE },
+    { "sift",      CUDD_REORDER_SIFT },
+    { "siftconv",  CUDD_REORDER_SIFT_CONVERGE },
+    { "symm",      CUDD_REORDER_SYMM_SIFT },
+    { "group",     CUDD_REORDER_GROUP_SIFT },
+    { "groupconv", CUDD_REORDER_GROUP_SIFT_CONV },
+    { "window2",   CUDD_REORDER_WINDOW2 },
+    { "window3",   CUDD_REORDER_WINDOW3 },
+    { "window4",   CUDD_REORDER_WINDOW4 },
+    { "linear",    CUDD_REORDER_LINEAR },
+    { "anneal",    CUDD_REORDER_ANNEALING },
+    { "genetic",   CUDD_REORDER_GENETIC },
+    { "exact",     CUDD_REORDER_EXACT },
+    { NULL,        CUDD_REORDER_NONE }
+};
+
+int shadow_reorder_method(char *name) {
+    int i;
+    for (i = 0; reorder_methods[i].name; i++) {
+	if (strcmp(name, reorder_methods[i].name) == 0)
+	    return i;
+    }
+    return -1;
+}
+
+char *shadow_reorder_method_name(int method) {
+    int i;
+    for (i = 0; reorder_methods[i].name; i++) {
+	if (i == method)
+	    return reorder_methods[i].name;
+    }
+    return NULL;
+}
+
+static bool can_reorder(shadow_mgr mgr) {
+    if (!mgr->do_cudd) {
+	err(false, "Variable reordering requires CUDD");
+	return false;
+    }
+    if (mgr->chaining != CHAIN_NONE) {
+	err(false, "Variable reordering not supported with chaining");
+	return false;
+    }
+    return true;
+}
+
+bool shadow_autoreorder(shadow_mgr mgr, int method) {
+    if (!can_reorder(mgr))
+	return false;
+    if (method <= 0)
+	Cudd_AutodynDisable(mgr->bdd_manager);
+    else
+	Cudd_AutodynEnable(mgr->bdd_manager, reorder_methods[method].method);
+    return true;
+}
+
+bool shadow_reorder(shadow_mgr mgr, int method) {
+    if (!can_reorder(mgr))
+	return false;
+    if (method <= 0)
+	return true;
+    return Cudd_ReduceHeap(mgr->bdd_manager, reorder_methods[method].method, 1) == 1;
+}
+
+void shadow_reorder_limits(shadow_mgr mgr, size_t threshold, double max_growth, int max_sift_vars) {
+    if (!mgr->do_cudd)
+	return;
+    if (threshold > 0)
+	Cudd_SetNextReordering(mgr->bdd_manager, (unsigned) threshold);
+    if (max_growth > 1.0)
+	Cudd_SetMaxGrowth(mgr->bdd_manager, max_growth);
+    if (max_sift_vars > 0)
+	Cudd_SetSiftMaxVar(mgr->bdd_manager, max_sift_vars);
+}
+
+bool shadow_group_variables(shadow_mgr mgr, int low_index, int count, bool fixed) {
+    if (!can_reorder(mgr))
+	return false;
+    return Cudd_MakeTreeNode(mgr->bdd_manager, (unsigned) low_index, (unsigned) count,
+			     fixed ? MTR_FIXED : MTR_DEFAULT) != NULL;
+}
+
+bool shadow_set_order(shadow_mgr mgr, int *order) {
+    if (!can_reorder(mgr))
+	return false;
+    return Cudd_ShuffleHeap(mgr->bdd_manager, order) == 1;
+}
+
 /* Compute similarity metric for support sets of two functions */
 double shadow_similarity(shadow_mgr mgr, ref_t r1, ref_t r2) {
     if (!mgr->do_cudd)
@@ -1807,10 +2689,347 @@ void shadow_status(shadow_mgr mgr) {
 
 }
 
+/* Compact storage format for BDDs.
+   Header consists of magic string, flag byte, and the 8-byte (little-endian) lengths
+   of the encoding before and after compression.
+   The encoding is a sequence of unsigned varints:
+   node count, then for each node (children before parents) the zigzag-coded
+   difference between its variable index and that of the previous node,
+   followed by its then and else edges.  An edge from node i to node j
+   is coded as ((i-j) << 1) | complement, with node 0 being the constant one.
+   A final edge, from node count+1, gives the root.
+
+   Files holding multiple named roots have a different magic string.
+   When all roots allow the compact encoding, their nodes are shared:
+   the node list is followed by the number of roots and then, for each root,
+   its edge (from node count+1) and the length and characters of its name.
+   Otherwise (flag COMPACT_SEPARATE), the encoding gives the number of roots,
+   and then for each root, the length and characters of its name
+   and the length and bytes of its individually stored form.
+*/
+#define COMPACT_MAGIC "CBDD"
+#define COMPACT_MULTI_MAGIC "CBDM"
+#define COMPACT_MAGIC_LEN 4
+#define COMPACT_HEADER_LEN (COMPACT_MAGIC_LEN + 1 + 8 + 8)
+#define COMPACT_ZLIB 0x1
+#define COMPACT_SEPARATE 0x2
+
+/* Parameters */
+int compact_store = 1;
+int store_compress_level = 0;
+
+/* Growable byte buffer */
+typedef struct {
+    unsigned char *buf;
+    size_t len;
+    size_t alloc;
+} byte_buf;
+
+static void bb_put(byte_buf *bb, uint64_t v) {
+    if (bb->len + 10 > bb->alloc) {
+	size_t nalloc = 2 * bb->alloc + 10;
+	bb->buf = realloc_or_fail(bb->buf, bb->alloc, nalloc, "bb_put");
+	bb->alloc = nalloc;
+    }
+    while (v >= 0x80) {
+	bb->buf[bb->len++] = (unsigned char) (v | 0x80);
+	v >>= 7;
+    }
+    bb->buf[bb->len++] = (unsigned char) v;
+}
+
+static bool bb_get(unsigned char *buf, size_t len, size_t *posp, uint64_t *vp) {
+    uint64_t v = 0;
+    int shift = 0;
+    size_t pos = *posp;
+    while (pos < len && shift < 64) {
+	unsigned char b = buf[pos++];
+	v |= (uint64_t) (b & 0x7F) << shift;
+	if ((b & 0x80) == 0) {
+	    *posp = pos;
+	    *vp = v;
+	    return true;
+	}
+	shift += 7;
+    }
+    return false;
+}
+
+static void put_word(unsigned char *dest, uint64_t v) {
+    int i;
+    for (i = 0; i < 8; i++)
+	dest[i] = (unsigned char) (v >> (8*i));
+}
+
+static uint64_t get_word(unsigned char *src) {
+    uint64_t v = 0;
+    int i;
+    for (i = 0; i < 8; i++)
+	v |= (uint64_t) src[i] << (8*i);
+    return v;
+}
+
+/* Append length and contents of byte sequence */
+static void bb_put_bytes(byte_buf *bb, unsigned char *src, size_t n) {
+    bb_put(bb, n);
+    if (bb->len + n > bb->alloc) {
+	size_t nalloc = 2 * bb->alloc + n;
+	bb->buf = realloc_or_fail(bb->buf, bb->alloc, nalloc, "bb_put_bytes");
+	bb->alloc = nalloc;
+    }
+    memcpy(bb->buf + bb->len, src, n);
+    bb->len += n;
+}
+
+/* Retrieve byte sequence written by bb_put_bytes.  Sets *srcp to point within buf */
+static bool bb_get_bytes(unsigned char *buf, size_t len, size_t *posp, unsigned char **srcp, size_t *np) {
+    uint64_t n;
+    if (!bb_get(buf, len, posp, &n) || n > len - *posp)
+	return false;
+    *srcp = buf + *posp;
+    *np = (size_t) n;
+    *posp += n;
+    return true;
+}
+
+/* List nodes, children before parents, assigning ids starting at 1 */
+static void compact_collect(DdNode *n, keyvalue_table_ptr ids, DdNode ***nodesp, size_t *countp, size_t *allocp) {
+    word_t id;
+    if (Cudd_IsConstant(n) || keyvalue_find(ids, (word_t) n, &id))
+	return;
+    compact_collect(Cudd_Regular(Cudd_T(n)), ids, nodesp, countp, allocp);
+    compact_collect(Cudd_Regular(Cudd_E(n)), ids, nodesp, countp, allocp);
+    if (*countp == *allocp) {
+	size_t nalloc = 2 * *allocp;
+	*nodesp = realloc_or_fail(*nodesp, *allocp * sizeof(DdNode *), nalloc * sizeof(DdNode *), "compact_collect");
+	*allocp = nalloc;
+    }
+    (*nodesp)[(*countp)++] = n;
+    keyvalue_insert(ids, (word_t) n, (word_t) *countp);
+}
+
+static uint64_t compact_edge(keyvalue_table_ptr ids, DdNode *e, word_t from) {
+    DdNode *n = Cudd_Regular(e);
+    word_t id = 0;
+    if (!Cudd_IsConstant(n))
+	keyvalue_find(ids, (word_t) n, &id);
+    return ((from - id) << 1) | (Cudd_IsComplement(e) ? 1 : 0);
+}
+
+/* Can BDD be stored in compact format?  Chained nodes require the generic format */
+static bool compact_ok(shadow_mgr mgr, ref_t r) {
+    return compact_store && mgr->chaining == CHAIN_NONE && is_bdd(mgr, r);
+}
+
+static void bb_init(byte_buf *bb) {
+    bb->alloc = 1024;
+    bb->buf = malloc_or_fail(bb->alloc, "bb_init");
+    bb->len = 0;
+}
+
+/* Encode all nodes reachable from roots, recording their ids.  Returns node count */
+static size_t compact_put_nodes(byte_buf *bb, DdNode **roots, int nroots, keyvalue_table_ptr ids) {
+    size_t count = 0;
+    size_t alloc = 1024;
+    DdNode **nodes = calloc_or_fail(alloc, sizeof(DdNode *), "compact_put_nodes");
+    int r;
+    for (r = 0; r < nroots; r++)
+	compact_collect(Cudd_Regular(roots[r]), ids, &nodes, &count, &alloc);
+    bb_put(bb, count);
+    int last_index = 0;
+    size_t i;
+    for (i = 0; i < count; i++) {
+	DdNode *n = nodes[i];
+	int index = Cudd_NodeReadIndex(n);
+	int delta = index - last_index;
+	last_index = index;
+	bb_put(bb, delta >= 0 ? 2 * (uint64_t) delta : 2 * (uint64_t) (-(int64_t) delta) - 1);
+	bb_put(bb, compact_edge(ids, Cudd_T(n), i+1));
+	bb_put(bb, compact_edge(ids, Cudd_E(n), i+1));
+    }
+    free_array(nodes, alloc, sizeof(DdNode *));
+    return count;
+}
+
+/* Write header and (optionally compressed) encoding.  Frees buffer */
+static bool compact_emit(byte_buf *bb, char *magic, unsigned char flags, size_t count, FILE *outfile) {
+    unsigned char header[COMPACT_HEADER_LEN];
+    unsigned char *data = bb->buf;
+    size_t data_len = bb->len;
+#ifdef HAVE_ZLIB
+    unsigned char *zbuf = NULL;
+    uLongf zlen = 0;
+    if (store_compress_level > 0) {
+	zlen = compressBound(bb->len);
+	zbuf = malloc_or_fail(zlen, "compact_emit");
+	if (compress2(zbuf, &zlen, bb->buf, bb->len, store_compress_level) == Z_OK) {
+	    data = zbuf;
+	    data_len = zlen;
+	    flags |= COMPACT_ZLIB;
+	} else
+	    err(false, "Compression failed.  Storing uncompressed DD");
+    }
+#else
+    if (store_compress_level > 0)
+	report(3, "Compiled without zlib.  Storing uncompressed DD");
+#endif
+    memcpy(header, magic, COMPACT_MAGIC_LEN);
+    header[COMPACT_MAGIC_LEN] = flags;
+    put_word(header + COMPACT_MAGIC_LEN + 1, bb->len);
+    put_word(header + COMPACT_MAGIC_LEN + 9, data_len);
+    bool ok = fwrite(header, 1, COMPACT_HEADER_LEN, outfile) == COMPACT_HEADER_LEN
+	&& fwrite(data, 1, data_len, outfile) == data_len;
+    report(4, "Stored %zd nodes in %zd bytes", count, COMPACT_HEADER_LEN + data_len);
+#ifdef HAVE_ZLIB
+    if (zbuf)
+	free_block(zbuf, compressBound(bb->len));
+#endif
+    free_block(bb->buf, bb->alloc);
+    return ok;
+}
+
+static bool compact_write(shadow_mgr mgr, DdNode *root, FILE *outfile) {
+    keyvalue_table_ptr ids = word_keyvalue_new();
+    byte_buf bb;
+    bb_init(&bb);
+    size_t count = compact_put_nodes(&bb, &root, 1, ids);
+    bb_put(&bb, compact_edge(ids, root, count+1));
+    keyvalue_free(ids);
+    return compact_emit(&bb, COMPACT_MAGIC, 0, count, outfile);
+}
+
+/* Check header and decompress if needed.
+   Sets *datap and *lenp to encoding.  *ubufp set to buffer that must be freed (or NULL) */
+static bool compact_unpack(unsigned char *buf, size_t bytes, unsigned char **datap, size_t *lenp, unsigned char **ubufp) {
+    *ubufp = NULL;
+    if (bytes < COMPACT_HEADER_LEN) {
+	err(false, "Truncated DD header");
+	return false;
+    }
+    unsigned char flags = buf[COMPACT_MAGIC_LEN];
+    size_t len = get_word(buf + COMPACT_MAGIC_LEN + 1);
+    size_t data_len = get_word(buf + COMPACT_MAGIC_LEN + 9);
+    if (data_len > bytes - COMPACT_HEADER_LEN) {
+	err(false, "Truncated DD file");
+	return false;
+    }
+    unsigned char *data = buf + COMPACT_HEADER_LEN;
+    if (flags & COMPACT_ZLIB) {
+#ifdef HAVE_ZLIB
+	uLongf ulen = len;
+	unsigned char *ubuf = malloc_or_fail(len, "compact_unpack");
+	if (uncompress(ubuf, &ulen, data, data_len) != Z_OK || ulen != len) {
+	    err(false, "Failed to decompress DD");
+	    free_block(ubuf, len);
+	    return false;
+	}
+	*ubufp = ubuf;
+	data = ubuf;
+#else
+	err(false, "Compressed DD requires zlib support");
+	return false;
+#endif
+    } else
+	len = data_len;
+    *datap = data;
+    *lenp = len;
+    return true;
+}
+
+/* Release references to decoded nodes */
+static void compact_release(DdManager *dd, DdNode **nodes, size_t count) {
+    size_t j;
+    for (j = 1; j <= count; j++)
+	if (nodes[j])
+	    Cudd_RecursiveDeref(dd, nodes[j]);
+    free_array(nodes, count+1, sizeof(DdNode *));
+}
+
+/* Rebuild nodes from encoding in a single pass.
+   Returns array of referenced nodes, indexed by id, or NULL on failure */
+static DdNode **compact_get_nodes(shadow_mgr mgr, unsigned char *data, size_t len, size_t *posp, size_t *countp) {
+    DdManager *dd = mgr->bdd_manager;
+    uint64_t count, v, tcode, ecode;
+    int index = 0;
+    int nvars = Cudd_ReadSize(dd);
+    size_t i;
+    if (!bb_get(data, len, posp, &count) || count > len)
+	return NULL;
+    DdNode **nodes = calloc_or_fail(count+1, sizeof(DdNode *), "compact_get_nodes");
+    nodes[0] = Cudd_ReadOne(dd);
+    for (i = 1; i <= count; i++) {
+	if (!bb_get(data, len, posp, &v) || !bb_get(data, len, posp, &tcode) || !bb_get(data, len, posp, &ecode))
+	    break;
+	index += (v & 0x1) ? -(int) ((v+1) >> 1) : (int) (v >> 1);
+	size_t tdelta = tcode >> 1;
+	size_t edelta = ecode >> 1;
+	if (index < 0 || index >= nvars || tdelta < 1 || tdelta > i || edelta < 1 || edelta > i) {
+	    err(false, "Invalid node #%zd in DD file", i);
+	    break;
+	}
+	DdNode *tn = Cudd_NotCond(nodes[i-tdelta], tcode & 0x1);
+	DdNode *en = Cudd_NotCond(nodes[i-edelta], ecode & 0x1);
+	DdNode *n = Cudd_bddIte(dd, Cudd_bddIthVar(dd, index), tn, en);
+	if (n == NULL) {
+	    err(false, "Ran out of memory loading DD");
+	    break;
+	}
+	Cudd_Ref(n);
+	nodes[i] = n;
+    }
+    if (i <= count) {
+	compact_release(dd, nodes, count);
+	return NULL;
+    }
+    *countp = count;
+    return nodes;
+}
+
+/* Decode root edge and create referenced ref */
+static ref_t compact_get_root(shadow_mgr mgr, DdNode **nodes, size_t count, unsigned char *data, size_t len, size_t *posp) {
+    uint64_t v;
+    if (!bb_get(data, len, posp, &v))
+	return REF_INVALID;
+    size_t rdelta = v >> 1;
+    if (rdelta < 1 || rdelta > count+1)
+	return REF_INVALID;
+    DdNode *rn = Cudd_NotCond(nodes[count+1-rdelta], v & 0x1);
+    reference_dd(mgr, rn);
+    return dd2ref(rn, IS_BDD);
+}
+
+/* Rebuild BDD from compact encoding */
+static ref_t compact_read(shadow_mgr mgr, unsigned char *buf, size_t bytes) {
+    unsigned char *data, *ubuf;
+    size_t len;
+    ref_t r = REF_INVALID;
+    if (!compact_unpack(buf, bytes, &data, &len, &ubuf))
+	return r;
+    size_t pos = 0;
+    size_t count = 0;
+    DdNode **nodes = compact_get_nodes(mgr, data, len, &pos, &count);
+    if (nodes) {
+	r = compact_get_root(mgr, nodes, count, data, len, &pos);
+	/* Release intermediate references */
+	compact_release(mgr->bdd_manager, nodes, count);
+    }
+    if (ubuf)
+	free_block(ubuf, len);
+    if (REF_IS_INVALID(r))
+	err(false, "Failed to decode compact DD");
+    return r;
+}
+
+static bool is_compact(unsigned char *buf, size_t bytes) {
+    return bytes >= COMPACT_MAGIC_LEN && memcmp(buf, COMPACT_MAGIC, COMPACT_MAGIC_LEN) == 0;
+}
+
 bool shadow_store(shadow_mgr mgr, ref_t r, FILE *outfile) {
     if (!mgr->do_cudd)
 	return false;
     DdNode *nd = ref2dd(mgr, r);;
+    if (compact_ok(mgr, r))
+	return compact_write(mgr, nd, outfile);
     dd_type_t dtype = find_type(mgr, r);
     dd_store_t stype = (dd_store_t) dtype;
     int ok = Cudd_ddStore(mgr->bdd_manager, nd, outfile, stype);
@@ -1823,6 +3042,33 @@ ref_t shadow_load(shadow_mgr mgr, FILE *infile) {
     dd_store_t stype = CUDD_STORED_BDD;
     if (!mgr->do_cudd)
 	return r;
+    /* Check for compact format */
+    long start = ftell(infile);
+    unsigned char magic[COMPACT_MAGIC_LEN];
+    size_t got = fread(magic, 1, COMPACT_MAGIC_LEN, infile);
+    if (is_compact(magic, got)) {
+	size_t alloc = 1 << 16;
+	size_t bytes = got;
+	unsigned char *buf = malloc_or_fail(alloc, "shadow_load");
+	memcpy(buf, magic, got);
+	while (true) {
+	    if (bytes == alloc) {
+		buf = realloc_or_fail(buf, alloc, 2 * alloc, "shadow_load");
+		alloc *= 2;
+	    }
+	    size_t n = fread(buf + bytes, 1, alloc - bytes, infile);
+	    if (n == 0)
+		break;
+	    bytes += n;
+	}
+	r = compact_read(mgr, buf, bytes);
+	free_block(buf, alloc);
+	return r;
+    }
+    if (start < 0 || fseek(infile, start, SEEK_SET) != 0) {
+	err(false, "Couldn't reposition DD file");
+	return r;
+    }
     DdNode *nd = Cudd_ddLoad(mgr->bdd_manager, infile, &stype);
     reference_dd(mgr, nd);
     dd_type_t dtype = (dd_type_t) stype;
@@ -1832,6 +3078,193 @@ ref_t shadow_load(shadow_mgr mgr, FILE *infile) {
     return r;
 }
 
+ref_t shadow_load_buffer(shadow_mgr mgr, unsigned char *buf, size_t bytes) {
+    if (!mgr->do_cudd || bytes == 0)
+	return REF_INVALID;
+    if (is_compact(buf, bytes))
+	return compact_read(mgr, buf, bytes);
+    FILE *infile = fmemopen(buf, bytes, "r");
+    if (infile == NULL)
+	return REF_INVALID;
+    ref_t r = shadow_load(mgr, infile);
+    fclose(infile);
+    return r;
+}
+
+ref_t shadow_load_file(shadow_mgr mgr, char *fname) {
+    if (!mgr->do_cudd)
+	return REF_INVALID;
+    int fd = open(fname, O_RDONLY);
+    if (fd < 0)
+	return REF_INVALID;
+    struct stat sb;
+    ref_t r = REF_INVALID;
+    if (fstat(fd, &sb) == 0 && sb.st_size > 0) {
+	size_t bytes = (size_t) sb.st_size;
+	void *map = mmap(NULL, bytes, PROT_READ, MAP_PRIVATE, fd, 0);
+	if (map != MAP_FAILED) {
+	    r = shadow_load_buffer(mgr, (unsigned char *) map, bytes);
+	    munmap(map, bytes);
+	}
+    }
+    close(fd);
+    return r;
+}
+
+
+/* Store named DDs in single file, sharing nodes when possible */
+bool shadow_store_roots(shadow_mgr mgr, int nroots, ref_t *roots, char **names, FILE *outfile) {
+    if (!mgr->do_cudd)
+	return false;
+    bool shared = true;
+    bool ok = true;
+    int i;
+    for (i = 0; i < nroots; i++)
+	shared = shared && compact_ok(mgr, roots[i]);
+    byte_buf bb;
+    bb_init(&bb);
+    size_t count = 0;
+    unsigned char flags = 0;
+    if (shared) {
+	DdNode **nds = calloc_or_fail(nroots, sizeof(DdNode *), "shadow_store_roots");
+	for (i = 0; i < nroots; i++)
+	    nds[i] = ref2dd(mgr, roots[i]);
+	keyvalue_table_ptr ids = word_keyvalue_new();
+	count = compact_put_nodes(&bb, nds, nroots, ids);
+	bb_put(&bb, nroots);
+	for (i = 0; i < nroots; i++) {
+	    bb_put(&bb, compact_edge(ids, nds[i], count+1));
+	    bb_put_bytes(&bb, (unsigned char *) names[i], strlen(names[i]));
+	}
+	keyvalue_free(ids);
+	free_array(nds, nroots, sizeof(DdNode *));
+    } else {
+	flags |= COMPACT_SEPARATE;
+	bb_put(&bb, nroots);
+	for (i = 0; ok && i < nroots; i++) {
+	    bb_put_bytes(&bb, (unsigned char *) names[i], strlen(names[i]));
+	    char *mbuf = NULL;
+	    size_t msize = 0;
+	    FILE *mfile = open_memstream(&mbuf, &msize);
+	    if (mfile == NULL) {
+		err(false, "Couldn't create buffer for DD");
+		ok = false;
+		break;
+	    }
+	    ok = shadow_store(mgr, roots[i], mfile);
+	    fclose(mfile);
+	    if (ok)
+		bb_put_bytes(&bb, (unsigned char *) mbuf, msize);
+	    free(mbuf);
+	}
+    }
+    if (!ok) {
+	free_block(bb.buf, bb.alloc);
+	return false;
+    }
+    return compact_emit(&bb, COMPACT_MULTI_MAGIC, flags, count, outfile);
+}
+
+/* Copy byte sequence into newly allocated string */
+static char *compact_name(unsigned char *src, size_t n) {
+    char *name = malloc_or_fail(n+1, "compact_name");
+    memcpy(name, src, n);
+    name[n] = '\0';
+    return name;
+}
+
+static int load_roots_buffer(shadow_mgr mgr, unsigned char *buf, size_t bytes, ref_t **rootsp, char ***namesp) {
+    unsigned char *data, *ubuf;
+    size_t len;
+    if (bytes < COMPACT_MAGIC_LEN || memcmp(buf, COMPACT_MULTI_MAGIC, COMPACT_MAGIC_LEN) != 0) {
+	err(false, "Not a multi-root DD file");
+	return -1;
+    }
+    if (!compact_unpack(buf, bytes, &data, &len, &ubuf))
+	return -1;
+    bool separate = (buf[COMPACT_MAGIC_LEN] & COMPACT_SEPARATE) != 0;
+    size_t pos = 0;
+    size_t count = 0;
+    DdNode **nodes = NULL;
+    uint64_t nroots = 0;
+    ref_t *roots = NULL;
+    char **names = NULL;
+    int i = 0;
+    bool ok = true;
+    if (!separate) {
+	nodes = compact_get_nodes(mgr, data, len, &pos, &count);
+	ok = nodes != NULL;
+    }
+    ok = ok && bb_get(data, len, &pos, &nroots) && nroots <= len;
+    if (ok) {
+	roots = calloc_or_fail(nroots, sizeof(ref_t), "shadow_load_roots");
+	names = calloc_or_fail(nroots, sizeof(char *), "shadow_load_roots");
+    }
+    for (i = 0; ok && i < nroots; i++) {
+	unsigned char *src;
+	size_t n;
+	ref_t r = REF_INVALID;
+	if (separate) {
+	    unsigned char *seg;
+	    size_t nseg;
+	    if (bb_get_bytes(data, len, &pos, &src, &n) && bb_get_bytes(data, len, &pos, &seg, &nseg))
+		r = shadow_load_buffer(mgr, seg, nseg);
+	} else {
+	    r = compact_get_root(mgr, nodes, count, data, len, &pos);
+	    if (!REF_IS_INVALID(r) && !bb_get_bytes(data, len, &pos, &src, &n)) {
+		shadow_deref(mgr, r);
+		r = REF_INVALID;
+	    }
+	}
+	if (REF_IS_INVALID(r)) {
+	    ok = false;
+	    break;
+	}
+	roots[i] = r;
+	names[i] = compact_name(src, n);
+    }
+    if (nodes)
+	compact_release(mgr->bdd_manager, nodes, count);
+    if (ubuf)
+	free_block(ubuf, len);
+    if (!ok) {
+	int j;
+	for (j = 0; j < i; j++) {
+	    shadow_deref(mgr, roots[j]);
+	    free_string(names[j]);
+	}
+	if (roots) {
+	    free_array(roots, nroots, sizeof(ref_t));
+	    free_array(names, nroots, sizeof(char *));
+	}
+	err(false, "Failed to decode multi-root DD file");
+	return -1;
+    }
+    *rootsp = roots;
+    *namesp = names;
+    return (int) nroots;
+}
+
+int shadow_load_roots(shadow_mgr mgr, char *fname, ref_t **rootsp, char ***namesp) {
+    if (!mgr->do_cudd)
+	return -1;
+    int fd = open(fname, O_RDONLY);
+    if (fd < 0)
+	return -1;
+    struct stat sb;
+    int nroots = -1;
+    if (fstat(fd, &sb) == 0 && sb.st_size > 0) {
+	size_t bytes = (size_t) sb.st_size;
+	void *map = mmap(NULL, bytes, PROT_READ, MAP_PRIVATE, fd, 0);
+	if (map != MAP_FAILED) {
+	    nroots = load_roots_buffer(mgr, (unsigned char *) map, bytes, rootsp, namesp);
+	    munmap(map, bytes);
+	}
+    }
+    close(fd);
+    return nroots;
+}
+
 
 /* Count of number of cache lookups since last call */
 size_t shadow_delta_cache_lookups(shadow_mgr mgr) {
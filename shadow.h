@@ -37,6 +37,8 @@ typedef struct {
     bool do_cudd;
     bool do_local;
     bool do_dist;
+    /* Type of chaining used by CUDD */
+    chaining_t chaining;
     /* Total number of variables created */
     size_t nvars;
     /* Total number of ZDD variables created */
@@ -44,9 +46,14 @@ typedef struct {
 } shadow_ele, *shadow_mgr;
 
 /* Maintaining set of variable indices */
+/* Indices are kept in ascending order.
+   Bitmap form is built on first use by comparison and membership operations,
+   and remains valid until set is modified by index_set_remove */
 typedef struct {
     int count;
     int *indices;
+    int nwords;      // Number of words in bitmap
+    uint64_t *bits;  // Bitmap (NULL if not built)
 } index_set;
 
 shadow_mgr new_shadow_mgr(bool do_cudd, bool do_local, bool do_dist, chaining_t chaining);
@@ -69,6 +76,11 @@ ref_t shadow_cm_restrict(shadow_mgr mgr, ref_t fref, ref_t cref);
 ref_t shadow_and(shadow_mgr mgr, ref_t aref, ref_t bref);
 ref_t shadow_soft_and(shadow_mgr mgr, ref_t aref, ref_t bref, size_t nodeLimit, size_t lookupLimit);
 ref_t shadow_and_limit(shadow_mgr mgr, ref_t aref, ref_t bref, size_t nodeLimit, size_t lookupLimit);
+/* Evaluate limited conjunctions of count pairs concurrently.
+   Once one succeeds, the rest are cancelled.  Failed or cancelled results are REF_INVALID.
+   Fills in number of cache lookups for each pair.  Returns number of successful results */
+int shadow_and_limit_parallel(shadow_mgr mgr, int count, ref_t *arefs, ref_t *brefs,
+			      size_t nodeLimit, size_t *lookupLimits, ref_t *results, size_t *lookups);
 ref_t shadow_or(shadow_mgr mgr, ref_t aref, ref_t bref);
 ref_t shadow_xor(shadow_mgr mgr, ref_t aref, ref_t bref);
 
@@ -85,6 +97,19 @@ ref_t shadow_aconvert(shadow_mgr mgr, ref_t r);
 /* Print satisfying values for ADD/BDD/ZDD.  Only works for CUDD */
 void shadow_satisfy(shadow_mgr mgr, ref_t r);
 
+/* Bounded enumeration or random sampling of solutions to BDD.  Only works for CUDD */
+typedef struct {
+    size_t limit;     // Maximum number of cubes to generate (0 = no limit)
+    size_t cursor;    // Number of cubes to skip before generating
+    size_t samples;   // If nonzero, generate this many random solutions, rather than cubes
+    bool packed;      // Write as hexadecimal, with variable i as bit i
+    FILE *outfile;    // Destination
+} satisfy_options;
+
+/* Returns number of cubes or solutions generated, or -1 if can't be done.
+   For enumeration, sets *next_cursor to cursor for resuming (0 if all cubes generated) */
+long shadow_satisfy_bounded(shadow_mgr mgr, ref_t r, satisfy_options *opts, size_t *next_cursor);
+
 /* Create key-value table mapping set of root nodes to their densities. */
 keyvalue_table_ptr shadow_density(shadow_mgr mgr, set_ptr roots);
 
@@ -98,18 +123,52 @@ double shadow_similarity(shadow_mgr mgr, ref_t r1, ref_t r2);
 /* Wrapper for Cudd_SupportIndices.  Creates new index set */
 index_set *shadow_support_indices(shadow_mgr mgr, ref_t r);
 
+/* Position of variable with given index in current variable order */
+int shadow_index_level(shadow_mgr mgr, int index);
+/* Index of variable at given position in current variable order */
+int shadow_level_index(shadow_mgr mgr, int level);
+
+/* Variable ordering (CUDD only).
+   Methods are identified by number.  Method 0 (none) disables reordering */
+/* Find method by name.  Returns -1 if not found */
+int shadow_reorder_method(char *name);
+/* Name of method.  Returns NULL if invalid */
+char *shadow_reorder_method_name(int method);
+/* Enable or disable dynamic reordering */
+bool shadow_autoreorder(shadow_mgr mgr, int method);
+/* Reorder now */
+bool shadow_reorder(shadow_mgr mgr, int method);
+/* Set trigger threshold (nodes), max growth during sifting, and max variables sifted.
+   Nonpositive values leave setting unchanged */
+void shadow_reorder_limits(shadow_mgr mgr, size_t threshold, double max_growth, int max_sift_vars);
+/* Keep count variables, starting with low_index, contiguous during reordering.
+   Fixed groups are not reordered internally */
+bool shadow_group_variables(shadow_mgr mgr, int low_index, int count, bool fixed);
+/* Impose variable order.  order[level] gives index of variable at each level */
+bool shadow_set_order(shadow_mgr mgr, int *order);
+
 /* Free index set */
 void index_set_free(index_set *iset);
 
 /* Duplicate index set */
 index_set *index_set_duplicate(index_set *iset);
 
+/* Test for membership */
+bool index_set_member(index_set *iset, int v);
+
+/* Create index set holding union of two sets */
+index_set *index_set_union(index_set *iset1, index_set *iset2);
+
 /* Remove indices from index set */
 void index_set_remove(index_set *set, index_set *rset);
 
 /* Existential quantification over variables in index set */
 ref_t index_equant(shadow_mgr mgr, ref_t r, index_set *iset);
 
+/* Conjunction combined with existential quantification over variables in index set.
+   Returns REF_INVALID if result would exceed nodeLimit (0 == no limit) */
+ref_t index_and_equant(shadow_mgr mgr, ref_t aref, ref_t bref, index_set *iset, size_t nodeLimit);
+
 /* Based on indices retrieved by Cudd_SupportIndices() */
 double index_similarity(index_set *iset1, index_set *iset2);
 
@@ -126,6 +185,17 @@ keyvalue_table_ptr shadow_count(shadow_mgr mgr, set_ptr roots);
 
 double cudd_single_count(shadow_mgr mgr, ref_t r);
 
+/*
+  Count solutions of multiple functions in one pass, sharing memoized
+  counts for common subgraphs.  When proj is non-NULL, count the projections
+  onto the nproj variables with indices in proj (the other variables are
+  existentially quantified).  Floating-point counts are stored in fcounts.
+  When exact is non-NULL, exact counts are also computed and stored as
+  decimal strings (free with free_string).  Returns false on failure.
+*/
+bool shadow_count_roots(shadow_mgr mgr, int nroots, ref_t *roots, int nproj, int *proj,
+			double *fcounts, char **exact);
+
 /* Compute set of variables (given by refs) in support of set of roots */
 set_ptr shadow_support(shadow_mgr mgr, set_ptr roots);
 
@@ -140,6 +210,27 @@ int cudd_collect(shadow_mgr mgr);
 
 size_t shadow_peak_nodes(shadow_mgr mgr);
 
+/* Cumulative CUDD counters, for profiling */
+typedef struct {
+    size_t nodes;        /* Nodes currently in unique table */
+    size_t peak_nodes;   /* Peak number of live nodes */
+    size_t lookups;      /* Cache lookups */
+    size_t hits;         /* Cache hits */
+    size_t gcs;          /* Garbage collections */
+    double reorder_secs; /* Time spent reordering */
+} shadow_stats;
+
+/* Read counters.  All zero when not using CUDD */
+void shadow_read_stats(shadow_mgr mgr, shadow_stats *stats);
+
+/* Memory governor support */
+/* Size CUDD's cache and table growth to fit within budget.  Limits are soft */
+void shadow_set_memory_budget(shadow_mgr mgr, size_t budget_bytes);
+/* Bytes allocated by CUDD */
+size_t shadow_memory_in_use(shadow_mgr mgr);
+/* Estimated bytes held by live CUDD nodes */
+size_t shadow_live_bytes(shadow_mgr mgr);
+
 /* Create key-value table mapping set of root nodes to their restrictions,
    with respect to a set of literals (given as a set of refs)
 */
@@ -166,8 +257,24 @@ void shadow_collect(shadow_mgr mgr, set_ptr roots);
 void shadow_status(shadow_mgr mgr);
 
 /* Load and store */
+/* Should BDDs be stored in compact format (when not chaining)? */
+extern int compact_store;
+/* zlib compression level for compact format (0 = none).  Requires HAVE_ZLIB */
+extern int store_compress_level;
+
 ref_t shadow_load(shadow_mgr mgr, FILE *infile);
 bool shadow_store(shadow_mgr mgr, ref_t r, FILE *outfile);
+/* Load DD held in memory */
+ref_t shadow_load_buffer(shadow_mgr mgr, unsigned char *buf, size_t bytes);
+/* Load DD from file using mmap */
+ref_t shadow_load_file(shadow_mgr mgr, char *fname);
+
+/* Store named DDs in single file.  Nodes are shared when all can use compact format */
+bool shadow_store_roots(shadow_mgr mgr, int nroots, ref_t *roots, char **names, FILE *outfile);
+/* Load named DDs stored by shadow_store_roots.  Returns number of roots, or -1 on failure.
+   Sets *rootsp to array of refs (each with a reference) and *namesp to array of names.
+   Caller must free arrays and names */
+int shadow_load_roots(shadow_mgr mgr, char *fname, ref_t **rootsp, char ***namesp);
 
 /* Count of number of cache lookups since last call */
 size_t shadow_delta_cache_lookups(shadow_mgr mgr);
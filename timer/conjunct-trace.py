@@ -0,0 +1,365 @@
+import sys, getopt, json
+
+'''
+Analyzes the conjunction traces written by runbdd (command "trace FILE").
+Each line of the trace is a JSON object, with field "ev" giving the event type:
+
+    start       New conjunction (dest, quantify, args)
+    arg         Initial argument (id, name, size, support)
+    update      Argument changed by soft-and or quantification (id, size, support)
+    candidates  Candidate pairs for a step, as [id1, id2, similarity]
+    try         Attempted AND (a, b, try, limit, ok, size, lookups, secs)
+    and         Chosen product of a step (a, b, id, size, support, tries, secs)
+    done        End of conjunction (steps, aborts, size)
+
+For each conjunction, the trace is replayed to find the time spent on
+successful and aborted tries, the critical path through the tree of
+combining steps (and hence the available parallelism), and the peak
+number of nodes held by the live arguments.
+
+The what-if analysis combines the initial arguments according to
+alternative pairing policies, without performing any BDD operations.
+The size of a product is taken from the trace when the same set of
+arguments was combined in the actual run, and otherwise estimated as the
+sum of the argument sizes times the median growth ratio observed in the trace.
+Estimates ignore soft-and simplification and quantification.
+'''
+
+policyNames = ['recorded', 'similarity', 'smallest', 'linear', 'balanced']
+policies = list(policyNames)
+selectConj = None
+verbosity = 0
+
+def usage(name):
+    print("Usage: %s [-h] [-v VERB] [-c CONJ] [-p POLICY,...] FILE ..." % name)
+    print("\t-h         Print this information")
+    print("\t-v VERB    Set verbosity level")
+    print("\t-c CONJ    Only analyze conjunction number CONJ")
+    print("\t-p POLICY  Compare pairing policies (comma-separated list from %s)" % ", ".join(policyNames))
+    sys.exit(0)
+
+class Conjunction:
+
+    def __init__(self, number, dest, quantify):
+        self.number = number
+        self.dest = dest
+        self.quantify = quantify
+        # Initial arguments: id --> (name, size, support)
+        self.args = {}
+        # Order in which arguments were given
+        self.argOrder = []
+        # Events after the start, in order
+        self.events = []
+        # Combining steps: list of "and" events
+        self.steps = []
+        # Tries, indexed by step
+        self.tries = {}
+        self.done = None
+
+    def add(self, e):
+        ev = e['ev']
+        self.events.append(e)
+        if ev == 'arg':
+            self.args[e['id']] = (e.get('name', str(e['id'])), e['size'], frozenset(e['support']))
+            self.argOrder.append(e['id'])
+        elif ev == 'update' and len(self.steps) == 0 and e['id'] in self.args:
+            # Preprocessing simplification of initial argument
+            (name, size, support) = self.args[e['id']]
+            self.args[e['id']] = (name, e['size'], frozenset(e['support']))
+        elif ev == 'try':
+            self.tries.setdefault(e['step'], []).append(e)
+        elif ev == 'and':
+            self.steps.append(e)
+        elif ev == 'done':
+            self.done = e
+
+'''
+Read all conjunctions from the files
+'''
+def readTrace(fileNames):
+    conjs = []
+    current = None
+    for fname in fileNames:
+        try:
+            infile = open(fname, 'r')
+        except IOError:
+            print("Couldn't open file '%s'" % fname)
+            continue
+        for line in infile:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                e = json.loads(line)
+            except ValueError:
+                if verbosity > 0:
+                    print("Ignoring line '%s'" % line)
+                continue
+            if e.get('ev') == 'start':
+                current = Conjunction(e['conj'], e.get('dest', ''), e.get('quantify', False))
+                conjs.append(current)
+            elif current is not None:
+                current.add(e)
+        infile.close()
+    if verbosity > 0:
+        print("Read %d conjunctions" % len(conjs))
+    return conjs
+
+'''
+Replay the recorded run.
+Returns dictionary of statistics
+'''
+def replay(conj):
+    stats = {}
+    live = {}
+    for id in conj.args:
+        live[id] = conj.args[id][1]
+    peak = sum(live.values())
+    maxArg = max(live.values()) if len(live) > 0 else 0
+    # Completion time of each argument along the combining tree
+    finish = {}
+    for id in conj.args:
+        finish[id] = 0.0
+    okSecs = 0.0
+    abortSecs = 0.0
+    aborts = 0
+    tries = 0
+    stepSecs = 0.0
+    last = None
+    for e in conj.events:
+        ev = e['ev']
+        if ev == 'update' and e['id'] in live:
+            live[e['id']] = e['size']
+        elif ev == 'try':
+            tries += 1
+            if e['ok']:
+                okSecs += e['secs']
+            else:
+                aborts += 1
+                abortSecs += e['secs']
+        elif ev == 'and':
+            (a, b, id) = (e['a'], e['b'], e['id'])
+            live.pop(a, None)
+            live.pop(b, None)
+            live[id] = e['size']
+            maxArg = max(maxArg, e['size'])
+            finish[id] = max(finish.get(a, 0.0), finish.get(b, 0.0)) + e['secs']
+            stepSecs += e['secs']
+            last = id
+        else:
+            continue
+        peak = max(peak, sum(live.values()))
+    stats['steps'] = len(conj.steps)
+    stats['tries'] = tries
+    stats['aborts'] = aborts
+    stats['okSecs'] = okSecs
+    stats['abortSecs'] = abortSecs
+    stats['stepSecs'] = stepSecs
+    stats['critical'] = finish[last] if last is not None else 0.0
+    stats['peak'] = peak
+    stats['maxArg'] = maxArg
+    return stats
+
+'''
+Find critical path as list of step events, working back from final product
+'''
+def criticalPath(conj):
+    byResult = {}
+    for e in conj.steps:
+        byResult[e['id']] = e
+    finish = {}
+    def getFinish(id):
+        if id not in byResult:
+            return 0.0
+        if id not in finish:
+            e = byResult[id]
+            finish[id] = max(getFinish(e['a']), getFinish(e['b'])) + e['secs']
+        return finish[id]
+    if len(conj.steps) == 0:
+        return []
+    path = []
+    id = conj.steps[-1]['id']
+    while id in byResult:
+        e = byResult[id]
+        path.append(e)
+        id = e['a'] if getFinish(e['a']) >= getFinish(e['b']) else e['b']
+    path.reverse()
+    return path
+
+'''
+Size model for what-if analysis.
+Products are identified by the set of initial arguments they cover
+'''
+class SizeModel:
+
+    def __init__(self, conj):
+        # Set of initial arguments --> recorded product size
+        self.known = {}
+        self.ratio = 1.0
+        self.exact = 0
+        self.estimated = 0
+        leaves = {}
+        sizes = {}
+        for id in conj.args:
+            leaves[id] = frozenset([id])
+            sizes[id] = conj.args[id][1]
+        ratios = []
+        for e in conj.steps:
+            (a, b, id) = (e['a'], e['b'], e['id'])
+            if a not in leaves or b not in leaves:
+                continue
+            leaves[id] = leaves[a] | leaves[b]
+            self.known[leaves[id]] = e['size']
+            sizes[id] = e['size']
+            denom = sizes.get(a, 0) + sizes.get(b, 0)
+            if denom > 0:
+                ratios.append(float(e['size']) / denom)
+        if len(ratios) > 0:
+            ratios.sort()
+            self.ratio = ratios[len(ratios) // 2]
+
+    def size(self, cover, size1, size2):
+        if cover in self.known:
+            self.exact += 1
+            return self.known[cover]
+        self.estimated += 1
+        return max(1, int((size1 + size2) * self.ratio))
+
+def jaccard(s1, s2):
+    u = len(s1 | s2)
+    return 1.0 if u == 0 else float(len(s1 & s2)) / u
+
+'''
+Choose pair of live elements according to policy
+'''
+def choosePair(policy, live):
+    n = len(live)
+    if policy == 'smallest':
+        order = sorted(range(n), key = lambda i : live[i][1])
+        return (order[0], order[1])
+    if policy == 'linear':
+        return (0, 1)
+    if policy == 'balanced':
+        # Combine elements of least depth, in order
+        order = sorted(range(n), key = lambda i : (live[i][3], i))
+        return tuple(sorted((order[0], order[1])))
+    # similarity
+    best = None
+    bestSim = -1.0
+    for i in range(n):
+        for j in range(i+1, n):
+            sim = jaccard(live[i][2], live[j][2])
+            if sim > bestSim:
+                (best, bestSim) = ((i, j), sim)
+    return best
+
+'''
+Combine arguments according to policy.
+Returns dictionary of statistics in units of nodes
+'''
+def whatIf(conj, policy, model):
+    stats = {}
+    model.exact = 0
+    model.estimated = 0
+    # Elements are (cover, size, support, depth, critical path work)
+    live = []
+    for id in conj.argOrder:
+        (name, size, support) = conj.args[id]
+        live.append((frozenset([id]), size, support, 0, 0))
+    peak = sum([ele[1] for ele in live])
+    maxArg = max([ele[1] for ele in live]) if len(live) > 0 else 0
+    work = 0
+    if policy == 'recorded':
+        index = {}
+        for (i, id) in enumerate(conj.argOrder):
+            index[id] = live[i]
+        for e in conj.steps:
+            if e['a'] not in index or e['b'] not in index:
+                continue
+            ele1 = index.pop(e['a'])
+            ele2 = index.pop(e['b'])
+            cover = ele1[0] | ele2[0]
+            size = model.size(cover, ele1[1], ele2[1])
+            work += size
+            index[e['id']] = (cover, size, ele1[2] | ele2[2], max(ele1[3], ele2[3]) + 1,
+                              max(ele1[4], ele2[4]) + size)
+            peak = max(peak, sum([ele[1] for ele in index.values()]))
+            maxArg = max(maxArg, size)
+        live = list(index.values())
+    else:
+        while len(live) > 1:
+            (i, j) = choosePair(policy, live)
+            (ele1, ele2) = (live[i], live[j])
+            cover = ele1[0] | ele2[0]
+            size = model.size(cover, ele1[1], ele2[1])
+            work += size
+            nele = (cover, size, ele1[2] | ele2[2], max(ele1[3], ele2[3]) + 1,
+                    max(ele1[4], ele2[4]) + size)
+            live = [live[k] for k in range(len(live)) if k != i and k != j]
+            live.insert(i, nele)
+            peak = max(peak, sum([ele[1] for ele in live]))
+            maxArg = max(maxArg, size)
+    stats['work'] = work
+    stats['critical'] = max([ele[4] for ele in live]) if len(live) > 0 else 0
+    stats['depth'] = max([ele[3] for ele in live]) if len(live) > 0 else 0
+    stats['peak'] = peak
+    stats['maxArg'] = maxArg
+    stats['exact'] = model.exact
+    stats['estimated'] = model.estimated
+    return stats
+
+def analyze(conj):
+    print("Conjunction #%d (%s): %d arguments%s" %
+          (conj.number, conj.dest, len(conj.args), ", with quantification" if conj.quantify else ""))
+    if conj.done is None:
+        print("\tTrace incomplete")
+    stats = replay(conj)
+    print("\tSteps %d.  Tries %d.  Aborts %d" % (stats['steps'], stats['tries'], stats['aborts']))
+    print("\tStep time %.3f.  Successful tries %.3f.  Aborted tries %.3f" %
+          (stats['stepSecs'], stats['okSecs'], stats['abortSecs']))
+    parallelism = stats['stepSecs'] / stats['critical'] if stats['critical'] > 0 else 1.0
+    print("\tCritical path %.3f (parallelism %.2fX)" % (stats['critical'], parallelism))
+    print("\tPeak live nodes %d.  Max argument %d" % (stats['peak'], stats['maxArg']))
+    if verbosity > 1:
+        for e in criticalPath(conj):
+            print("\t\tStep %d: %d & %d --> %d (%d nodes) %.3f secs" %
+                  (e['step'], e['a'], e['b'], e['id'], e['size'], e['secs']))
+    if len(policies) == 0 or len(conj.args) < 2:
+        return
+    model = SizeModel(conj)
+    print("\tWhat-if (growth ratio %.3f):" % model.ratio)
+    print("\t\t%-12s %12s %12s %12s %6s %10s" % ('policy', 'work', 'critical', 'peak', 'depth', 'exact'))
+    for p in policies:
+        ws = whatIf(conj, p, model)
+        total = ws['exact'] + ws['estimated']
+        print("\t\t%-12s %12d %12d %12d %6d %5d/%-4d" %
+              (p, ws['work'], ws['critical'], ws['peak'], ws['depth'], ws['exact'], total))
+
+def run(name, args):
+    global policies, selectConj, verbosity
+    try:
+        (optlist, args) = getopt.getopt(args, 'hv:c:p:')
+    except getopt.GetoptError as e:
+        print(str(e))
+        usage(name)
+    for (opt, val) in optlist:
+        if opt == '-h':
+            usage(name)
+        elif opt == '-v':
+            verbosity = int(val)
+        elif opt == '-c':
+            selectConj = int(val)
+        elif opt == '-p':
+            policies = [p for p in val.split(',') if len(p) > 0]
+            for p in policies:
+                if p not in policyNames:
+                    print("Unknown policy '%s'" % p)
+                    usage(name)
+    if len(args) == 0:
+        usage(name)
+    for conj in readTrace(args):
+        if selectConj is None or conj.number == selectConj:
+            analyze(conj)
+
+if __name__ == "__main__":
+    run(sys.argv[0], sys.argv[1:])
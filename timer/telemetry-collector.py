@@ -0,0 +1,192 @@
+import sys, getopt
+
+'''
+Collects the telemetry samples written by controller, router, and bworker
+(when started with -T FILE) and aggregates them into a time-series CSV file.
+
+Each sample line has the form
+
+    TELEM <time> <role> <agent> <name>=<value> <name>=<value> ...
+
+Samples are grouped into time buckets.  For each bucket, the CSV file
+has one row giving, for every role and counter, the sum over all agents
+of that role.  Cumulative counters (messages, bytes, operations, etc.)
+are converted into rates per second, so that the tier that saturates
+first shows up as the one whose rates stop growing while its queues do.
+'''
+
+# Counters that give an instantaneous value, rather than a running total
+gaugeNames = ['queue', 'deferred', 'mem', 'uniq', 'uniq_peak', 'itec',
+              'ite_deferred', 'workers', 'joining', 'clients', 'global_ops',
+              'gc_active', 'agents', 'gc_max', 'sweep_left']
+
+outputFileName = 'telemetry.csv'
+bucketSeconds = 1.0
+perAgent = False
+verbosity = 0
+
+def usage(name):
+    print("Usage: %s [-h] [-v VERB] [-o OUTFILE] [-b SECS] [-a] FILE ..." % name)
+    print("\t-h         Print this information")
+    print("\t-v VERB    Set verbosity level")
+    print("\t-o OUTFILE Write CSV to OUTFILE (default %s)" % outputFileName)
+    print("\t-b SECS    Bucket width in seconds (default %.1f)" % bucketSeconds)
+    print("\t-a         Give separate columns for each agent, rather than summing")
+    sys.exit(0)
+
+'''
+Parse a single line.  Returns (time, role, agent, source, dictionary of values)
+or None if line is not a sample
+'''
+def parseLine(line):
+    fields = line.split()
+    if len(fields) < 4 or fields[0] != 'TELEM':
+        return None
+    try:
+        t = float(fields[1])
+    except ValueError:
+        return None
+    role = fields[2]
+    agent = fields[3]
+    if perAgent and agent != '-1':
+        source = role + agent
+    else:
+        source = role
+    values = {}
+    for f in fields[4:]:
+        if '=' not in f:
+            continue
+        (name, val) = f.split('=', 1)
+        try:
+            values[name] = float(val)
+        except ValueError:
+            continue
+    return (t, role, agent, source, values)
+
+'''
+Read all samples from the files, sorted by time
+'''
+def readSamples(fileNames):
+    samples = []
+    for fname in fileNames:
+        try:
+            infile = open(fname, 'r')
+        except IOError:
+            print("Couldn't open file '%s'" % fname)
+            continue
+        for line in infile:
+            s = parseLine(line)
+            if s is not None:
+                samples.append(s)
+        infile.close()
+    samples.sort(key = lambda s : s[0])
+    if verbosity > 0:
+        print("Read %d samples" % len(samples))
+    return samples
+
+'''
+Compute per-agent values for each sample.
+Gauges are used directly.  Cumulative counters are converted into
+rates, using the previous sample from the same agent.
+A counter that decreases has been reset (e.g., by a flush).
+'''
+def sampleRates(samples):
+    last = {}
+    result = []
+    for (t, role, agent, source, values) in samples:
+        key = (role, agent)
+        rvalues = {}
+        if key in last:
+            (lt, lvalues) = last[key]
+            dt = t - lt
+        else:
+            (lt, lvalues, dt) = (t, {}, 0.0)
+        for name in values:
+            val = values[name]
+            if name in gaugeNames:
+                rvalues[name] = val
+            elif dt > 0:
+                lval = lvalues.get(name, 0.0)
+                delta = val - lval if val >= lval else val
+                rvalues[name + '_rate'] = delta / dt
+        last[key] = (t, values)
+        result.append((t, role, agent, source, rvalues))
+    return result
+
+'''
+Group samples into buckets.  Within a bucket, values from the same agent are
+averaged, and then values from agents with the same source are summed.
+'''
+def bucketize(samples):
+    if len(samples) == 0:
+        return ([], [])
+    t0 = samples[0][0]
+    buckets = {}
+    columns = set([])
+    for (t, role, agent, source, values) in samples:
+        b = int((t - t0) / bucketSeconds)
+        if b not in buckets:
+            buckets[b] = {}
+        agentValues = buckets[b]
+        key = (source, role, agent)
+        if key not in agentValues:
+            agentValues[key] = {}
+        for name in values:
+            if name not in agentValues[key]:
+                agentValues[key][name] = []
+            agentValues[key][name].append(values[name])
+            columns.add(source + '.' + name)
+    rows = []
+    for b in sorted(buckets.keys()):
+        row = {}
+        for (source, role, agent) in buckets[b]:
+            vals = buckets[b][(source, role, agent)]
+            for name in vals:
+                col = source + '.' + name
+                avg = sum(vals[name]) / len(vals[name])
+                row[col] = row.get(col, 0.0) + avg
+        rows.append((b * bucketSeconds, row))
+    return (sorted(columns), rows)
+
+def writeCSV(columns, rows):
+    outfile = open(outputFileName, 'w')
+    outfile.write(','.join(['time'] + columns) + '\n')
+    for (t, row) in rows:
+        fields = ['%.3f' % t]
+        for col in columns:
+            if col in row:
+                fields.append('%.2f' % row[col])
+            else:
+                fields.append('')
+        outfile.write(','.join(fields) + '\n')
+    outfile.close()
+    if verbosity > 0:
+        print("Wrote %d rows with %d columns to %s" %
+              (len(rows), len(columns), outputFileName))
+
+def run(name, args):
+    global outputFileName, bucketSeconds, perAgent, verbosity
+    try:
+        (optlist, args) = getopt.getopt(args, 'hv:o:b:a')
+    except getopt.GetoptError as e:
+        print(str(e))
+        usage(name)
+    for (opt, val) in optlist:
+        if opt == '-h':
+            usage(name)
+        elif opt == '-v':
+            verbosity = int(val)
+        elif opt == '-o':
+            outputFileName = val
+        elif opt == '-b':
+            bucketSeconds = float(val)
+        elif opt == '-a':
+            perAgent = True
+    if len(args) == 0:
+        usage(name)
+    samples = sampleRates(readSamples(args))
+    (columns, rows) = bucketize(samples)
+    writeCSV(columns, rows)
+
+if __name__ == "__main__":
+    run(sys.argv[0], sys.argv[1:])